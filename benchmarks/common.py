@@ -0,0 +1,78 @@
+"""
+Shared helpers for the benchmark scripts. Each run is appended as one JSON line
+to benchmarks/results/<suite>.jsonl, tagged with the git commit, so results can
+be compared across commits.
+"""
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def record_results(suite, results, results_dir=RESULTS_DIR):
+    """
+    Append a run to the results file for the suite.
+
+    :param suite:       Name of the benchmark suite
+    :param results:     Dict of benchmark name to result dict
+    :param results_dir: Directory to write the results to
+    :return: The record written
+    """
+    os.makedirs(results_dir, exist_ok=True)
+
+    record = {
+        'commit': git_commit(),
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'host': platform.node(),
+        'results': results,
+    }
+
+    with open(os.path.join(results_dir, f'{suite}.jsonl'), 'a') as writer:
+        writer.write(json.dumps(record) + '\n')
+
+    return record
+
+
+def previous_results(suite, results_dir=RESULTS_DIR):
+    """
+    :return: The results of the last recorded run of the suite or an empty dict
+    """
+    path = os.path.join(results_dir, f'{suite}.jsonl')
+
+    if not os.path.exists(path):
+        return {}
+
+    with open(path) as reader:
+        lines = reader.read().splitlines()
+
+    return json.loads(lines[-1])['results'] if lines else {}
+
+
+def print_table(results, previous, key):
+    """
+    Print the results alongside the previous run
+    """
+    width = max(len(name) for name in results)
+    print(f"{'benchmark':<{width}}  {key:>14}  {'previous':>14}  {'change':>8}")
+
+    for name, result in results.items():
+        value = result[key]
+        old = previous.get(name, {}).get(key)
+        change = f"{(value - old) / old:+.0%}" if old else ''
+        old = f"{old:.4g}" if old is not None else ''
+        print(f"{name:<{width}}  {value:>14.4g}  {old:>14}  {change:>8}")
@@ -0,0 +1,107 @@
+"""
+Compare DepositLog parsing with the regex parser it replaced on a synthetic
+deposit log. Both parsers must produce the same lists.
+
+Usage:
+    python benchmarks/deposit_log.py [--lines N] [--repeat N] [--no-record]
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import synthetic
+from common import record_results, previous_results, print_table
+from hot_paths import best_time
+
+
+def regex_parse(path):
+    """
+    The previous DepositLog parser. Splits every line and tries up to six regexes.
+    :return: deposit, deletion, mkdir, rmdir, symlink and readme00 lists
+    """
+    lists = {name: [] for name in ('deposit', 'deletion', 'mkdir', 'rmdir', 'symlink', 'readme00')}
+
+    with open(path) as reader:
+        deposit = re.compile(r"^\d{4}[-](\d{2})[-]\d{2}.*:DEPOSIT:")
+        deletion = re.compile(r"^\d{4}[-](\d{2})[-]\d{2}.*:REMOVE:")
+        mkdir = re.compile(r"^\d{4}[-](\d{2})[-]\d{2}.*:MKDIR:")
+        rmdir = re.compile(r"^\d{4}[-](\d{2})[-]\d{2}.*:RMDIR:")
+        symlink = re.compile(r"^\d{4}[-](\d{2})[-]\d{2}.*:SYMLINK:")
+        readme00 = re.compile(r"^\d{4}[-](\d{2})[-]\d{2}.*00README:")
+
+        for line in reader:
+            split_line = line.strip().split(":")
+
+            date_hour = split_line[0]
+            min = split_line[1]
+            sec = split_line[2]
+            filepath = split_line[3]
+            action = split_line[4]
+            filesize = split_line[5]
+            message = ":".join(split_line[6:])
+
+            if deposit.match(line):
+                lists['deposit'].append(filepath)
+                if readme00.match(line):
+                    lists['readme00'].append(filepath)
+            elif deletion.match(line):
+                lists['deletion'].append(filepath)
+            elif mkdir.match(line):
+                lists['mkdir'].append(filepath)
+            elif rmdir.match(line):
+                lists['rmdir'].append(filepath)
+            elif symlink.match(line):
+                lists['symlink'].append(filepath)
+
+    return lists
+
+
+def single_pass_parse(path):
+    from ceda_elasticsearch_tools.core.log_reader import DepositLog
+
+    log = DepositLog(log_filename=path)
+    return {
+        'deposit': log.deposit_list,
+        'deletion': log.deletion_list,
+        'mkdir': log.mkdir_list,
+        'rmdir': log.rmdir_list,
+        'symlink': log.symlink_list,
+        'readme00': log.readme00_list,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', type=int, default=10 ** 6, help='Lines in the synthetic log (default: 1000000)')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs of each parser (default: 3)')
+    parser.add_argument('--no-record', action='store_true', help='Do not save the results')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'deposit_ingest1.2017-08-20')
+        with open(path, 'w') as writer:
+            writer.writelines(synthetic.deposit_log_lines(args.lines))
+
+        if regex_parse(path) != single_pass_parse(path):
+            sys.exit('Parsers disagree')
+
+        results = {}
+        for name, func in (('regex', regex_parse), ('single_pass', single_pass_parse)):
+            seconds = best_time(lambda: func(path), args.repeat)
+            results[name] = {'lines': args.lines, 'seconds': seconds, 'lines_per_second': args.lines / seconds}
+
+    suite = f'deposit_log-{args.lines}'
+    print_table(results, previous_results(suite), 'seconds')
+    print(f"Speed up: {results['regex']['seconds'] / results['single_pass']['seconds']:.2f}x")
+
+    if not args.no_record:
+        record_results(suite, results)
+
+
+if __name__ == '__main__':
+    main()
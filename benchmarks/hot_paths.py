@@ -0,0 +1,232 @@
+"""
+Benchmark the hot paths used when updating the indices from the archive logs.
+
+Each benchmark runs over synthetic inputs of SCALE items (file_md5 hashes SCALE
+KiB and hash_files hashes SCALE KiB in 1 MiB files) and the best of several runs
+is recorded. Results are stored per scale so only runs at the same scale are
+compared.
+
+Usage:
+    python benchmarks/hot_paths.py [--scale N] [--repeat N] [--only NAME ...] [--no-record]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import synthetic
+from common import record_results, previous_results, print_table
+
+CLIENT_SETTINGS = dict(hosts=['localhost:9200'], use_ssl=False, ca_certs=None)
+
+
+def _write_lines(path, lines):
+    with open(path, 'w') as writer:
+        writer.writelines(lines)
+    return path
+
+
+def generate_bulk_body(scale, workdir):
+    from ceda_elasticsearch_tools.index_tools.base import IndexUpdaterBase
+
+    updater = IndexUpdaterBase('bench', **CLIENT_SETTINGS)
+    content = [{'id': str(i), 'document': {'info': {'md5': '0' * 32}}} for i in range(scale)]
+
+    return lambda: updater._generate_bulk_operation_body(content, action='update')
+
+
+def gen_msearch_json(scale, workdir):
+    from ceda_elasticsearch_tools.core.updater import ElasticsearchUpdater, ElasticsearchQuery
+
+    updater = ElasticsearchUpdater('bench', None, None, **CLIENT_SETTINGS)
+    param_func, query = ElasticsearchQuery.ceda_fbs_old()
+    paths = synthetic.archive_paths(scale)
+
+    return lambda: updater.gen_msearch_json(query, param_func, paths, blocksize=800)
+
+
+def render_query(scale, workdir):
+    from ceda_elasticsearch_tools.core.updater import ElasticsearchUpdater, ElasticsearchQuery
+
+    param_func, query = ElasticsearchQuery.ceda_fbs_old()
+    params = [param_func(path) for path in synthetic.archive_paths(scale)]
+
+    def run():
+        for parameters in params:
+            ElasticsearchUpdater._render_query(query, parameters)
+
+    return run
+
+
+def process_bulk_response(scale, workdir):
+    from ceda_elasticsearch_tools.index_tools.base import IndexUpdaterBase
+
+    updater = IndexUpdaterBase('bench', **CLIENT_SETTINGS)
+    responses = synthetic.bulk_responses(scale)
+
+    return lambda: updater._process_bulk_action_response(responses, 'bulk')
+
+
+def process_msearch_response(scale, workdir):
+    from ceda_elasticsearch_tools.index_tools.base import IndexUpdaterBase
+
+    updater = IndexUpdaterBase('bench', **CLIENT_SETTINGS)
+    responses = synthetic.msearch_responses(scale)
+
+    return lambda: updater._process_bulk_action_response(responses, 'msearch')
+
+
+def deposit_log_parse(scale, workdir):
+    from ceda_elasticsearch_tools.core.log_reader import DepositLog
+
+    path = _write_lines(os.path.join(workdir, 'deposit_ingest1.2017-08-20'), synthetic.deposit_log_lines(scale))
+
+    return lambda: DepositLog(log_filename=path)
+
+
+def deposit_log_events(scale, workdir):
+    from ceda_elasticsearch_tools.core.log_reader import DepositLog
+
+    path = _write_lines(os.path.join(workdir, 'deposit_ingest1.2017-08-21'), synthetic.deposit_log_lines(scale))
+
+    def run():
+        for _ in DepositLog.events(path):
+            pass
+
+    return run
+
+
+def md5_log_load(scale, workdir):
+    from ceda_elasticsearch_tools.core.log_reader import MD5LogFile
+
+    spot_dir = os.path.join(workdir, 'checkm', 'spot-0-dataset0')
+    os.makedirs(spot_dir)
+    _write_lines(os.path.join(spot_dir, 'checkm.spot-0-dataset0.20170820'), synthetic.checkm_lines(scale))
+
+    class BenchMD5LogFile(MD5LogFile):
+        log_dir = os.path.join(workdir, 'checkm')
+
+    return lambda: BenchMD5LogFile('spot-0-dataset0', '/badc/dataset0')
+
+
+def md5_log_indexed(scale, workdir):
+    from ceda_elasticsearch_tools.core.log_reader import MD5LogFile
+
+    spot_dir = os.path.join(workdir, 'checkm', 'spot-0-dataset0')
+    os.makedirs(spot_dir, exist_ok=True)
+    lines = list(synthetic.checkm_lines(scale))
+    _write_lines(os.path.join(spot_dir, 'checkm.spot-0-dataset0.20170820'), lines)
+    paths = [os.path.join('/badc/dataset0', line.split('|', 1)[0]) for line in lines if not line.startswith('#')]
+
+    class BenchMD5LogFile(MD5LogFile):
+        log_dir = os.path.join(workdir, 'checkm')
+
+    index_dir = os.path.join(workdir, 'checkm_index')
+
+    # Build the sidecar outside the timing, then time opening it and looking up every path
+    BenchMD5LogFile('spot-0-dataset0', '/badc/dataset0', indexed=True, index_dir=index_dir).close()
+
+    def run():
+        with BenchMD5LogFile('spot-0-dataset0', '/badc/dataset0', indexed=True, index_dir=index_dir) as log:
+            for path in paths:
+                log.get_md5(path)
+
+    return run
+
+
+def get_spot(scale, workdir):
+    from ceda_elasticsearch_tools.core.log_reader import SpotMapping
+
+    n_spots = min(scale, 20000)
+    spot_file = _write_lines(os.path.join(workdir, 'spots.conf'), synthetic.spot_mapping_lines(n_spots))
+    spots = SpotMapping(spot_file=spot_file)
+    paths = synthetic.storage_paths(scale, n_spots)
+
+    def run():
+        for path in paths:
+            spots.get_spot(path)
+
+    return run
+
+
+def file_md5(scale, workdir):
+    from ceda_elasticsearch_tools.cmdline.secondary_scripts.md5 import file_md5 as md5
+
+    path = os.path.join(workdir, 'data.bin')
+    with open(path, 'wb') as writer:
+        for _ in range(scale // 1024):
+            writer.write(os.urandom(1024 * 1024))
+        writer.write(os.urandom(scale % 1024 * 1024))
+
+    return lambda: md5(path)
+
+
+def hash_files(scale, workdir):
+    from ceda_elasticsearch_tools.core.hashing import FileHasher
+
+    paths = []
+    for i in range(max(scale // 1024, 1)):
+        path = os.path.join(workdir, f'data-{i}.bin')
+        with open(path, 'wb') as writer:
+            writer.write(os.urandom(1024 * 1024))
+        paths.append(path)
+
+    return lambda: FileHasher().hash_many(paths)
+
+
+BENCHMARKS = {
+    'generate_bulk_body': generate_bulk_body,
+    'gen_msearch_json': gen_msearch_json,
+    'render_query': render_query,
+    'process_bulk_response': process_bulk_response,
+    'process_msearch_response': process_msearch_response,
+    'deposit_log_parse': deposit_log_parse,
+    'deposit_log_events': deposit_log_events,
+    'md5_log_load': md5_log_load,
+    'md5_log_indexed': md5_log_indexed,
+    'get_spot': get_spot,
+    'file_md5': file_md5,
+    'hash_files': hash_files,
+}
+
+
+def best_time(func, repeat):
+    """
+    :return: Fastest of repeat runs in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=10 ** 5, help='Number of items for each benchmark (default: 100000)')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs of each benchmark (default: 3)')
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help='Benchmarks to run (default: all)')
+    parser.add_argument('--no-record', action='store_true', help='Do not save the results')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in args.only or BENCHMARKS:
+            func = BENCHMARKS[name](args.scale, workdir)
+            seconds = best_time(func, args.repeat)
+            results[name] = {'scale': args.scale, 'seconds': seconds, 'per_second': args.scale / seconds}
+
+    suite = f'hot_paths-{args.scale}'
+    print_table(results, previous_results(suite), 'seconds')
+
+    if not args.no_record:
+        record_results(suite, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Measure the import time of the package and of each command line entry point.
+
+Each module is imported in a fresh interpreter with `python -X importtime` and
+the cumulative time for the module is taken, so interpreter start up is not
+included. The median of several runs is recorded.
+
+Usage:
+    python benchmarks/import_time.py [--repeat N] [--no-record]
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+from common import record_results, previous_results, print_table
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def entry_points():
+    """
+    Read the console scripts from pyproject.toml
+    :return: Dict of script name to module
+    """
+    with open(os.path.join(ROOT, 'pyproject.toml')) as reader:
+        content = reader.read()
+
+    scripts = content.split('[tool.poetry.scripts]')[1].split('\n[')[0]
+    modules = {'package': 'ceda_elasticsearch_tools'}
+
+    for name, module in re.findall(r'^(\w+)\s*=\s*"([\w.]+):\w+"', scripts, re.MULTILINE):
+        modules[name] = module
+
+    return modules
+
+
+def import_time(module):
+    """
+    :return: Cumulative import time of the module in seconds or None if it failed to import
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT,
+        capture_output=True,
+        text=True
+    )
+
+    if result.returncode != 0:
+        return None
+
+    for line in reversed(result.stderr.splitlines()):
+        match = re.match(r'import time:\s+\d+\s+\|\s+(\d+)\s+\|\s*(\S+)$', line)
+        if match and match.group(2) == module:
+            return int(match.group(1)) / 1e6
+
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=7, help='Number of imports of each module (default: 7)')
+    parser.add_argument('--no-record', action='store_true', help='Do not save the results')
+    args = parser.parse_args()
+
+    results = {}
+    for name, module in entry_points().items():
+        times = [import_time(module) for _ in range(args.repeat)]
+
+        if None in times:
+            print(f"Skipping {name}: {module} failed to import", file=sys.stderr)
+            continue
+
+        results[name] = {'module': module, 'seconds': statistics.median(times), 'min': min(times)}
+
+    print_table(results, previous_results('import_time'), 'seconds')
+
+    if not args.no_record:
+        record_results('import_time', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Memory held by DepositLog and MD5LogFile after loading a synthetic log, with
+the default containers and with compact=True.
+
+Memory is measured with tracemalloc, which slows the loading down, so load
+times are reported by hot_paths.py rather than here.
+
+Usage:
+    python benchmarks/memory.py [--lines N] [--no-record]
+"""
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import synthetic
+from common import record_results, previous_results, print_table
+
+
+def retained_bytes(func):
+    """
+    :return: Bytes still allocated by the object func returns
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = func()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', type=int, default=10 ** 6, help='Lines in each synthetic log (default: 1000000)')
+    parser.add_argument('--no-record', action='store_true', help='Do not save the results')
+    args = parser.parse_args()
+
+    from ceda_elasticsearch_tools.core.log_reader import DepositLog, MD5LogFile
+
+    results = {}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        deposit_log = os.path.join(workdir, 'deposit_ingest1.2017-08-20')
+        with open(deposit_log, 'w') as writer:
+            writer.writelines(synthetic.deposit_log_lines(args.lines))
+
+        spot_dir = os.path.join(workdir, 'spot-0-dataset0')
+        os.makedirs(spot_dir)
+        with open(os.path.join(spot_dir, 'checkm.spot-0-dataset0.20170820'), 'w') as writer:
+            writer.writelines(synthetic.checkm_lines(args.lines))
+
+        class BenchMD5LogFile(MD5LogFile):
+            log_dir = workdir
+
+        for compact in (False, True):
+            suffix = '_compact' if compact else ''
+
+            results[f'deposit_log{suffix}'] = {
+                'lines': args.lines,
+                'mb': retained_bytes(lambda: DepositLog(log_filename=deposit_log, compact=compact)) / 1e6,
+            }
+            results[f'md5_log{suffix}'] = {
+                'lines': args.lines,
+                'mb': retained_bytes(lambda: BenchMD5LogFile('spot-0-dataset0', '/badc/dataset0', compact=compact)) / 1e6,
+            }
+
+    suite = f'memory-{args.lines}'
+    print_table(results, previous_results(suite), 'mb')
+
+    if not args.no_record:
+        record_results(suite, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Deterministic synthetic inputs for the benchmarks, shaped like the real archive
+paths, deposit logs, checkm logs and spot mappings.
+"""
+import hashlib
+import random
+
+ACTIONS = (
+    ('DEPOSIT', 0.82),
+    ('REMOVE', 0.08),
+    ('MKDIR', 0.06),
+    ('RMDIR', 0.02),
+    ('SYMLINK', 0.02),
+)
+
+
+def archive_paths(n, files_per_dir=50, seed=0):
+    """
+    :param n:               Number of paths
+    :param files_per_dir:   Average number of files in each directory
+    :return: List of archive file paths
+    """
+    rng = random.Random(seed)
+    paths = []
+
+    for i in range(n):
+        directory = i // files_per_dir
+        dataset = directory // 100
+        paths.append(
+            f'/badc/dataset{dataset}/data/{2000 + directory % 20}/{directory % 12 + 1:02d}/'
+            f'{directory % 28 + 1:02d}/file_{i}_{rng.randint(0, 9999):04d}.nc'
+        )
+
+    return paths
+
+
+def deposit_log_lines(n, seed=0):
+    """
+    :param n: Number of lines
+    :return: Generator of deposit log lines with the real mix of actions
+    """
+    rng = random.Random(seed)
+    actions = [action for action, _ in ACTIONS]
+    weights = [weight for _, weight in ACTIONS]
+
+    for i, path in enumerate(archive_paths(n, seed=seed)):
+        action = rng.choices(actions, weights)[0]
+
+        if action == 'DEPOSIT' and i % 50 == 0:
+            path = path.rsplit('/', 1)[0] + '/00README'
+
+        if action in ('MKDIR', 'RMDIR'):
+            path = path.rsplit('/', 1)[0]
+
+        size = rng.randint(0, 10 ** 9) if action == 'DEPOSIT' else 0
+        timestamp = f'2017-08-20 {i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}'
+
+        yield f'{timestamp}:{path}:{action}:{size}: (force=None) /datacentre/arrivals/users/someone/{i}\n'
+
+
+def checkm_lines(n, seed=0):
+    """
+    :param n: Number of entries
+    :return: Generator of checkm log lines with paths relative to the spot
+    """
+    yield '#%checkm_0.7\n'
+    yield '# [SourceFileOrURL]|[Alg]|[Digest]|[Length]|[ModTime]\n'
+
+    for i, path in enumerate(archive_paths(n, seed=seed)):
+        relative = path.split('/', 3)[3]
+        digest = hashlib.md5(relative.encode()).hexdigest()
+        yield f'{relative}|md5|{digest}|{i * 7919 % 10 ** 8}|2010-04-29T11:10:13Z\n'
+
+
+def spot_mapping_lines(n_spots):
+    """
+    :param n_spots: Number of spots
+    :return: List of spot=path lines. Spot i maps to /badc/dataset<i>
+    """
+    return [f'spot-{i}-dataset{i}=/badc/dataset{i}\n' for i in range(n_spots)]
+
+
+def storage_paths(n, n_spots, seed=0):
+    """
+    :param n:       Number of paths
+    :param n_spots: Number of spots in the mapping
+    :return: List of storage paths under the spots from spot_mapping_lines
+    """
+    paths = []
+
+    for i, path in enumerate(archive_paths(n, seed=seed)):
+        dataset, suffix = path.split('/', 3)[2:]
+        spot = int(dataset[len('dataset'):]) % n_spots
+        paths.append(f'/datacentre/archvol{spot % 5}/pan{spot % 150}/archive/spot-{spot}-dataset{spot}/{suffix}')
+
+    return paths
+
+
+def bulk_responses(n, error_rate=0.01, block=800, seed=0):
+    """
+    :param n:           Number of items
+    :param error_rate:  Fraction of failed items
+    :param block:       Items per response
+    :return: List of bulk API responses
+    """
+    rng = random.Random(seed)
+    responses = []
+
+    for start in range(0, n, block):
+        items = []
+        for i in range(start, min(n, start + block)):
+            if rng.random() < error_rate:
+                items.append({'update': {'_id': str(i), 'status': 429, 'error': {'type': 'es_rejected_execution_exception'}}})
+            else:
+                items.append({'update': {'_id': str(i), 'status': 200, 'result': 'updated'}})
+
+        responses.append({'took': 10, 'errors': any(item['update']['status'] >= 300 for item in items), 'items': items})
+
+    return responses
+
+
+def msearch_responses(n, hit_rate=0.9, block=800, seed=0):
+    """
+    :param n:           Number of searches
+    :param hit_rate:    Fraction of searches which find a document
+    :param block:       Searches per response
+    :return: List of msearch API responses
+    """
+    rng = random.Random(seed)
+    responses = []
+
+    for start in range(0, n, block):
+        searches = []
+        for i in range(start, min(n, start + block)):
+            hits = [{'_id': str(i), '_source': {}}] if rng.random() < hit_rate else []
+            searches.append({'hits': {'total': {'value': len(hits)}, 'hits': hits}})
+        responses.append({'took': 10, 'responses': searches})
+
+    return responses
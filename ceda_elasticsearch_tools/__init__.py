@@ -1,7 +1,30 @@
-from .elasticsearch.ceda_elasticsearch_client import CEDAElasticsearchClient
+"""
+Public names are imported on first use so that importing the package, or any of
+the command line tools, does not pay for the Elasticsearch client unless it is used.
+"""
+from ._lazy import lazy_getattr
 
-from .index_tools.base import IndexUpdaterBase
-from .index_tools.ceda_client import BulkClient
+_LAZY_IMPORTS = {
+    'CEDAElasticsearchClient': '.elasticsearch.ceda_elasticsearch_client',
+    'IndexUpdaterBase': '.index_tools.base',
+    'BulkClient': '.index_tools.ceda_client',
+}
 
-from importlib.metadata import version
-__version__ = version
\ No newline at end of file
+__all__ = list(_LAZY_IMPORTS) + ['__version__']
+
+_lazy_getattr = lazy_getattr(__name__, _LAZY_IMPORTS, globals())
+
+
+def __getattr__(name):
+    if name != '__version__':
+        return _lazy_getattr(name)
+
+    from importlib.metadata import version, PackageNotFoundError
+
+    try:
+        value = version('ceda-elasticsearch-tools')
+    except PackageNotFoundError:
+        value = 'unknown'
+
+    globals()[name] = value
+    return value
@@ -0,0 +1,25 @@
+"""
+Helper for packages which import their public names on first use (PEP 562).
+"""
+import importlib
+
+
+def lazy_getattr(package, imports, namespace):
+    """
+    Build a module level __getattr__ which imports names on first access.
+
+    :param package:     __name__ of the package
+    :param imports:     Dict of public name to the relative module which defines it
+    :param namespace:   globals() of the package. Imported names are cached here.
+    :return: __getattr__ function
+    """
+
+    def __getattr__(name):
+        if name not in imports:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+
+        value = getattr(importlib.import_module(imports[name], package), name)
+        namespace[name] = value
+        return value
+
+    return __getattr__
@@ -14,7 +14,7 @@ Options:
 """
 from docopt import docopt
 
-import simplejson as json
+import json
 from ceda_elasticsearch_tools import __version__
 import os
 import re
@@ -0,0 +1,44 @@
+"""
+Compile the spot mapping into a read only file which can be memory mapped by many processes,
+eg. SpotMapping(compiled_file=OUTPUT). The mapping is read from SPOT_FILE or downloaded from
+the cedaarchiveapp.
+
+Usage:
+    compile_spot_mapping.py --help
+    compile_spot_mapping.py --version
+    compile_spot_mapping.py
+                   (-o OUTPUT       | --output OUTPUT       )
+                   [-s SPOT_FILE    | --spot-file SPOT_FILE ]
+                   [--sep SEP                               ]
+
+Options:
+    --help              Display help.
+    --version           Show Version.
+    -o  --output        Compiled mapping to write.
+    -s  --spot-file     Spot mapping file with one spot<SEP>path per line. (default: download from the cedaarchiveapp)
+    --sep               Separator between spot and path in SPOT_FILE [default: =]
+"""
+from docopt import docopt
+
+from ceda_elasticsearch_tools import __version__
+from ceda_elasticsearch_tools.core.log_reader import SpotMapping
+from ceda_elasticsearch_tools.core.spot_index import CompiledSpotMapping, compile_spot_file, compile_spot_mapping, write_compiled
+
+
+def main():
+    args = docopt(__doc__, version=__version__)
+
+    output = args["OUTPUT"]
+
+    if args["SPOT_FILE"]:
+        compile_spot_file(args["SPOT_FILE"], output, sep=args["SEP"] or "=")
+    else:
+        spots = SpotMapping()
+        write_compiled(output, compile_spot_mapping(spots.spot2pathmapping, spots.path2spotmapping))
+
+    compiled = CompiledSpotMapping.open(output)
+    print(f"Compiled {len(compiled)} spots and {len(compiled.paths)} spot directories to {output}")
+
+
+if __name__ == "__main__":
+    main()
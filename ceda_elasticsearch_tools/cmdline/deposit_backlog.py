@@ -0,0 +1,90 @@
+"""
+Check the files deposited in a backlog of deposit logs against an index. The logs are parsed in parallel and the
+files checked in batches. The files missing from the index are written to OUTPUT/<log>.missing.txt and a summary
+line is printed for each log.
+
+Usage:
+    deposit_backlog.py --help
+    deposit_backlog.py --version
+    deposit_backlog.py
+                   (-o OUTPUT       | --output OUTPUT       )
+                   [-i INDEX        | --index INDEX         ]
+                   [-d LOG_DIR      | --log-dir LOG_DIR     ]
+                   [-n NUMBER       | --number NUMBER       ]
+                   [-p PROCESSES    | --processes PROCESSES ]
+                   [-b BATCHSIZE    | --batch BATCHSIZE     ]
+                   [-c CONFIG       | --config CONFIG       ]
+
+Options:
+    --help              Display help.
+    --version           Show Version.
+    -o  --output        Output directory for the lists of missing files.
+    -i  --index         Index to check [default: ceda-fbi]
+    -d  --log-dir       Directory containing the deposit logs [default: /badc/ARCHIVE_INFO/deposit_logs]
+    -n  --number        Only check the newest NUMBER logs.
+    -p  --processes     Number of processes used to parse the logs. (default: number of CPUs)
+    -b  --batch         Number of files checked in each request [default: 1000]
+    -c  --config        JSON file with keyword arguments for the elasticsearch client.
+"""
+from docopt import docopt
+
+import os
+import json
+from datetime import datetime
+from ceda_elasticsearch_tools import __version__
+from ceda_elasticsearch_tools.core.backlog import FileExistenceChecker, backlog_logs, process_backlog
+
+
+def get_client(config_file=None):
+    """
+    Create the elasticsearch client
+    :param config_file: Optional JSON file containing client keyword arguments
+    :return: CEDAElasticsearchClient
+    """
+    from ceda_elasticsearch_tools.elasticsearch import CEDAElasticsearchClient
+
+    if config_file is None:
+        return CEDAElasticsearchClient()
+
+    with open(config_file) as reader:
+        return CEDAElasticsearchClient(**json.load(reader))
+
+
+def main():
+    args = docopt(__doc__, version=__version__)
+
+    output_dir = args["OUTPUT"]
+
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    logs = backlog_logs(args["LOG_DIR"] or "/badc/ARCHIVE_INFO/deposit_logs")
+    if args["NUMBER"]:
+        logs = logs[:int(args["NUMBER"])]
+
+    checker = FileExistenceChecker(get_client(args["CONFIG"]), args["INDEX"] or "ceda-fbi",
+                                   batch_size=int(args["BATCHSIZE"] or 1000))
+    processes = int(args["PROCESSES"]) if args["PROCESSES"] else None
+
+    start = datetime.now()
+    deposits = 0
+    missing = 0
+
+    for report in process_backlog(logs, checker, processes):
+        print(report)
+
+        deposits += report.deposits
+        missing += len(report.missing)
+
+        if report.missing:
+            with open(os.path.join(output_dir, f"{report.log}.missing.txt"), "w") as writer:
+                writer.writelines(f"{path}\n" for path in report.missing)
+
+    duration = datetime.now() - start
+    rate = deposits / duration.total_seconds() if duration.total_seconds() else 0
+
+    print(f"Logs: {len(logs)} Deposits: {deposits} Missing: {missing} Took: {duration} ({rate:.0f} files/s)")
+
+
+if __name__ == "__main__":
+    main()
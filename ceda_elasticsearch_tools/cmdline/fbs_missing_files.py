@@ -30,20 +30,19 @@ Options:
 """
 from docopt import docopt
 
-from tabulate import tabulate
 import re
 import os
 from ceda_elasticsearch_tools.core import utils
 import subprocess
 from ceda_elasticsearch_tools import __version__
 from time import sleep
-from tqdm import tqdm
 
 
 SCRIPT_DIR = os.path.realpath(os.path.dirname(__file__))
 
 
 def submit_jobs_to_lotus(filelist, config):
+    from tqdm import tqdm
 
     for file in tqdm(filelist, desc="Submitting to Lotus" ):
         filepath = os.path.join(config["DIR"],file)
@@ -62,6 +61,7 @@ def submit_jobs_to_lotus(filelist, config):
 
 
 def generate_summary(config):
+    from tabulate import tabulate
 
     # Generate Summary Table
     summary = {}
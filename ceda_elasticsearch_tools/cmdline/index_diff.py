@@ -0,0 +1,85 @@
+"""
+Compare two indices and write out the ids of documents which have been added, removed or changed
+in the new index. Used to validate a rebuilt or reindexed index against the original.
+
+Usage:
+    index_diff.py --help
+    index_diff.py --version
+    index_diff.py OLD_INDEX NEW_INDEX
+                   (-o OUTPUT       | --output OUTPUT       )
+                   [-c CONFIG       | --config CONFIG       ]
+                   [-k KEY_FIELD    | --key KEY_FIELD       ]
+                   [-s SLICES       | --slices SLICES       ]
+                   [-b BLOCKSIZE    | --blocksize BLOCKSIZE ]
+                   [-x FIELD        | --exclude FIELD       ]...
+
+Options:
+    --help              Display help.
+    --version           Show Version.
+    -o  --output        Output directory for the added, removed and changed id lists.
+    -c  --config        JSON file with keyword arguments for the elasticsearch client.
+    -k  --key           Sortable field which uniquely identifies a document [default: _id]
+    -s  --slices        Number of slices to read in parallel from each index [default: 4]
+    -b  --blocksize     Number of documents to read in each request [default: 1000]
+    -x  --exclude       Field to ignore when comparing documents. Can be repeated.
+"""
+from docopt import docopt
+
+import os
+import json
+from datetime import datetime
+from ceda_elasticsearch_tools import __version__
+from ceda_elasticsearch_tools.core.index_diff import IndexDiff, ADDED, REMOVED, CHANGED
+
+
+def get_client(config_file=None):
+    """
+    Create the elasticsearch client
+    :param config_file: Optional JSON file containing client keyword arguments
+    :return: CEDAElasticsearchClient
+    """
+    from ceda_elasticsearch_tools.elasticsearch import CEDAElasticsearchClient
+
+    if config_file is None:
+        return CEDAElasticsearchClient()
+
+    with open(config_file) as reader:
+        return CEDAElasticsearchClient(**json.load(reader))
+
+
+def main():
+    args = docopt(__doc__, version=__version__)
+
+    output_dir = args["OUTPUT"]
+
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    diff = IndexDiff(
+        get_client(args["CONFIG"]),
+        args["OLD_INDEX"],
+        args["NEW_INDEX"],
+        key_field=args["KEY_FIELD"] or "_id",
+        excludes=args["FIELD"],
+        slices=int(args["SLICES"] or 4),
+        size=int(args["BLOCKSIZE"] or 1000)
+    )
+
+    print(f"Comparing {args['OLD_INDEX']} to {args['NEW_INDEX']}")
+    start = datetime.now()
+
+    writers = {status: open(os.path.join(output_dir, f"{status}.txt"), 'w') for status in (ADDED, REMOVED, CHANGED)}
+
+    try:
+        for status, doc_id in diff:
+            writers[status].write(f"{doc_id}\n")
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    print(f"Added: {diff.counts[ADDED]} Removed: {diff.counts[REMOVED]} Changed: {diff.counts[CHANGED]} "
+          f"Took: {datetime.now() - start}")
+
+
+if __name__ == "__main__":
+    main()
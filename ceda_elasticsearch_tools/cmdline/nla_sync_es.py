@@ -13,7 +13,7 @@ Usage:
     nla_sync_es.py INDEX
     nla_sync_es.py INDEX [--host HOST]
     nla_sync_es.py INDEX [--host HOST] [--port PORT]
-    nla_sync_es.py INDEX [--host HOST] [--port PORT] [--index-docs] [--no-scan]
+    nla_sync_es.py INDEX [--host HOST] [--port PORT] [--index-docs] [--no-scan] [--max-rate DOCS_PER_SECOND [--feedback]]
     nla_sync_es.py --version
 
 Options:
@@ -23,18 +23,18 @@ Options:
     --port          Elasticsearch port to target.
     --index-docs    Index files not found at level 1 detail or if available on disk, write to dir ready for FBS code.
     --no-scan       Don't download new list. Used to capture failed jobs.
+    --max-rate DOCS_PER_SECOND  Limit the bulk writes of each lotus job to this many documents per second
+    --feedback      With --max-rate, back off when the cluster write queues fill up
 '''
 from docopt import docopt
 
-import requests
 from ceda_elasticsearch_tools import __version__
 from time import sleep
 import itertools, sys
-from multiprocessing import Process
 import os
 import shutil
 from itertools import islice
-import simplejson as json
+import json
 import subprocess
 
 
@@ -83,6 +83,9 @@ def download_data_from_nla(url):
     :param url: The url to get data from.
     :return: Two dicts: files_t = Files on tape, files_d = Files on disk
     """
+    import requests
+    from multiprocessing import Process
+
     p = Process(target=loading,args=("Retrieving list of files on tape from nla.ceda.ac.uk",))
     p.start()
 
@@ -141,6 +144,13 @@ def main():
 
     print("Script settings. ElasticSearch index: {} host: {} port: {}".format(index, host, port))
 
+    # Passed on to each lotus job
+    rate_options = ""
+    if args["--max-rate"]:
+        rate_options = " --max-rate {}".format(args["--max-rate"])
+        if args["--feedback"]:
+            rate_options += " --feedback"
+
 
     if not args['--no-scan']:
         # Get list of files on tape and disk
@@ -163,6 +173,11 @@ def main():
                 # writer.writelines([x+"\n" for x in files])
                 json.dump(files,writer)
 
+    # Compile the spot mapping once so that the lotus jobs can share it without parsing it
+    if os.path.exists('ceda_all_datasets.ini'):
+        from ceda_elasticsearch_tools.core.spot_index import compile_spot_file
+        compile_spot_file('ceda_all_datasets.ini')
+
     # Create lotus jobs for files on tape
     for i,file in enumerate(os.listdir(os.path.join(BATCH_DIR,"on_tape"))):
         if args['--index-docs']:
@@ -174,7 +189,7 @@ def main():
                 index=index, input_file=os.path.join(BATCH_DIR,"on_tape", file), output_dir=OUTPUT_DIR
             )
 
-        subprocess.call("bsub -q short-serial -W 24:00 {}".format(cmd),shell=True)
+        subprocess.call("bsub -q short-serial -W 24:00 {}{}".format(cmd, rate_options),shell=True)
         if i> 0 and i % 10 == 0:
             print ("Waiting before submitting new jobs")
             sleep(40)
@@ -191,7 +206,7 @@ def main():
             )
 
         print(cmd)
-        subprocess.call("bsub -q short-serial -W 24:00 {}".format(cmd),shell=True)
+        subprocess.call("bsub -q short-serial -W 24:00 {}{}".format(cmd, rate_options),shell=True)
 
 if __name__ == "__main__":
 
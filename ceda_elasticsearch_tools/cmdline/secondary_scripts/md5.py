@@ -14,6 +14,13 @@ Usage:
                    [-h HOSTNAME             | --hostname HOSTNAME               ]
                    [-p PORT                 | --port    PORT                    ]
                    [--pagefile PAGE_FILE                                        ]
+                   [--workers WORKERS                                           ]
+                   [--mmap                                                      ]
+                   [--digests ALGORITHMS                                        ]
+                   [--cache CACHE_FILE                                          ]
+                   [--shared-cache SHARED_CACHE_FILE                            ]
+                   [--max-rate DOCS_PER_SECOND                                  ]
+                   [--feedback                                                  ]
 
 
 Options:
@@ -26,6 +33,16 @@ Options:
     -h  --hostname      Elasticsearch host to query [default: jasmin-es1.ceda.ac.uk]
     -p  --port          Elasticsearch read/write port [default: 9200]
     --pagefile          File containing elasticsearch _id and path information
+    --workers WORKERS   Files hashed concurrently with --pagefile [default: 16]
+    --mmap              Memory map the files instead of reading them into a buffer
+    --digests ALGORITHMS    Comma separated digests computed from one read of each file with --pagefile and
+                            written to info.<algorithm> [default: md5]
+    --cache CACHE_FILE  SQLite cache of the digests of unchanged files used with --pagefile. Concurrent jobs
+                        should each have their own file. (default: no cache)
+    --shared-cache SHARED_CACHE_FILE    SQLite cache opened read only and checked after --cache, eg. the
+                        caches of earlier jobs merged by update_md5.py. (default: none)
+    --max-rate DOCS_PER_SECOND  Limit bulk updates to this many documents per second
+    --feedback          With --max-rate, back off when the cluster write queues fill up
 
 """
 from docopt import docopt
@@ -33,8 +50,8 @@ from ceda_elasticsearch_tools.core import updater
 from datetime import datetime
 import os, logging
 from ceda_elasticsearch_tools import __version__
-import hashlib
-import simplejson as json
+from ceda_elasticsearch_tools.elasticsearch import BulkRateLimiter, ThreadPoolFeedback
+import json
 
 
 def logger_setup(log_dir):
@@ -65,11 +82,22 @@ def file_md5(fname):
     :param fname: File to calculate md5 for
     :return: MD5 checksum hex value
     """
-    hash_md5 = hashlib.md5()
-    with open(fname,'rb') as f:
-        for chunk in iter(lambda: f.read(4096),b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
+    from ceda_elasticsearch_tools.core import hashing
+    return hashing.file_md5(fname)
+
+
+def read_pagefile(reader):
+    """
+    :param reader: Open page file with one _id,path per line
+    :return: Generator of (_id, path)
+    """
+    for line in reader:
+        line_split = line.split(',')
+
+        if len(line_split) < 2:
+            continue
+
+        yield line_split[0].strip(), line_split[1].strip()
 
 
 def main():
@@ -99,6 +127,10 @@ def main():
     # Initialise the elasticsearch updater instance
     update = updater.ElasticsearchUpdater(index=index, host=host, port=port)
 
+    if arguments["--max-rate"]:
+        feedback = ThreadPoolFeedback(update.es) if arguments["--feedback"] else None
+        update.rate_limiter = BulkRateLimiter(docs_per_second=float(arguments["--max-rate"]), feedback=feedback)
+
     if pagefile is None:
         # Are processing log files by spot
 
@@ -112,39 +144,59 @@ def main():
 
     else:
         # Are calculating MD5s from scratch.
-        with open(os.path.join('page_files',pagefile)) as reader:
-            lines = reader.readlines()
-
-            # Check md5s
-            update_total = 0
-            md5_json = ""
-
+        import sqlite3
+        from ceda_elasticsearch_tools.core.checksum_cache import ChecksumCache
+        from ceda_elasticsearch_tools.core.hashing import FileHasher
+
+        algorithms = [algorithm.strip() for algorithm in (arguments["--digests"] or "md5").split(",")]
+        cache = None
+        if arguments["--cache"]:
+            read_only = [arguments["--shared-cache"]] if arguments["--shared-cache"] else []
             try:
-                for file in lines:
-                    line_split = file.split(',')
+                cache = ChecksumCache(arguments["--cache"], read_only=read_only)
+            except sqlite3.Error as error:
+                logger.warning("Checksum cache {} unavailable, hashing every file: {}".format(arguments["--cache"], error))
+        hasher = FileHasher(workers=int(arguments["--workers"] or 16), use_mmap=arguments["--mmap"],
+                            algorithms=algorithms, cache=cache)
 
-                    es_id = line_split[0].strip()
-                    file_path = line_split[1].strip()
+        with open(os.path.join('page_files', pagefile)) as reader:
+            entries = list(read_pagefile(reader))
 
-                    md5 = file_md5(file_path)
+        update_total = 0
+        md5_json = ""
 
-                    if md5:
-                        update_total += 1
+        try:
+            results = hasher.hash_files(path for _, path in entries)
 
-                        index = json.dumps({"update": {"_id": es_id, "_type": "file"}}) + "\n"
-                        md5_field = json.dumps({"source": {"doc": {"info": {"md5": md5}}}}) + "\n"
-                        md5_json += index + md5_field
+            for (es_id, _), result in zip(entries, results):
+                if result.digests is None:
+                    logger.error("Could not hash {}: {}".format(result.path, result.error))
+                    continue
 
-                    if update_total > 800:
-                        update.make_bulk_update(md5_json)
-                        md5_json = ""
-                        update_total = 0
+                update_total += 1
 
-                if md5_json:
+                md5_json += json.dumps({"update": {"_id": es_id}}) + "\n"
+                md5_json += json.dumps({"doc": {"info": result.digests}}) + "\n"
+
+                if update_total >= 800:
                     update.make_bulk_update(md5_json)
+                    md5_json = ""
+                    update_total = 0
+
+            if md5_json:
+                update.make_bulk_update(md5_json)
+
+        except Exception as msg:
+            logger.error(msg)
+
+        if cache is not None:
+            cache.close()
+
+        logger.info("Page file: {} {}".format(pagefile, hasher))
+        print("Hashed {} files, {:.1f} MB at {:.1f} MB/s".format(hasher.files, hasher.bytes / 1e6, hasher.throughput))
 
-            except Exception as msg:
-                logger.error(msg)
+        if cache is not None:
+            print("Checksum cache hits: {hits} misses: {misses}".format(**cache.stats()))
 
 
 if __name__ == "__main__":
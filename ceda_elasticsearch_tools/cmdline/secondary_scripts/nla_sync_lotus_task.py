@@ -16,6 +16,7 @@ Usage:
                 (--on-tape | --on-disk )
                 [(--host HOST)(--port PORT)]
                 [--index-docs]
+                [--max-rate DOCS_PER_SECOND [--feedback]]
     file_on_tape.py --version
 
 Options:
@@ -28,18 +29,20 @@ Options:
     --host          Elasticsearch host to target (default: jasmin-es1.ceda.ac.uk ).
     --port          Elasticsearch port to target (default: 9200 ).
     --index-docs    Index files not found at level 1 detail or if RESTORED create job for lotus.
+    --max-rate DOCS_PER_SECOND  Limit bulk updates and indexing to this many documents per second
+    --feedback      With --max-rate, back off when the cluster write queues fill up
 '''
 from docopt import docopt
 
 from ceda_elasticsearch_tools.core import updater
 from ceda_elasticsearch_tools.core.updater import ElasticsearchQuery
 from ceda_elasticsearch_tools.core.log_reader import SpotMapping
-import pkg_resources
+from ceda_elasticsearch_tools.core.spot_index import compile_spot_file
+from ceda_elasticsearch_tools import __version__
 import os
-import simplejson as json
+import json
 import re
 import hashlib
-from elasticsearch import Elasticsearch
 
 
 class NLASync():
@@ -47,7 +50,7 @@ class NLASync():
     def __init__(self, config):
         self.CONFIG = config
         self.location = None
-        self.spots = SpotMapping(spot_file='ceda_all_datasets.ini')
+        self.spots = SpotMapping(compiled_file=compile_spot_file('ceda_all_datasets.ini'))
 
         if config['--on-disk']:
             self.location = True
@@ -92,12 +95,22 @@ class NLASync():
         else:
             self.port = config['PORT']
 
-        self.es = Elasticsearch([{'host': self.host, 'port': self.port}])
+        # Honours CEDA_ES_RECORD and CEDA_ES_REPLAY to record a run and profile it offline
+        from ceda_elasticsearch_tools.elasticsearch import CEDAElasticsearchClient
+        self.es = CEDAElasticsearchClient(hosts=[f'{self.host}:{self.port}'], use_ssl=False, ca_certs=None)
 
-    def get_level1_file_info(self, file_path):
+        self.rate_limiter = None
+        if config.get('--max-rate'):
+            from ceda_elasticsearch_tools.elasticsearch import BulkRateLimiter, ThreadPoolFeedback
+
+            feedback = ThreadPoolFeedback(self.es) if config.get('--feedback') else None
+            self.rate_limiter = BulkRateLimiter(docs_per_second=float(config['--max-rate']), feedback=feedback)
+
+    def get_level1_file_info(self, file_path, spot=None):
         """
         Get level 1 file information from NLA and file name
         :param file_path: full path to file
+        :param spot: spot for the file, if already known. (default: looked up from the spot mapping)
         :return: python dict to be converted into json es document.
         """
 
@@ -111,7 +124,8 @@ class NLASync():
         info['size'] = self.file_dict[file_path]
         info['md5'] = ""
 
-        spot = self.spots.get_spot(file_path)
+        if spot is None:
+            spot = self.spots.get_spot(file_path)
 
         if spot is not None:
             info['spot_name'] = spot
@@ -153,8 +167,10 @@ class NLASync():
         files_to_index = []
         file_array = []
 
-        for i, filename in enumerate(file_list, 1):
-            doc = self.get_level1_file_info(filename)
+        spots = self.spots.get_spots(file_list)
+
+        for i, (filename, spot) in enumerate(zip(file_list, spots), 1):
+            doc = self.get_level1_file_info(filename, spot)
 
             if doc is not None:
                 es_id = hashlib.sha1(filename).hexdigest()
@@ -190,6 +206,9 @@ class NLASync():
         action_list, files_to_index = self.create_bulk_index_json(files_to_index, self.blocksize)
 
         for action, files in zip(action_list, files_to_index):
+            if self.rate_limiter is not None:
+                self.rate_limiter.throttle_bulk(action)
+
             r = self.es.bulk(body=action, request_timeout=120)
             self.process_response_for_errors(r, files)
         print(f"Files indexed: {self.files_indexed} Database Errors: {self.database_errors} Properties errors: {self.files_properties_errors}")
@@ -221,7 +240,7 @@ class NLASync():
 
     def sync_NLA_file_location(self):
 
-        es_update = updater.ElasticsearchUpdater(self.index, self.host, self.port)
+        es_update = updater.ElasticsearchUpdater(self.index, self.host, self.port, rate_limiter=self.rate_limiter)
 
         params, query = ElasticsearchQuery.ceda_fbs()
 
@@ -231,7 +250,7 @@ class NLASync():
 
 
 def main():
-    config = docopt(__doc__, version=pkg_resources.require("ceda_elasticsearch_tools")[0].version)
+    config = docopt(__doc__, version=__version__)
 
     sync = NLASync(config)
 
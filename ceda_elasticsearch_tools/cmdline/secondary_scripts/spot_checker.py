@@ -25,13 +25,14 @@ from docopt import docopt
 
 
 import os
-import simplejson as json
-from elasticsearch import Elasticsearch
+import json
 from ceda_elasticsearch_tools import __version__
 import hashlib
 
 
 def es_connection(host="jasmin-es1.ceda.ac.uk", port=9200):
+    from elasticsearch import Elasticsearch
+
     conn = Elasticsearch(hosts=[{"host": host, "port": port}])
     return conn
 
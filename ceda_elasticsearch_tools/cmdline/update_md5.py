@@ -16,6 +16,7 @@ Usage:
                    [-p PORT         | --port    PORT        ]
                    [-c              | --calculate           ]
                    [--no-create-files                       ]
+                   [--checksum-cache-dir CACHE_DIR          ]
 
 
 Options:
@@ -27,6 +28,9 @@ Options:
     -p  --port          Elasticsearch read/write port [default: 9200]
     -c  --calculate     Calculate the MD5s from scratch and ignore the log files when calculating MD5
     --no-create-files   Don't repeat the elasticsearch download phase
+    --checksum-cache-dir CACHE_DIR  With --calculate, keep an SQLite checksum cache for each job in this
+                        directory. The caches of earlier runs are merged before the jobs are submitted and
+                        read by every job, so a rerun does not hash unchanged files again
 
 """
 from docopt import docopt
@@ -35,7 +39,7 @@ from datetime import datetime
 import os, logging
 from ceda_elasticsearch_tools import __version__
 import subprocess
-import simplejson as json
+import json
 from ceda_elasticsearch_tools.core.updater import ElasticsearchUpdater
 import math
 from ceda_elasticsearch_tools.core.utils import ProgressBar
@@ -230,6 +234,13 @@ def calculate_md5s(arguments):
         # Download ES id and filepath to local file.
         download_files_missing_md5(index, host, port, document_output)
 
+    # Pages are numbered again on each run, so the caches of the earlier jobs are merged into one which
+    # every job reads
+    cache_dir = arguments["--checksum-cache-dir"]
+    if cache_dir:
+        from ceda_elasticsearch_tools.core.checksum_cache import merge_caches
+        shared_cache = merge_caches(cache_dir)
+
     # Submit those files as jobs to lotus
     print ("Submit jobs to lotus")
     for file in os.listdir(document_output):
@@ -238,6 +249,10 @@ def calculate_md5s(arguments):
             log_dir=log_dir,
             page=file)
 
+        # Each job writes its own cache, so the concurrent jobs never wait on each other's locks
+        if cache_dir:
+            command += ' --cache {} --shared-cache {}'.format(os.path.join(cache_dir, file + '.sqlite'), shared_cache)
+
         subprocess.call("bsub -q short-serial -W 24:00 {}".format(command),shell=True)
 
 
@@ -0,0 +1,155 @@
+# encoding: utf-8
+"""
+Check a backlog of deposit logs against an index.
+
+The logs are parsed in a process pool while the files deposited in each log are
+checked against the index in batches using mget on the document ids, which is
+far cheaper than a search per file. Results are reported per log with the
+time taken to parse and check it.
+
+Usage::
+
+    es = CEDAElasticsearchClient()
+    for report in process_backlog(logs, FileExistenceChecker(es, 'ceda-fbi')):
+        print(report)
+"""
+__author__ = 'Richard Smith'
+__date__ = '19 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import collections
+import hashlib
+import os
+import time
+
+from ceda_elasticsearch_tools.core.log_reader import DepositLog
+
+
+def path_id(path):
+    """
+    Document id used in the file indices. sha1 of the file path.
+    """
+    return hashlib.sha1(path.encode('utf-8')).hexdigest()
+
+
+class FileExistenceChecker(object):
+    """
+    Checks which files are missing from an index in batches
+    """
+
+    def __init__(self, es, index, id_func=path_id, batch_size=1000):
+        """
+        :param es:          Elasticsearch client
+        :param index:       Index to check
+        :param id_func:     Function from file path to document id. (default: sha1 of the path)
+        :param batch_size:  Ids in each mget request. (default: 1000)
+        """
+        self.es = es
+        self.index = index
+        self.id_func = id_func
+        self.batch_size = batch_size
+
+    def missing(self, paths):
+        """
+        :param paths:   List of file paths
+        :return: List of the paths which are not in the index
+        """
+        missing = []
+
+        for start in range(0, len(paths), self.batch_size):
+            batch = paths[start:start + self.batch_size]
+            ids = {self.id_func(path): path for path in batch}
+
+            response = self.es.mget(index=self.index, ids=list(ids), source=False, filter_path='docs._id,docs.found')
+
+            found = {doc['_id'] for doc in response.get('docs', []) if doc.get('found')}
+            missing.extend(path for doc_id, path in ids.items() if doc_id not in found)
+
+        return missing
+
+
+def read_deposits(path):
+    """
+    Parse a deposit log. Run in the worker processes.
+
+    :param path: Path to the log
+    :return: (list of deposited files, seconds taken)
+    """
+    start = time.perf_counter()
+    deposits = DepositLog(log_filename=path).deposit_list
+    return deposits, time.perf_counter() - start
+
+
+class LogReport(object):
+    """
+    Result of checking one log
+    """
+
+    def __init__(self, log, deposits, missing, parse_seconds, check_seconds):
+        self.log = log
+        self.deposits = deposits
+        self.missing = missing
+        self.parse_seconds = parse_seconds
+        self.check_seconds = check_seconds
+
+    @property
+    def files_per_second(self):
+        seconds = self.parse_seconds + self.check_seconds
+        return self.deposits / seconds if seconds else 0.0
+
+    def __str__(self):
+        return (f'{self.log} deposits: {self.deposits} missing: {len(self.missing)} '
+                f'parse: {self.parse_seconds:.2f}s check: {self.check_seconds:.2f}s '
+                f'({self.files_per_second:.0f} files/s)')
+
+
+def backlog_logs(log_dir=None, prefix='deposit_ingest1.', newest_first=True):
+    """
+    :return: Paths to the deposit logs in log_dir
+    """
+    log_dir = log_dir or DepositLog.log_dir
+    logs = sorted((log for log in os.listdir(log_dir) if log.startswith(prefix)), reverse=newest_first)
+    return [os.path.join(log_dir, log) for log in logs]
+
+
+def process_backlog(logs, checker, processes=None):
+    """
+    Parse the logs in a process pool and check the deposited files against the
+    index as each log becomes available. Reports are returned in the order of
+    logs. Only a few parsed logs are held waiting at a time.
+
+    :param logs:        Paths to the deposit logs
+    :param checker:     FileExistenceChecker
+    :param processes:   Worker processes for parsing. (default: number of CPUs)
+    :return: Generator of LogReport
+    """
+    processes = processes or os.cpu_count() or 1
+    logs = iter(logs)
+    pending = collections.deque()
+
+    # Loads multiprocessing, so only imported when used
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+
+        def submit():
+            log = next(logs, None)
+            if log is not None:
+                pending.append((log, executor.submit(read_deposits, log)))
+
+        for _ in range(processes * 2):
+            submit()
+
+        while pending:
+            log, future = pending.popleft()
+            submit()
+
+            deposits, parse_seconds = future.result()
+
+            start = time.perf_counter()
+            missing = checker.missing(deposits)
+
+            yield LogReport(os.path.basename(log), len(deposits), missing, parse_seconds,
+                            time.perf_counter() - start)
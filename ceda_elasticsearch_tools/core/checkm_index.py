@@ -0,0 +1,270 @@
+# encoding: utf-8
+"""
+Binary sidecar index for checkm logs.
+
+Parsing a checkm log into a dict costs seconds and hundreds of megabytes for a
+large spot, and every md5.py task parsed it again. CheckmIndex parses a log
+once and writes a sidecar file of sorted 64 bit path hashes followed by the
+matching 16 byte MD5 digests. Later runs memory map the sidecar and look a
+path up with a binary search, so opening it is almost free and the pages are
+shared between processes.
+
+The sidecar records the mtime and size of the log it was built from and is
+rebuilt when they change.
+
+Layout, native byte order::
+
+    header     magic, byte order mark, count, log mtime_ns, log size
+    hashes     count * 8 bytes, sorted
+    positions  count * 4 bytes, the number of the MD5 entry in the log which set each checksum
+    digests    count * 16 bytes, in the order of the hashes
+
+Paths are only stored as hashes, so two paths with the same 64 bit hash
+cannot be told apart. For a million file spot the chance of any path lookup
+returning the wrong checksum is around 1 in 10**13.
+"""
+__author__ = 'Richard Smith'
+__date__ = '19 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import bisect
+import hashlib
+import logging
+import mmap
+import os
+import struct
+from array import array
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'CHECKMI2'
+BYTE_ORDER_MARK = 0x0102030405060708
+HEADER = struct.Struct('=8sQQqQ')
+
+
+def default_index_dir():
+    """
+    :return: CEDA_CHECKM_INDEX_DIR or ~/.cache/ceda_elasticsearch_tools/checkm
+    """
+    return os.environ.get('CEDA_CHECKM_INDEX_DIR') or os.path.join(
+        os.path.expanduser('~'), '.cache', 'ceda_elasticsearch_tools', 'checkm'
+    )
+
+
+def path_hash(path):
+    """
+    :return: 64 bit hash of a path, stable between processes
+    """
+    return int.from_bytes(hashlib.blake2b(path.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def md5_entries(reader):
+    """
+    Read the MD5 entries from a checkm log. Entries with other checksum types are skipped.
+
+    e.g. line: metadata/csml/seviri_frp.xml|md5|69b829decea5563e33b0856ec80a0c83|806321|2010-04-29T11:10:13Z
+
+    :param reader: Open checkm log
+    :return: Generator of (path relative to the spot, digest bytes)
+    """
+    for line in reader:
+        if line.startswith('#') or line.find('|') < 0:
+            continue
+
+        fields = line.strip().split('|')
+        if len(fields) != 5 or fields[1] != 'md5':
+            continue
+
+        try:
+            digest = bytes.fromhex(fields[2])
+        except ValueError:
+            continue
+
+        if len(digest) == 16:
+            yield fields[0], digest
+
+
+def build_index(log_path):
+    """
+    Build the index for a checkm log. A path listed twice keeps its last checksum.
+
+    :param log_path: Path to the checkm log
+    :return: Index file content (bytes)
+    """
+    stat = os.stat(log_path)
+
+    with open(log_path) as reader:
+        entries = {path_hash(path): (position, digest) for position, (path, digest) in enumerate(md5_entries(reader))}
+
+    keys = sorted(entries)
+    hashes = array('Q', keys)
+    positions = array('I', (entries[key][0] for key in keys))
+
+    return b''.join((
+        HEADER.pack(MAGIC, BYTE_ORDER_MARK, len(keys), stat.st_mtime_ns, stat.st_size),
+        hashes.tobytes(),
+        positions.tobytes(),
+        b''.join(entries[key][1] for key in keys),
+    ))
+
+
+class CheckmIndex(object):
+    """
+    Read only mapping of archive path to MD5 hex digest for one checkm log. Usage::
+
+        with CheckmIndex.open(log_path, '/badc/accacia') as index:
+            md5 = index.get('/badc/accacia/data/file.nc', '')
+    """
+
+    def __init__(self, buffer, log_path=None, base_dir=''):
+        """
+        :param buffer:      Index file content. bytes or mmap.
+        :param log_path:    Checkm log the index was built from. Used to iterate the paths.
+        :param base_dir:    Archive directory of the spot. Paths in the log are relative to this.
+        """
+        self._buffer = buffer
+        self.log_path = log_path
+        self.base_dir = base_dir
+        self._prefix = os.path.join(base_dir, '') if base_dir else ''
+
+        _, _, self.count, self.log_mtime_ns, self.log_size = HEADER.unpack_from(buffer)
+
+        view = memoryview(buffer)
+        hashes_end = HEADER.size + self.count * 8
+        positions_end = hashes_end + self.count * 4
+        self._hashes = view[HEADER.size:hashes_end].cast('Q')
+        self._positions = view[hashes_end:positions_end].cast('I')
+        self._digests = view[positions_end:positions_end + self.count * 16]
+
+    @staticmethod
+    def index_path(log_path, index_dir=None):
+        """
+        :return: Sidecar path for a checkm log, index_dir/<spot>/<log>.idx
+        """
+        spot = os.path.basename(os.path.dirname(os.path.abspath(log_path)))
+        return os.path.join(index_dir or default_index_dir(), spot, f'{os.path.basename(log_path)}.idx')
+
+    @staticmethod
+    def is_current(index_path, log_path):
+        """
+        :return: True if the sidecar exists and was built from the current version of the log
+        """
+        try:
+            with open(index_path, 'rb') as reader:
+                header = reader.read(HEADER.size)
+            stat = os.stat(log_path)
+        except OSError:
+            return False
+
+        if len(header) != HEADER.size:
+            return False
+
+        magic, mark, _, mtime_ns, size = HEADER.unpack(header)
+        return (magic, mark, mtime_ns, size) == (MAGIC, BYTE_ORDER_MARK, stat.st_mtime_ns, stat.st_size)
+
+    @classmethod
+    def open(cls, log_path, base_dir='', index_dir=None):
+        """
+        Open the sidecar for a checkm log, building it first if it is missing or out of date.
+        If the sidecar cannot be written the index is built in memory.
+
+        :param log_path:    Path to the checkm log
+        :param base_dir:    Archive directory of the spot
+        :param index_dir:   Directory holding the sidecars. (default: default_index_dir())
+        :return: CheckmIndex
+        """
+        index_path = cls.index_path(log_path, index_dir)
+
+        if not cls.is_current(index_path, log_path):
+            content = build_index(log_path)
+
+            try:
+                os.makedirs(os.path.dirname(index_path), exist_ok=True)
+                tmp_path = f'{index_path}.{os.getpid()}.tmp'
+                with open(tmp_path, 'wb') as writer:
+                    writer.write(content)
+                os.replace(tmp_path, index_path)
+
+            except OSError as e:
+                logger.warning(f'Could not write checkm index {index_path}: {e}')
+                return cls(content, log_path, base_dir)
+
+        with open(index_path, 'rb') as reader:
+            buffer = mmap.mmap(reader.fileno(), 0, access=mmap.ACCESS_READ)
+
+        return cls(buffer, log_path, base_dir)
+
+    def _relative(self, path):
+        if self._prefix and path.startswith(self._prefix):
+            return path[len(self._prefix):]
+        return path
+
+    def _find(self, key):
+        """
+        :return: Position of the hash in the index or None
+        """
+        i = bisect.bisect_left(self._hashes, key)
+
+        if i < self.count and self._hashes[i] == key:
+            return i
+
+        return None
+
+    def get(self, path, default=None):
+        """
+        :param path:    Archive path, base_dir joined with the path in the log
+        :return: MD5 hex digest or default
+        """
+        i = self._find(path_hash(self._relative(path)))
+
+        if i is None:
+            return default
+
+        return self._digests[i * 16:i * 16 + 16].hex()
+
+    def __getitem__(self, path):
+        md5 = self.get(path)
+        if md5 is None:
+            raise KeyError(path)
+        return md5
+
+    def __contains__(self, path):
+        return self.get(path) is not None
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        """
+        Paths are not stored in the index, so they are read from the log. A
+        path listed more than once is yielded at the entry which set its
+        checksum, so each path is yielded once.
+        """
+        if self.log_path is None:
+            return
+
+        with open(self.log_path) as reader:
+            for position, (path, _) in enumerate(md5_entries(reader)):
+                i = self._find(path_hash(path))
+                if i is not None and self._positions[i] == position:
+                    yield os.path.join(self.base_dir, path)
+
+    def close(self):
+        # Release the views before the mmap they point into
+        self._hashes.release()
+        self._positions.release()
+        self._digests.release()
+
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return f'CheckmIndex({self.log_path!r}, {self.count} checksums)'
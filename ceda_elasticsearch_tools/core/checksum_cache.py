@@ -0,0 +1,239 @@
+# encoding: utf-8
+"""
+Persistent cache of file checksums keyed by path and stat.
+
+Reruns of md5.py after a partial failure hashed every file of the page again.
+ChecksumCache stores each digest computed in an SQLite database with the
+inode, size and mtime of the file when it was hashed. A file whose stat still
+matches is not read again.
+
+A changed file has a new mtime or size, so its entry no longer matches and it
+is hashed again. A file rewritten within the mtime resolution with the same
+size would not be noticed, as with rsync and make.
+
+Each entry is committed as soon as it is written, so the write lock is only
+held for the insert and not while the next files are hashed. The database is
+in WAL mode, so readers do not block the writer. SQLite locking is unreliable
+on network filesystems, so concurrent jobs should each use their own database,
+eg. one per page file, or share one on a local disk.
+
+Page files are numbered again on each run, so a job's database does not hold
+the files of its next page. Before the jobs of a run are started,
+merge_caches folds the databases of the earlier jobs into one, which each
+job attaches read only and checks after its own.
+"""
+__author__ = 'Richard Smith'
+__date__ = '19 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import logging
+import os
+import sqlite3
+from urllib.parse import quote
+
+logger = logging.getLogger(__name__)
+
+MERGED_CACHE = 'checksums.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checksums (
+    path        TEXT    NOT NULL,
+    algorithm   TEXT    NOT NULL,
+    inode       INTEGER NOT NULL,
+    size        INTEGER NOT NULL,
+    mtime_ns    INTEGER NOT NULL,
+    digest      TEXT    NOT NULL,
+    PRIMARY KEY (path, algorithm)
+)
+"""
+
+
+def default_cache_path():
+    """
+    :return: CEDA_CHECKSUM_CACHE or ~/.cache/ceda_elasticsearch_tools/checksums.sqlite
+    """
+    return os.environ.get('CEDA_CHECKSUM_CACHE') or os.path.join(
+        os.path.expanduser('~'), '.cache', 'ceda_elasticsearch_tools', 'checksums.sqlite'
+    )
+
+
+class ChecksumCache(object):
+    """
+    SQLite cache of file digests which counts its hits and misses. Usage::
+
+        with ChecksumCache() as cache:
+            stat = os.stat(path)
+            digests = cache.get(path, stat, ['md5'])
+            if digests is None:
+                digests = compute(path)
+                cache.put(path, stat, digests)
+    """
+
+    def __init__(self, path=None, timeout=60, read_only=()):
+        """
+        :param path:        Database file, created if missing. (default: default_cache_path())
+        :param timeout:     Seconds to wait for another process's write lock. (default: 60)
+        :param read_only:   Database files attached read only and looked up, in order, when a file
+                            is not in this one. Missing files are skipped. (default: none)
+        :raises sqlite3.Error: If a database cannot be opened
+        """
+        self.path = path or default_cache_path()
+
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        # Autocommit. Transactions are opened explicitly in put. Only names starting file: are URIs,
+        # so path is opened as it is.
+        self._connection = sqlite3.connect(self.path, timeout=timeout, isolation_level=None, uri=True)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(SCHEMA)
+
+        self._schemas = ['main']
+        for read_only_path in read_only:
+            if not os.path.exists(read_only_path):
+                continue
+
+            schema = f'read_only_{len(self._schemas)}'
+            self._connection.execute(f'ATTACH DATABASE ? AS {schema}',
+                                     (f'file:{quote(os.path.abspath(read_only_path))}?mode=ro',))
+            self._schemas.append(schema)
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path, stat, algorithms):
+        """
+        :param path:        File path
+        :param stat:        os.stat_result of the file
+        :param algorithms:  Digests wanted
+        :return: dict of algorithm to hex digest, or None unless all the digests are cached for this stat
+                 in one of the databases
+        """
+        for schema in self._schemas:
+            rows = self._connection.execute(
+                f'SELECT algorithm, digest FROM {schema}.checksums '
+                'WHERE path = ? AND inode = ? AND size = ? AND mtime_ns = ?',
+                (path, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+            ).fetchall()
+
+            cached = dict(rows)
+            digests = {algorithm: cached[algorithm] for algorithm in algorithms if algorithm in cached}
+
+            if len(digests) == len(algorithms):
+                self.hits += 1
+                return digests
+
+        self.misses += 1
+        return None
+
+    def put(self, path, stat, digests):
+        """
+        :param path:    File path
+        :param stat:    os.stat_result of the file, taken before it was hashed
+        :param digests: dict of algorithm to hex digest
+        :raises sqlite3.Error: If the entry cannot be written, eg. the database is locked for longer than timeout
+        """
+        connection = self._connection
+        connection.execute('BEGIN IMMEDIATE')
+
+        try:
+            connection.executemany(
+                'INSERT OR REPLACE INTO checksums (path, algorithm, inode, size, mtime_ns, digest) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                [(path, algorithm, stat.st_ino, stat.st_size, stat.st_mtime_ns, digest)
+                 for algorithm, digest in digests.items()]
+            )
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+        connection.execute('COMMIT')
+
+    def merge(self, path):
+        """
+        Copy the entries of another cache database into this one, replacing entries for the same path.
+
+        :param path: Database file
+        :raises sqlite3.Error: If the database cannot be read
+        """
+        connection = self._connection
+        connection.execute('ATTACH DATABASE ? AS merged', (path,))
+
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                connection.execute(
+                    'INSERT OR REPLACE INTO main.checksums (path, algorithm, inode, size, mtime_ns, digest) '
+                    'SELECT path, algorithm, inode, size, mtime_ns, digest FROM merged.checksums'
+                )
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+
+            connection.execute('COMMIT')
+
+        finally:
+            connection.execute('DETACH DATABASE merged')
+
+    def __len__(self):
+        return self._connection.execute('SELECT COUNT(DISTINCT path) FROM checksums').fetchone()[0]
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        """
+        :return: dict of cache hits, misses and hit rate
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hit_rate}
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def merge_caches(cache_dir, merged_name=MERGED_CACHE):
+    """
+    Merge the per job databases in a directory into one and delete them. Run it before the
+    jobs are started, while no job has the databases open. A database which cannot be read is
+    left in place.
+
+    :param cache_dir:   Directory of .sqlite cache databases
+    :param merged_name: File name of the merged database in cache_dir. (default: checksums.sqlite)
+    :return: Path to the merged database
+    """
+    merged_path = os.path.join(cache_dir, merged_name)
+
+    with ChecksumCache(merged_path) as merged:
+        for name in sorted(os.listdir(cache_dir)):
+            path = os.path.join(cache_dir, name)
+
+            if not name.endswith('.sqlite') or name == merged_name:
+                continue
+
+            try:
+                merged.merge(path)
+            except sqlite3.Error as error:
+                logger.warning(f'Could not merge checksum cache {path}: {error}')
+                continue
+
+            for suffix in ('', '-wal', '-shm'):
+                try:
+                    os.remove(path + suffix)
+                except FileNotFoundError:
+                    pass
+
+        # The jobs only read the merged database, so it does not need a WAL
+        merged._connection.execute('PRAGMA journal_mode=DELETE')
+
+    return merged_path
@@ -0,0 +1,199 @@
+# encoding: utf-8
+"""
+Follow the live deposit logs.
+
+Rather than re-reading the penultimate log in full, DepositLogFollower
+remembers the log, inode and byte offset of the last complete line it read and
+on each poll reads only the lines appended since. When a newer log appears the
+rest of the current log is read before moving on to the start of the next one.
+The position is saved to a small JSON state file so a restarted process carries
+on where it stopped.
+
+Usage::
+
+    follower = DepositLogFollower('/var/lib/ceda/deposit_follower.json')
+
+    for events in follower.follow(interval=30):
+        process(events)
+"""
+__author__ = 'Richard Smith'
+__date__ = '19 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import itertools
+import json
+import logging
+import os
+import time
+
+from ceda_elasticsearch_tools.core.log_reader import DepositLog, deposit_events
+
+logger = logging.getLogger(__name__)
+
+
+class DepositLogFollower(object):
+    """
+    Incrementally read the deposit logs, handling rotation to the next log.
+    """
+
+    def __init__(self, state_file=None, log_dir=None, prefix='deposit_ingest1.', actions=None, start='beginning'):
+        """
+        :param state_file:  JSON file to keep the position in. (default: position is kept in memory only)
+        :param log_dir:     Directory containing the logs. (default: DepositLog.log_dir)
+        :param prefix:      Log file prefix. Logs are ordered on their names.
+        :param actions:     Collection of actions to return. (default: all)
+        :param start:       With no saved position, start at the beginning or end of the newest log.
+                            (beginning|end)
+        """
+        self.state_file = state_file
+        self.log_dir = log_dir or DepositLog.log_dir
+        self.prefix = prefix
+        self.actions = actions
+
+        self.filename = None
+        self.inode = None
+        self.offset = 0
+
+        if state_file and os.path.exists(state_file):
+            with open(state_file) as reader:
+                state = json.load(reader)
+            self.filename = state['filename']
+            self.inode = state['inode']
+            self.offset = state['offset']
+
+        elif start == 'end':
+            self.filename = self._latest_log()
+            if self.filename:
+                stat = os.stat(self._path(self.filename))
+                self.inode = stat.st_ino
+                self.offset = stat.st_size
+
+    def _path(self, filename):
+        return os.path.join(self.log_dir, filename)
+
+    def _logs(self):
+        return sorted(log for log in os.listdir(self.log_dir) if log.startswith(self.prefix))
+
+    def _latest_log(self):
+        logs = self._logs()
+        return logs[-1] if logs else None
+
+    def _next_log(self):
+        """
+        :return: The log after the current one or None
+        """
+        for log in self._logs():
+            if self.filename is None or log > self.filename:
+                return log
+        return None
+
+    def state(self):
+        return {'filename': self.filename, 'inode': self.inode, 'offset': self.offset}
+
+    def save(self):
+        """
+        Write the position to the state file, replacing it atomically
+        """
+        if not self.state_file:
+            return
+
+        tmp_path = f'{self.state_file}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as writer:
+            json.dump(self.state(), writer)
+        os.replace(tmp_path, self.state_file)
+
+    def _read_lines(self):
+        """
+        Read complete lines from the current log after the offset. The offset
+        advances past each line as it is returned, so a partly written last
+        line is left for the next read.
+
+        :return: Generator of lines
+        """
+        path = self._path(self.filename)
+
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            logger.warning(f'Deposit log {path} has gone')
+            return
+
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            # A new file with the same name, or the log was truncated
+            if self.inode is not None:
+                logger.info(f'Deposit log {path} was replaced. Reading from the start')
+            self.inode = stat.st_ino
+            self.offset = 0
+
+        with open(path, 'rb') as reader:
+            reader.seek(self.offset)
+
+            for line in reader:
+                if not line.endswith(b'\n'):
+                    break
+
+                self.offset += len(line)
+                yield line.decode('utf-8', errors='replace')
+
+    def _switch_to(self, filename):
+        logger.info(f'Following deposit log {filename}')
+        self.filename = filename
+        self.inode = None
+        self.offset = 0
+
+    def _lines(self):
+        """
+        Read all lines added since the last read, moving on through any newer logs
+        """
+        if self.filename is None:
+            filename = self._latest_log()
+            if filename is None:
+                return
+            self._switch_to(filename)
+
+        while True:
+            yield from self._read_lines()
+
+            # Only move on once the current log has been read to the end
+            next_log = self._next_log()
+            if next_log is None:
+                return
+
+            self._switch_to(next_log)
+
+    def poll(self, limit=None):
+        """
+        Read the events appended since the last poll and save the new position.
+
+        :param limit:   Maximum number of events to return. The rest are returned by later polls.
+        :return: List of DepositEvent
+        """
+        events = deposit_events(self._lines(), self.actions)
+
+        try:
+            batch = list(itertools.islice(events, limit))
+        finally:
+            events.close()
+
+        self.save()
+        return batch
+
+    def follow(self, interval=10.0, batch_size=10000, stop=None, sleep=time.sleep):
+        """
+        Poll the logs forever, yielding each non empty batch of events.
+
+        :param interval:    Seconds to wait between polls when there is nothing new
+        :param batch_size:  Maximum events in each batch
+        :param stop:        Optional threading.Event which ends the loop when set
+        :param sleep:       Sleep function
+        :return: Generator of lists of DepositEvent
+        """
+        while stop is None or not stop.is_set():
+            events = self.poll(limit=batch_size)
+
+            if events:
+                yield events
+            else:
+                sleep(interval)
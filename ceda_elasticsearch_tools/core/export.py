@@ -0,0 +1,192 @@
+# encoding: utf-8
+"""
+Streaming export of documents from an index.
+
+Documents are read against a point in time, split into slices which are read
+in parallel and merged back into a single stream ordered on a key field. This
+gives every consumer the same, repeatable view of an index without holding it
+in memory.
+"""
+__author__ = 'Richard Smith'
+__date__ = '19 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import hashlib
+import heapq
+import json
+import queue
+import threading
+
+
+class BackgroundIterator(object):
+    """
+    Drain an iterator in a background thread through a bounded queue so that
+    network reads overlap with the work done by the consumer. Exceptions raised
+    by the source are re-raised in the consuming thread.
+    """
+
+    _DONE = object()
+
+    def __init__(self, source, maxsize=4):
+        """
+        :param source:  Iterator to read in the background
+        :param maxsize: Number of items to read ahead of the consumer
+        """
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(source,), daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self, source):
+        try:
+            for item in source:
+                if not self._put((item, None)):
+                    return
+        except Exception as exc:
+            self._put((self._DONE, exc))
+            return
+
+        self._put((self._DONE, None))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        item, exc = self._queue.get()
+
+        if item is self._DONE:
+            if exc is not None:
+                raise exc
+            raise StopIteration
+
+        return item
+
+    def close(self):
+        """
+        Stop the background reader. Safe to call more than once.
+        """
+        self._stop.set()
+
+
+def content_hash(source):
+    """
+    Stable digest of a document source. Keys are sorted so that two documents
+    with the same content produce the same hash regardless of field order.
+
+    :param source:  Document _source (dict)
+    :return: md5 hex digest
+    """
+    canonical = json.dumps(source, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.md5(canonical.encode('utf-8')).hexdigest()
+
+
+def _read_slice(es, pit_id, key_field, slice_id=0, slices=1, size=1000, query=None, source=True, keep_alive='5m'):
+    """
+    Page through one slice of a point in time using search_after.
+
+    :return: Generator of hits in ascending order of key_field
+    """
+
+    search_after = None
+
+    while True:
+        params = {
+            'pit': {'id': pit_id, 'keep_alive': keep_alive},
+            'sort': [{key_field: {'order': 'asc'}}],
+            'size': size,
+            'source': source,
+            'track_total_hits': False,
+        }
+
+        if query is not None:
+            params['query'] = query
+
+        if slices > 1:
+            params['slice'] = {'id': slice_id, 'max': slices}
+
+        if search_after is not None:
+            params['search_after'] = search_after
+
+        response = es.search(**params)
+        hits = response['hits']['hits']
+
+        if not hits:
+            return
+
+        # Documents missing the key field have no sort value and cannot be merged
+        for hit in hits:
+            if hit['sort'][0] is not None:
+                yield hit
+
+        # The PIT id can change between requests. Always use the latest.
+        pit_id = response.get('pit_id', pit_id)
+        search_after = hits[-1]['sort']
+
+
+def export_sorted(es, index, key_field='_id', slices=4, size=1000, query=None, source=True, keep_alive='5m'):
+    """
+    Export all documents matching query as a single stream ordered on key_field.
+
+    Each slice is read in its own thread and the ordered slices are merged, so
+    the consumer sees one sorted stream while the reads happen in parallel.
+    The key field must be sortable. Sorting on `_id` requires the cluster setting
+    `indices.id_field_data.enabled`, otherwise use a keyword field which holds a
+    unique key for the document.
+
+    :param es:          Elasticsearch client
+    :param index:       Index to export
+    :param key_field:   Field to order the export on. (default: _id)
+    :param slices:      Number of slices to read in parallel. (default: 4)
+    :param size:        Page size for each request. (default: 1000)
+    :param query:       Optional query to restrict the export
+    :param source:      _source filtering passed to elasticsearch. (default: True)
+    :param keep_alive:  Point in time keep alive. (default: 5m)
+    :return: Generator of hits. Documents missing key_field are skipped.
+    """
+
+    pit_id = es.open_point_in_time(index=index, keep_alive=keep_alive)['id']
+
+    readers = [
+        BackgroundIterator(
+            _read_slice(es, pit_id, key_field, slice_id, slices, size, query, source, keep_alive)
+        ) for slice_id in range(slices)
+    ]
+
+    try:
+        yield from heapq.merge(*readers, key=lambda hit: hit['sort'][0])
+
+    finally:
+        for reader in readers:
+            reader.close()
+
+        es.close_point_in_time(id=pit_id)
+
+
+def export_hashes(es, index, key_field='_id', excludes=None, **kwargs):
+    """
+    Export the key, _id and content hash for every document in an index,
+    ordered on key_field.
+
+    :param es:          Elasticsearch client
+    :param index:       Index to export
+    :param key_field:   Field to order the export on. (default: _id)
+    :param excludes:    List of fields to leave out of the content hash eg. timestamps
+    :param kwargs:      Passed through to export_sorted
+    :return: Generator of (key, _id, content hash) tuples
+    """
+
+    source = {'excludes': list(excludes)} if excludes else True
+
+    for hit in export_sorted(es, index, key_field=key_field, source=source, **kwargs):
+        yield hit['sort'][0], hit['_id'], content_hash(hit.get('_source', {}))
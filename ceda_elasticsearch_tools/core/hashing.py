@@ -0,0 +1,309 @@
+# encoding: utf-8
+"""
+Parallel, large buffer file hashing.
+
+Reading a file 4 KiB at a time in one thread leaves the parallel filesystems
+mostly idle. Files are read into a large reused buffer, or memory mapped, and
+hashed in a pool of workers sized for I/O concurrency rather than CPUs.
+hashlib releases the GIL while it hashes a large buffer, and so does the read,
+so threads scale until the filesystem or the CPUs are saturated. A process
+pool can be used instead if hashing rather than I/O is the bottleneck.
+
+Several digests can be computed from the same read of each file, so adding
+SHA-256 alongside MD5 costs CPU time but no extra I/O. With a ChecksumCache,
+files which have not changed since they were last hashed are not read.
+
+Usage::
+
+    hasher = FileHasher(workers=16, algorithms=('md5', 'sha256'))
+    for result in hasher.hash_files(paths):
+        print(result.path, result.digests['md5'], result.digests['sha256'], result.size)
+    print(hasher)
+"""
+__author__ = 'Richard Smith'
+__date__ = '19 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import collections
+import functools
+import hashlib
+import logging
+import mmap
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUFFER_SIZE = 4 * 1024 * 1024
+DEFAULT_WORKERS = 16
+DEFAULT_ALGORITHMS = ('md5',)
+
+# One read buffer per thread, reused for every file the thread hashes
+_buffers = threading.local()
+
+
+class HashResult(namedtuple('HashResult', ('path', 'digests', 'size', 'error', 'cached'), defaults=(False,))):
+    """
+    Digests of a file, a dict of algorithm to hex digest. digests is None and
+    error holds the message if the file could not be read. cached is True if
+    the digests came from the ChecksumCache.
+    """
+    __slots__ = ()
+
+    @property
+    def md5(self):
+        return self.digests.get('md5') if self.digests else None
+
+
+def check_algorithms(algorithms):
+    """
+    :param algorithms: hashlib algorithm names
+    :return: The names as a tuple
+    :raises ValueError: If hashlib does not provide an algorithm or its digests have no fixed length
+    """
+    algorithms = tuple(algorithms)
+
+    if not algorithms:
+        raise ValueError('No hash algorithms given')
+
+    for algorithm in algorithms:
+        # shake_128 and shake_256 need a length for each digest
+        try:
+            hashlib.new(algorithm).hexdigest()
+        except TypeError:
+            raise ValueError(f'{algorithm} has variable length digests')
+
+    return algorithms
+
+
+def _advise_sequential(fd):
+    # Ask the kernel to read ahead aggressively. Not available on all platforms.
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+    except (AttributeError, OSError):
+        pass
+
+
+def hash_file_digests(path, algorithms=DEFAULT_ALGORITHMS, buffer_size=DEFAULT_BUFFER_SIZE, use_mmap=False):
+    """
+    Compute several digests of a file from one read of its content.
+
+    :param path:        File to hash
+    :param algorithms:  hashlib algorithm names. (default: ('md5',))
+    :param buffer_size: Bytes read, or hashed from the memory map, at a time. (default: 4 MiB)
+    :param use_mmap:    Memory map the file instead of reading it into a buffer. (default: False)
+    :return: (dict of algorithm to hex digest, bytes hashed)
+    """
+    hashes = [(algorithm, hashlib.new(algorithm)) for algorithm in algorithms]
+    updates = [digest.update for _, digest in hashes]
+    size = 0
+
+    with open(path, 'rb', buffering=0) as reader:
+        fd = reader.fileno()
+        _advise_sequential(fd)
+
+        if use_mmap:
+            size = os.fstat(fd).st_size
+
+            # Empty files cannot be mapped
+            if size:
+                with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+                    for offset in range(0, size, buffer_size):
+                        chunk = view[offset:offset + buffer_size]
+                        for update in updates:
+                            update(chunk)
+                        chunk.release()
+
+            return {algorithm: digest.hexdigest() for algorithm, digest in hashes}, size
+
+        buffer = getattr(_buffers, 'buffer', None)
+        if buffer is None or len(buffer) != buffer_size:
+            buffer = _buffers.buffer = bytearray(buffer_size)
+        view = memoryview(buffer)
+
+        while True:
+            read = reader.readinto(buffer)
+            if not read:
+                break
+
+            chunk = view[:read]
+            for update in updates:
+                update(chunk)
+            chunk.release()
+            size += read
+
+    return {algorithm: digest.hexdigest() for algorithm, digest in hashes}, size
+
+
+def hash_file(path, buffer_size=DEFAULT_BUFFER_SIZE, use_mmap=False):
+    """
+    :return: (MD5 hex digest, bytes hashed)
+    """
+    digests, size = hash_file_digests(path, ('md5',), buffer_size, use_mmap)
+    return digests['md5'], size
+
+
+def file_md5(path, buffer_size=DEFAULT_BUFFER_SIZE, use_mmap=False):
+    """
+    :return: MD5 hex digest of the file content
+    """
+    return hash_file(path, buffer_size, use_mmap)[0]
+
+
+def _hash_result(path, algorithms, buffer_size, use_mmap):
+    """
+    :return: (HashResult, start, end) where start and end are time.monotonic() around the hashing
+    """
+    start = time.monotonic()
+
+    try:
+        digests, size = hash_file_digests(path, algorithms, buffer_size, use_mmap)
+    except OSError as error:
+        return HashResult(path, None, 0, str(error)), start, time.monotonic()
+
+    return HashResult(path, digests, size, None), start, time.monotonic()
+
+
+class FileHasher(object):
+    """
+    Hash batches of files in a thread or process pool and count the bytes and time taken.
+
+    seconds is the wall time during which at least one file was being hashed, so
+    the time the caller spends on each result, eg. sending it to elasticsearch,
+    does not lower the throughput.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, buffer_size=DEFAULT_BUFFER_SIZE, use_mmap=False, processes=False,
+                 algorithms=DEFAULT_ALGORITHMS, cache=None):
+        """
+        :param workers:     Files hashed at once. (default: 16)
+        :param buffer_size: Bytes read at a time from each file. (default: 4 MiB)
+        :param use_mmap:    Memory map the files instead of reading them. (default: False)
+        :param processes:   Hash in a process pool instead of a thread pool. (default: False)
+        :param algorithms:  hashlib algorithms computed from each read. (default: ('md5',))
+        :param cache:       ChecksumCache consulted before a file is read and updated after. If the cache
+                            fails, eg. it stays locked by another process, the files are hashed without it.
+                            (default: None)
+        """
+        self.algorithms = check_algorithms(algorithms)
+        self.workers = workers
+        self.buffer_size = buffer_size
+        self.use_mmap = use_mmap
+        self.processes = processes
+        self.cache = cache
+
+        self.files = 0
+        self.errors = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def hash_files(self, paths):
+        """
+        Hash the files, at most workers * 2 ahead of the caller, so paths can be
+        a generator over any number of files. Files found in the cache are
+        returned without being read.
+
+        :param paths: Iterable of file paths
+        :return: Generator of HashResult in the order of paths
+        """
+        paths = iter(paths)
+        pending = collections.deque()
+        hash_path = functools.partial(_hash_result, algorithms=self.algorithms, buffer_size=self.buffer_size,
+                                      use_mmap=self.use_mmap)
+        executor_class = ThreadPoolExecutor
+        if self.processes:
+            # Loads multiprocessing, so only imported when used
+            from concurrent.futures import ProcessPoolExecutor as executor_class
+
+        # End of the hashing time counted so far. The pools start the files in the order they
+        # were submitted, so only the part of each file's interval after it is added.
+        counted_until = 0.0
+
+        with executor_class(max_workers=self.workers) as executor:
+
+            def submit():
+                path = next(paths, None)
+                if path is None:
+                    return
+
+                stat = None
+                if self.cache is not None:
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        pass
+                    else:
+                        digests = self._cache_call(self.cache.get, path, stat, self.algorithms)
+                        if digests is not None:
+                            done = Future()
+                            done.set_result((HashResult(path, digests, stat.st_size, None, True), None, None))
+                            pending.append((done, None))
+                            return
+
+                pending.append((executor.submit(hash_path, path), stat))
+
+            for _ in range(self.workers * 2):
+                submit()
+
+            while pending:
+                future, stat = pending.popleft()
+                result, started, ended = future.result()
+                submit()
+
+                if ended is not None and ended > counted_until:
+                    self.seconds += ended - max(started, counted_until)
+                    counted_until = ended
+
+                if stat is not None and result.error is None and self.cache is not None:
+                    self._cache_call(self.cache.put, result.path, stat, result.digests)
+
+                self.files += 1
+                if not result.cached:
+                    self.bytes += result.size
+                if result.error is not None:
+                    self.errors += 1
+
+                yield result
+
+    def _cache_call(self, method, *args):
+        """
+        Call a ChecksumCache method. If it fails the cache is dropped for the rest of the run.
+
+        :return: The result of the call or None
+        """
+        # Already loaded by the cache, imported here so hashing without a cache does not load it
+        import sqlite3
+
+        try:
+            return method(*args)
+        except sqlite3.Error as error:
+            logger.warning(f'Checksum cache {self.cache.path} failed, continuing without it: {error}')
+            self.cache = None
+
+    def hash_many(self, paths):
+        """
+        :param paths: Iterable of file paths
+        :return: dict of path to the digests dict, None for files which could not be read
+        """
+        return {result.path: result.digests for result in self.hash_files(paths)}
+
+    @property
+    def throughput(self):
+        """
+        :return: MB/s hashed
+        """
+        return self.bytes / self.seconds / 1e6 if self.seconds else 0.0
+
+    def __str__(self):
+        summary = (f'files: {self.files} errors: {self.errors} bytes: {self.bytes} '
+                   f'time: {self.seconds:.2f}s ({self.throughput:.1f} MB/s)')
+
+        if self.cache is not None:
+            summary += f' cache hits: {self.cache.hits} misses: {self.cache.misses} ({self.cache.hit_rate:.1%})'
+
+        return summary
@@ -0,0 +1,108 @@
+# encoding: utf-8
+"""
+Compare two indices document by document. Used to validate a rebuilt or
+reindexed copy of an index against the original.
+"""
+__author__ = 'Richard Smith'
+__date__ = '19 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+from ceda_elasticsearch_tools.core.export import export_hashes
+
+ADDED = 'added'
+REMOVED = 'removed'
+CHANGED = 'changed'
+
+
+def merge_join(old, new):
+    """
+    Merge join two streams of (key, _id, hash) tuples which are both sorted on key.
+
+    :param old: Sorted stream from the original index
+    :param new: Sorted stream from the new index
+    :return: Generator of (status, _id) where status is added|removed|changed.
+             Documents which are the same in both streams are not returned.
+    """
+
+    old = iter(old)
+    new = iter(new)
+
+    old_item = next(old, None)
+    new_item = next(new, None)
+
+    while old_item is not None or new_item is not None:
+
+        if new_item is None or (old_item is not None and old_item[0] < new_item[0]):
+            yield REMOVED, old_item[1]
+            old_item = next(old, None)
+
+        elif old_item is None or new_item[0] < old_item[0]:
+            yield ADDED, new_item[1]
+            new_item = next(new, None)
+
+        else:
+            if old_item[2] != new_item[2]:
+                yield CHANGED, new_item[1]
+
+            old_item = next(old, None)
+            new_item = next(new, None)
+
+
+class IndexDiff(object):
+    """
+    Stream the sorted key and content hash of every document from two indices
+    and merge join them to find the documents which have been added, removed or
+    changed in the new index.
+
+    Usage::
+
+        diff = IndexDiff(es, 'ceda-fbi', 'ceda-fbi-rebuild', key_field='info.path')
+
+        for status, doc_id in diff:
+            ...
+
+        print(diff.counts)
+    """
+
+    def __init__(self, es, old_index, new_index, new_es=None, key_field='_id', excludes=None, slices=4, size=1000):
+        """
+        :param es:          Elasticsearch client for the original index
+        :param old_index:   The original index
+        :param new_index:   The new index to compare against the original
+        :param new_es:      Elasticsearch client for the new index, if on a different cluster. (default: es)
+        :param key_field:   Sortable field which uniquely identifies a document. (default: _id)
+        :param excludes:    Fields to leave out of the comparison
+        :param slices:      Number of parallel slices to read from each index. (default: 4)
+        :param size:        Page size for each request. (default: 1000)
+        """
+
+        self.es = es
+        self.new_es = new_es or es
+        self.old_index = old_index
+        self.new_index = new_index
+        self.key_field = key_field
+        self.excludes = excludes
+        self.slices = slices
+        self.size = size
+
+        self.counts = {ADDED: 0, REMOVED: 0, CHANGED: 0}
+
+    def _stream(self, es, index):
+        return export_hashes(
+            es,
+            index,
+            key_field=self.key_field,
+            excludes=self.excludes,
+            slices=self.slices,
+            size=self.size
+        )
+
+    def __iter__(self):
+        old = self._stream(self.es, self.old_index)
+        new = self._stream(self.new_es, self.new_index)
+
+        for status, doc_id in merge_join(old, new):
+            self.counts[status] += 1
+            yield status, doc_id
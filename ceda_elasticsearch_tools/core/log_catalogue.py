@@ -0,0 +1,148 @@
+# encoding: utf-8
+"""
+Catalogue of the log files in a directory, grouped by stream.
+
+A log name is ``<stream>.<rest>``, eg. ``checkm.spot-1400-accacia.20170820`` or
+``deposit_ingest1.2017-08-20``. The directory is listed once, each log is added
+to its stream in the same pass and the streams are ordered on the timestamp in
+the log names rather than lexically. Catalogues are cached per directory and
+listed again when the directory mtime changes.
+
+Usage::
+
+    LogCatalogue.for_directory('/datacentre/stats/checkm/spot-1400-accacia').latest('checkm.')
+"""
+__author__ = 'Richard Smith'
+__date__ = '19 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+# YYYYMMDD or YYYY-MM-DD with an optional time
+TIMESTAMP = re.compile(r'(\d{4})-?(\d{2})-?(\d{2})(?:[T_-]?(\d{2}):?(\d{2})(?::?(\d{2}))?)?')
+
+# A listing taken within this many seconds of the directory mtime may have
+# missed a later change in the same mtime tick, so it is not trusted.
+RACY_SECONDS = 2
+
+
+def log_timestamp(name):
+    """
+    :param name: Log file name
+    :return: datetime from the last timestamp in the name or None
+    """
+    for match in reversed(TIMESTAMP.findall(name)):
+        try:
+            return datetime(*(int(field) for field in match if field))
+        except ValueError:
+            continue
+
+    return None
+
+
+def log_sort_key(name):
+    """
+    Order logs on their timestamp. Logs without one go first, in name order.
+    """
+    timestamp = log_timestamp(name)
+    return (timestamp is not None, timestamp or datetime.min, name)
+
+
+class LogCatalogue(object):
+    """
+    Logs in a directory grouped by stream, each stream ordered oldest to newest
+    """
+    _cache = {}
+    _lock = threading.Lock()
+
+    def __init__(self, directory):
+        """
+        :param directory: Directory to list
+        """
+        self.directory = directory
+
+        stat = os.stat(directory)
+        self.mtime_ns = stat.st_mtime_ns
+        self.listed_ns = time.time_ns()
+
+        streams = {}
+        for name in os.listdir(directory):
+            streams.setdefault(name.split('.', 1)[0], []).append(name)
+
+        for logs in streams.values():
+            logs.sort(key=log_sort_key)
+
+        self.streams = streams
+
+    def is_current(self):
+        """
+        :return: True if the directory has not changed since it was listed
+        """
+        try:
+            mtime_ns = os.stat(self.directory).st_mtime_ns
+        except OSError:
+            return False
+
+        return mtime_ns == self.mtime_ns and self.listed_ns - mtime_ns > RACY_SECONDS * 10 ** 9
+
+    @classmethod
+    def for_directory(cls, directory):
+        """
+        :return: Cached LogCatalogue for the directory, listed again if it has changed
+        """
+        with cls._lock:
+            catalogue = cls._cache.get(directory)
+
+        if catalogue is None or not catalogue.is_current():
+            catalogue = cls(directory)
+
+            with cls._lock:
+                cls._cache[directory] = catalogue
+
+        return catalogue
+
+    @classmethod
+    def clear_cache(cls):
+        with cls._lock:
+            cls._cache.clear()
+
+    def logs(self, prefix):
+        """
+        :param prefix: Log name prefix
+        :return: dict of stream to the logs in it which start with prefix, oldest first
+        """
+        matches = {}
+
+        for stream, logs in self.streams.items():
+            if stream.startswith(prefix):
+                matches[stream] = logs
+
+            elif prefix.startswith(stream):
+                selected = [log for log in logs if log.startswith(prefix)]
+                if selected:
+                    matches[stream] = selected
+
+        return matches
+
+    def latest(self, prefix, rank=-1):
+        """
+        :param prefix:  Log name prefix
+        :param rank:    Position in each stream. -1 is the newest, 1 the oldest. Out of range
+                        ranks return the oldest or newest log.
+        :return: List of the log with the given rank from each stream, in stream order
+        """
+        latest_logs = []
+
+        for stream, logs in sorted(self.logs(prefix).items()):
+            if rank > 0:
+                latest_logs.append(logs[min(rank, len(logs)) - 1])
+            else:
+                latest_logs.append(logs[max(rank, -len(logs))])
+
+        return latest_logs
@@ -1,11 +1,13 @@
-import requests
 import os
-import re
-import hashlib
+import json
+import threading
+import time
+from collections import namedtuple
 from datetime import datetime
 import logging
 
 from ceda_elasticsearch_tools.core.utils import get_latest_log
+from ceda_elasticsearch_tools.core.path_store import PathList, PathMap, PathTrie
 
 class SpotMapping(object):
     """
@@ -13,19 +15,64 @@ class SpotMapping(object):
     Makes two queryable dicts:
         - spot2pathmapping = provide spot and return file path
         - path2spotmapping = provide a file path and the spot will be returned
+
+    The download is cached on disk. A cached copy younger than ttl seconds is used
+    without contacting the cedaarchiveapp, an older one is revalidated with
+    If-None-Match/If-Modified-Since and used if the cedaarchiveapp cannot be reached.
     """
     url = "http://cedaarchiveapp.ceda.ac.uk/cedaarchiveapp/fileset/download_conf/"
-    spot2pathmapping = {}
-    path2spotmapping = {}
 
     # Remove logging message when running script
     logging.getLogger("requests").setLevel(logging.WARNING)
 
-    def __init__(self, test=False, spot_file=None, sep='='):
+    def __init__(self, test=False, spot_file=None, sep='=', cache_dir=None, ttl=3600, refresh_interval=None,
+                 compiled_file=None, resolver=None):
+        """
+        :param test: Use a small fixed mapping
+        :param spot_file: Read the mapping from this file rather than the cedaarchiveapp
+        :param sep: Separator between spot and path in spot_file
+        :param cache_dir: Directory for the cached download. (default: CEDA_SPOT_CACHE_DIR or
+                          ~/.cache/ceda_elasticsearch_tools). Pass False to disable the cache.
+        :param ttl: Seconds a cached download is used before it is revalidated. (default: 3600)
+        :param refresh_interval: Revalidate the download in a background thread every refresh_interval
+                                 seconds, for long running processes. (default: no background refresh)
+        :param compiled_file: Memory map a mapping compiled by spot_index.compile_spot_file rather than
+                              parsing one. The mappings are then read only.
+        :param resolver: RealpathResolver used to find the storage path of a file. (default: a new
+                         RealpathResolver with check_links=True, which caches each resolved directory
+                         and follows files which are links, giving the same result as os.path.realpath)
+        """
 
         logging.info("Initialising spots mapping with test: {} and spot file: {}".format(test, spot_file))
 
-        if test:
+        self.spot2pathmapping = {}
+        self.path2spotmapping = {}
+        self._trie = None
+        self._trie_source = None
+        self._trie_size = 0
+        self._compiled = None
+
+        if resolver is None:
+            from ceda_elasticsearch_tools.core.path_resolver import RealpathResolver
+            resolver = RealpathResolver(check_links=True)
+
+        self.resolver = resolver
+
+        if cache_dir is None:
+            cache_dir = os.environ.get('CEDA_SPOT_CACHE_DIR') or os.path.join(
+                os.path.expanduser('~'), '.cache', 'ceda_elasticsearch_tools')
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self._refresh_thread = None
+        self._refresh_stop = None
+
+        if compiled_file:
+            from ceda_elasticsearch_tools.core.spot_index import CompiledSpotMapping
+            self._compiled = CompiledSpotMapping.open(compiled_file)
+            self.spot2pathmapping = self._compiled
+            self.path2spotmapping = self._compiled.paths
+
+        elif test:
             self.spot2pathmapping['spot-1400-accacia'] = "/badc/accacia"
             self.spot2pathmapping['abacus'] = "/badc/abacus"
 
@@ -38,42 +85,175 @@ class SpotMapping(object):
         else:
             self._download_mapping()
 
+            if refresh_interval:
+                self.start_refresh(refresh_interval)
+
     def __iter__(self):
         return iter(self.spot2pathmapping)
 
     def __len__(self):
         return len(self.spot2pathmapping)
 
-    def _download_mapping(self):
+    def _cache_paths(self):
         """
-        Download the mapping from the cedaarchiveapp and build mappings.
+        :return: (cached mapping, cache metadata) file paths
         """
+        return os.path.join(self.cache_dir, 'spot_mapping.conf'), os.path.join(self.cache_dir, 'spot_mapping.json')
+
+    def _read_cache(self):
+        """
+        :return: (mapping text, metadata dict) or (None, {}) if there is no cached copy
+        """
+        if not self.cache_dir:
+            return None, {}
+
+        text_path, meta_path = self._cache_paths()
+
+        try:
+            with open(text_path) as reader:
+                text = reader.read()
+            with open(meta_path) as reader:
+                meta = json.load(reader)
+        except (OSError, ValueError):
+            return None, {}
+
+        return text, meta
+
+    def _write_cache(self, text, meta):
+        if not self.cache_dir:
+            return
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+            for path, content in zip(self._cache_paths(), (text, json.dumps(meta))):
+                tmp_path = f'{path}.{os.getpid()}.tmp'
+                with open(tmp_path, 'w') as writer:
+                    writer.write(content)
+                os.replace(tmp_path, path)
+
+        except OSError as e:
+            logging.warning("Could not cache the spot mapping in {}: {}".format(self.cache_dir, e))
+
+    def _fetch_mapping(self, force=False):
+        """
+        Get the mapping text from the cache, revalidating or downloading it as needed.
+
+        :param force: Revalidate even when the cached copy is younger than the ttl
+        :return: mapping text
+        """
+
+        import requests
+
+        text, meta = self._read_cache()
+
+        if text is not None and not force and time.time() - meta.get('fetched', 0) < self.ttl:
+            return text
+
+        headers = {}
+        if text is not None:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
 
         logging.info("Downloading spots from {}".format(self.url))
 
-        response = requests.get(self.url)
+        try:
+            response = requests.get(self.url, headers=headers, timeout=60)
+        except requests.RequestException as e:
+            if text is None:
+                raise
+            logging.warning("Could not reach cedaarchiveapp, using the cached spot mapping: {}".format(e))
+            return text
+
+        if response.status_code == 304 and text is not None:
+            meta['fetched'] = time.time()
+            self._write_cache(text, meta)
+            return text
 
         if response.status_code != 200:
+            if text is not None:
+                logging.warning("Error getting mapping from cedaarchiveapp status code: {}, reason: {}. Using the cached spot mapping".format(response.status_code, response.reason))
+                return text
+
             logging.error("Error getting mapping from cedaarchiveapp status code: {}, reason: {}".format(response.status_code, response.reason))
             raise Exception("bad response status code: {}, reason: {}".format(response.status_code, response.reason))
 
-        spot_mapping = response.text.split('\n')
+        self._write_cache(response.text, {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'fetched': time.time(),
+        })
+
+        return response.text
+
+    def _download_mapping(self, force=False):
+        """
+        Download the mapping from the cedaarchiveapp and build mappings.
+        """
+
+        spot_mapping = self._fetch_mapping(force).split('\n')
 
         self._build_mapping(spot_mapping)
 
+    def refresh(self):
+        """
+        Revalidate the download and rebuild the mappings. Lookups carry on using the
+        old mappings until the new ones are complete.
+        """
+        self._download_mapping(force=True)
+
+    def start_refresh(self, interval):
+        """
+        Refresh the mapping every interval seconds in a daemon thread
+
+        :param interval: Seconds between refreshes
+        """
+        if self._refresh_thread is not None:
+            return
+
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logging.warning("Spot mapping refresh failed: {}".format(e))
+
+        self._refresh_stop = stop
+        self._refresh_thread = threading.Thread(target=run, name='spot-mapping-refresh', daemon=True)
+        self._refresh_thread.start()
+
+    def stop_refresh(self):
+        if self._refresh_thread is None:
+            return
+
+        self._refresh_stop.set()
+        self._refresh_thread.join()
+        self._refresh_thread = None
+
     def _build_mapping(self, spot_mapping, sep=None):
         """
-        Build the spot mapping dictionaries
+        Build the spot mapping dictionaries. The new dictionaries replace the old ones
+        once they are complete.
         :param spot_mapping: list of mappings
         """
 
+        spot2pathmapping = {}
+        path2spotmapping = {}
+
         for line in spot_mapping:
             if not line.strip(): continue
             spot, path = line.strip().split(sep)
 
             if spot in ("spot-2502-backup-test",): continue
-            self.spot2pathmapping[spot] = path
-            self.path2spotmapping[path] = spot
+            spot2pathmapping[spot] = path
+            path2spotmapping[path] = spot
+
+        self.spot2pathmapping = spot2pathmapping
+        self.path2spotmapping = path2spotmapping
 
     def get_archive_root(self, key):
         """
@@ -98,16 +278,46 @@ class SpotMapping(object):
         :return: Returns the spot which encompasses that file or directory.
         """
 
-        archive_path = self.get_archive_path(key)
+        return self._spot_for_archive_path(self.get_archive_path(key))
 
-        if archive_path:
-            while (archive_path not in self.path2spotmapping) and (archive_path != '/'):
-                archive_path = os.path.dirname(archive_path)
+    def get_spots(self, paths):
+        """
+        Batch version of get_spot.
+
+        :param paths: Iterable of filenames or directories
+        :return: List of the spot for each path. None where there is no spot.
+        """
+        spot_for_archive_path = self._spot_for_archive_path
+
+        return [spot_for_archive_path(archive_path) for archive_path in self.get_archive_paths(paths)]
 
-        if archive_path == '/' or archive_path is None:
+    def _spot_for_archive_path(self, archive_path):
+        """
+        Longest prefix match of the archive path against the spot directories
+        """
+        if not archive_path:
             return None
 
-        return self.path2spotmapping[archive_path]
+        if self._compiled is not None:
+            return self._compiled.longest_prefix(archive_path)
+
+        return self._spot_trie().longest_prefix(archive_path)
+
+    def _spot_trie(self):
+        """
+        PathTrie of spot directory to spot, built when the mapping changes. The archive root is not
+        a spot directory.
+        """
+        mapping = self.path2spotmapping
+        trie = self._trie
+
+        if trie is None or self._trie_source is not mapping or self._trie_size != len(mapping):
+            trie = PathTrie((path, spot) for path, spot in mapping.items() if path.strip('/'))
+            self._trie = trie
+            self._trie_source = mapping
+            self._trie_size = len(mapping)
+
+        return trie
 
     def get_spot_from_storage_path(self, path):
         """
@@ -131,8 +341,24 @@ class SpotMapping(object):
         return spot, suffix
 
     def get_archive_path(self, path):
-        storage_path = os.path.realpath(path)
+        """
+        :param path: File path
+        :return: Archive path of the file, found from its storage path. Files which are links are
+                 resolved to their target unless the resolver was created with check_links=False.
+        """
+        return self._archive_path_from_storage_path(self.resolver.resolve(path))
+
+    def get_archive_paths(self, paths):
+        """
+        Batch version of get_archive_path. Each directory is resolved once.
 
+        :param paths: Iterable of file paths
+        :return: List of archive paths
+        """
+        from_storage_path = self._archive_path_from_storage_path
+        return [from_storage_path(storage_path) for storage_path in self.resolver.resolve_many(paths)]
+
+    def _archive_path_from_storage_path(self, storage_path):
         spot, suffix = self.get_spot_from_storage_path(storage_path)
 
         spot_path = self.get_archive_root(spot)
@@ -167,30 +393,37 @@ class SpotMapping(object):
 class MD5LogFile(object):
     """
     Reads the log file and creates a dictionary which can be queried using get_md5 and a test string.
+
+    When indexed, the object owns the memory mapped CheckmIndex. Close it, or use the object as a
+    context manager, to unmap the index::
+
+        with MD5LogFile(spot, base_dir, indexed=True) as log:
+            md5 = log.get_md5(path)
     """
+    log_dir = "/datacentre/stats/checkm"
 
-    def __init__(self, spot, base_dir):
+    def __init__(self, spot, base_dir, compact=False, indexed=False, index_dir=None):
         """
         Reads the latest log file and stores the checksums in a dict.
 
         :param spot: Spot name for the directory
         :param base_dir: The base directory to the file as returned by elasticsearch. This is the key used to return the directory filepath.
+        :param compact: Store the checksums in a PathMap, using several times less memory for large spots
+                        at the cost of slower loading.
+        :param indexed: Look the checksums up in a memory mapped CheckmIndex sidecar, which is built the first
+                        time a log is read. Only MD5 entries are returned.
+        :param index_dir: Directory holding the sidecars. (default: checkm_index.default_index_dir())
         """
-        self.md5s = {}
+        self.md5s = PathMap() if compact else {}
 
-        log_dir = "/datacentre/stats/checkm"
-        spot_dir = os.path.join(log_dir, spot)
+        log_path = self.latest_log_path(spot)
 
-        if not os.path.exists(spot_dir):
-            return
-
-        # Take the spot directory and find the latest log file.
-        latest_log_file = get_latest_log(spot_dir, "checkm.")
+        if log_path:
 
-        if latest_log_file:
-
-            # Log filepath = log_dir/latest_log_file
-            log_path = os.path.join(spot_dir, latest_log_file)
+            if indexed:
+                from ceda_elasticsearch_tools.core.checkm_index import CheckmIndex
+                self.md5s = CheckmIndex.open(log_path, base_dir, index_dir)
+                return
 
             with open(log_path) as reader:
                 for line in reader:
@@ -204,6 +437,24 @@ class MD5LogFile(object):
                 pass
                 # print("md5s not found in logfile: %s" % log_path)
 
+    @classmethod
+    def latest_log_path(cls, spot):
+        """
+        :param spot: Spot name for the directory
+        :return: Path to the latest checkm log for the spot or None
+        """
+        spot_dir = os.path.join(cls.log_dir, spot)
+
+        if not os.path.exists(spot_dir):
+            return None
+
+        # Take the spot directory and find the latest log file. One log per stream is returned.
+        latest_logs = get_latest_log(spot_dir, "checkm.")
+
+        if latest_logs:
+            # Log filepath = log_dir/spot/latest_log_file
+            return os.path.join(spot_dir, latest_logs[0])
+
     def __len__(self):
         return len(self.md5s)
 
@@ -224,10 +475,88 @@ class MD5LogFile(object):
         :return: the md5 checksum. If file not found, returns empty string.
         """
 
-        if path in self.md5s:
-            return self.md5s[path]
-        else:
-            return ""
+        return self.md5s.get(path, "")
+
+    def close(self):
+        """
+        Unmap the CheckmIndex when indexed. Checksums cannot be looked up afterwards.
+        """
+        close = getattr(self.md5s, "close", None)
+        if close is not None:
+            close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Deposit log actions
+DEPOSIT = "DEPOSIT"
+REMOVE = "REMOVE"
+MKDIR = "MKDIR"
+RMDIR = "RMDIR"
+SYMLINK = "SYMLINK"
+
+
+class DepositEvent(namedtuple("DepositEvent", ("timestamp", "path", "action", "size"))):
+    """
+    One line of a deposit log.
+
+    timestamp:  datetime of the action
+    path:       Archive path
+    action:     DEPOSIT|REMOVE|MKDIR|RMDIR|SYMLINK
+    size:       File size in bytes. 0 for actions on directories and links.
+    """
+    __slots__ = ()
+
+
+def parse_deposit_line(line, actions=None):
+    """
+    Parse a deposit log line.
+
+    e.g line: 2017-08-20 03:05:03:/badc/path/file.png:DEPOSIT:1388172: (force=None) /datacentre/arrivals/file.png
+
+    :param line:    Line from a deposit log
+    :param actions: Collection of actions to return. (default: all)
+    :return: DepositEvent or None if the line is not a log entry or its action is not wanted
+    """
+    # Entries start with a fixed width timestamp, YYYY-MM-DD HH:MM:SS
+    if line[19:20] != ":" or line[4:5] != "-":
+        return None
+
+    # The message after the size may contain colons
+    fields = line[20:].split(":", 3)
+
+    if len(fields) < 3:
+        return None
+
+    path, action, size = fields[:3]
+
+    # Filter on the action before building the event
+    if actions is not None and action not in actions:
+        return None
+
+    try:
+        return DepositEvent(datetime.fromisoformat(line[:19]), path, action, int(size or 0))
+    except ValueError:
+        return None
+
+
+def deposit_events(lines, actions=None):
+    """
+    Generate events from deposit log lines as they are read.
+
+    :param lines:   Iterable of deposit log lines, eg. an open file
+    :param actions: Collection of actions to return. (default: all)
+    :return: Generator of DepositEvent
+    """
+    for line in lines:
+        event = parse_deposit_line(line, actions)
+
+        if event is not None:
+            yield event
 
 
 class DepositLog(object):
@@ -235,76 +564,70 @@ class DepositLog(object):
     Object to read an use deposit log file to update elasticsearch and generate md5 checksums.
     """
     log_dir = "/badc/ARCHIVE_INFO/deposit_logs"
-    deposit_list = []
-    deletion_list = []
     filename = None
 
-    def __init__(self, log_filename=None):
+    def __init__(self, log_filename=None, compact=False):
         """
         Reads the deposit log into memory and creates a list if newly deposited files as part of the object.
 
         :param log_filename: Allows the user to specify a log to open. Defaults to the most recent.
+        :param compact: Store the paths in PathLists, using several times less memory for large logs
+                        at the cost of slower parsing.
         """
         # Make sure deposit_list/deletion_list is clear before reading file.
-        self.deposit_list = []
-        self.deletion_list = []
-        self.mkdir_list = []
-        self.rmdir_list = []
-        self.symlink_list = []
+        path_list = PathList if compact else list
+
+        self.deposit_list = path_list()
+        self.deletion_list = path_list()
+        self.mkdir_list = path_list()
+        self.rmdir_list = path_list()
+        self.symlink_list = path_list()
         self.readme00_list = []
 
         if log_filename is None:
-            # If no log file provided, use the penultimate log file. eg. Most recent complete log file.
-            log_filename = sorted([dr for dr in os.listdir(self.log_dir) if dr.startswith('deposit_ingest1.')])[-2]
+            log_filename = self.latest_complete_log()
 
         self.filename = log_filename
 
-        with open(os.path.join(self.log_dir, log_filename)) as reader:
-            # date regex
-            deposit = re.compile("^\d{4}[-](\d{2})[-]\d{2}.*:DEPOSIT:")
-
-            deletion = re.compile("^\d{4}[-](\d{2})[-]\d{2}.*:REMOVE:")
-
-            mkdir = re.compile("^\d{4}[-](\d{2})[-]\d{2}.*:MKDIR:")
-
-            rmdir = re.compile("^\d{4}[-](\d{2})[-]\d{2}.*:RMDIR:")
-
-            symlink = re.compile("^\d{4}[-](\d{2})[-]\d{2}.*:SYMLINK:")
-
-            readme00 = re.compile("^\d{4}[-](\d{2})[-]\d{2}.*00README:")
-
-            for line in reader:
-                # Split line into its components.
-                # e.g line: 2017-08-20 03:05:03:/badc/msg/data/hritimages/EWXT11/2017/08/19/EWXT11_201708190300.png:DEPOSIT:1388172: (force=None) /datacentre/arrivals/users/dartmetoffice/ukmo-msg/EWXT11_201708190300.png
-
-                split_line = line.strip().split(":")
+        # The action field selects the list each path is added to
+        dispatch = {
+            DEPOSIT: self.deposit_list.append,
+            REMOVE: self.deletion_list.append,
+            MKDIR: self.mkdir_list.append,
+            RMDIR: self.rmdir_list.append,
+            SYMLINK: self.symlink_list.append,
+        }
 
-                date_hour = split_line[0]
-                min = split_line[1]
-                sec = split_line[2]
-                filepath = split_line[3]
-                action = split_line[4]
-                filesize = split_line[5]
-                message = ":".join(split_line[6:])
+        with open(os.path.join(self.log_dir, log_filename)) as reader:
+            for event in deposit_events(reader, dispatch):
+                dispatch[event.action](event.path)
 
-                if deposit.match(line):
-                    self.deposit_list.append(filepath)
+        self.readme00_list = [filepath for filepath in self.deposit_list if filepath.endswith("00README")]
 
-                    # Add to readme list if the deposited file is a 00README
-                    if readme00.match(line):
-                        self.readme00_list.append(filepath)
+    @classmethod
+    def latest_complete_log(cls):
+        """
+        :return: The penultimate log file. eg. Most recent complete log file.
+        """
+        return sorted([dr for dr in os.listdir(cls.log_dir) if dr.startswith('deposit_ingest1.')])[-2]
 
-                elif deletion.match(line):
-                    self.deletion_list.append(filepath)
+    @classmethod
+    def events(cls, log_filename=None, actions=None):
+        """
+        Stream the events in a log without holding the log in memory. Usage::
 
-                elif mkdir.match(line):
-                    self.mkdir_list.append(filepath)
+            for event in DepositLog.events(actions={DEPOSIT, REMOVE}):
+                ...
 
-                elif rmdir.match(line):
-                    self.rmdir_list.append(filepath)
+        :param log_filename:    Log to read. Defaults to the most recent complete log.
+        :param actions:         Collection of actions to return. (default: all)
+        :return: Generator of DepositEvent
+        """
+        if log_filename is None:
+            log_filename = cls.latest_complete_log()
 
-                elif symlink.match(line):
-                    self.symlink_list.append(filepath)
+        with open(os.path.join(cls.log_dir, log_filename)) as reader:
+            yield from deposit_events(reader, actions)
 
     def __iter__(self):
         for file in self.deposit_list:
@@ -354,29 +677,30 @@ class DepositLog(object):
         if not os.path.exists(file):
             return ""
 
-        hash_md5 = hashlib.md5()
-        with open(file, 'rb') as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
+        from ceda_elasticsearch_tools.core.hashing import file_md5
+        return file_md5(file)
 
-    def es_deposits_diff(self, index=None):
+    def es_deposits_diff(self, index="ceda-fbi", es=None, processes=None):
         """
-        Looks at the log files from oldest to newest and checks elasticsearch to see if those files are in.
-        Generates a list of files to index.
-        :return: None
+        Looks at the log files from newest to oldest and checks elasticsearch to see if those files are in.
+        Prints the number of missing files for each log.
+
+        :param index:       Index to check. (default: ceda-fbi)
+        :param es:          Elasticsearch client. (default: CEDAElasticsearchClient())
+        :param processes:   Worker processes for parsing the logs. (default: number of CPUs)
+        :return: Dict of log name to the list of files missing from the index
         """
-        from updater import ElasticsearchUpdater
+        from ceda_elasticsearch_tools.core.backlog import FileExistenceChecker, backlog_logs, process_backlog
+
+        if es is None:
+            from ceda_elasticsearch_tools.elasticsearch import CEDAElasticsearchClient
+            es = CEDAElasticsearchClient()
 
-        # Setup Elasticsearch connection
-        esu = ElasticsearchUpdater(index)
+        missing = {}
 
-        # Get list of logfiles
-        logs = sorted([dr for dr in os.listdir(self.log_dir) if dr.startswith("deposit_ingest1.")], reverse=True)
+        for report in process_backlog(backlog_logs(self.log_dir), FileExistenceChecker(es, index), processes):
+            if report.missing:
+                print(report)
+            missing[report.log] = report.missing
 
-        for log in logs:
-            start = datetime.now()
-            log_data = self.read_log(log)
-            result = esu.check_files_existence(log_data)
-            if result["False"]:
-                print(log, len(result["False"]), "Processing took: %s" % (datetime.now() - start))
+        return missing
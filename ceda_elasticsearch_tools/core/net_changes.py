@@ -0,0 +1,193 @@
+# encoding: utf-8
+"""
+Collapse deposit events to their net effect on the file and directory indices.
+
+A deposit log often deposits a file and later removes it, deposits the same
+file again or makes and removes a directory. NetChanges keeps the first and
+last action seen for each path, so once a batch of events has been read each
+path produces at most one bulk action. Changes which cancel out produce none.
+
+Usage::
+
+    changes = NetChanges()
+    changes.update(DepositLog.events())
+    changes.apply(CedaFbi(), CedaDirs())
+"""
+__author__ = 'Richard Smith'
+__date__ = '19 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import os
+
+from ceda_elasticsearch_tools.core.backlog import path_id
+from ceda_elasticsearch_tools.core.log_reader import DEPOSIT, REMOVE, MKDIR, RMDIR
+
+
+def file_document(path, size):
+    """
+    :return: ceda-fbi document for a file on disk
+    """
+    name = os.path.basename(path)
+
+    return {
+        'info': {
+            'name': name,
+            'name_auto': name,
+            'directory': os.path.dirname(path),
+            'location': 'on_disk',
+            'size': size,
+            'type': os.path.splitext(name)[1] or 'File without extension.',
+        }
+    }
+
+
+def dir_document(path):
+    """
+    :return: ceda-dirs document for a directory
+    """
+    return {
+        'path': path,
+        'dir': os.path.basename(path),
+        'depth': path.count('/'),
+        'archive_path': path,
+    }
+
+
+class NetChanges(object):
+    """
+    Net effect of a sequence of deposit events on each path.
+
+    A path whose last action is a remove is deleted, even if it was first
+    deposited within the events, as the deposit may have replaced a file which
+    was already indexed. Pass cancel_transient=True to send nothing for paths
+    which are known to be new, saving a delete which finds no document. The
+    same applies to a directory made and then removed.
+    """
+
+    def __init__(self, cancel_transient=False):
+        """
+        :param cancel_transient: Drop paths which are created and then removed within the events. (default: False)
+        """
+        self.cancel_transient = cancel_transient
+        self.events = 0
+
+        # path: (first action, last action, size at the last action)
+        self._files = {}
+        self._dirs = {}
+
+    def add(self, event):
+        """
+        :param event: DepositEvent. SYMLINK events are counted and otherwise ignored.
+        """
+        self.events += 1
+
+        if event.action in (DEPOSIT, REMOVE):
+            changes = self._files
+        elif event.action in (MKDIR, RMDIR):
+            changes = self._dirs
+        else:
+            return
+
+        previous = changes.get(event.path)
+        first = event.action if previous is None else previous[0]
+        changes[event.path] = (first, event.action, event.size)
+
+    def update(self, events):
+        """
+        :param events: Iterable of DepositEvent
+        """
+        for event in events:
+            self.add(event)
+
+    def __len__(self):
+        """
+        :return: Number of paths with a change
+        """
+        return len(self._files) + len(self._dirs)
+
+    def _net(self, changes, create, remove):
+        """
+        :return: (paths to add with their size, paths to delete)
+        """
+        additions = []
+        deletions = []
+
+        for path, (first, last, size) in changes.items():
+            if last == create:
+                additions.append((path, size))
+            elif last == remove and not (self.cancel_transient and first == create):
+                deletions.append(path)
+
+        return additions, deletions
+
+    def file_actions(self):
+        """
+        :return: (CedaFbi.add_files items, CedaFbi.delete_files items)
+        """
+        additions, deletions = self._net(self._files, DEPOSIT, REMOVE)
+
+        return (
+            [{'id': path_id(path), 'document': file_document(path, size)} for path, size in additions],
+            [{'id': path_id(path)} for path in deletions],
+        )
+
+    def dir_actions(self):
+        """
+        :return: (CedaDirs.add_dirs items, CedaDirs.delete_dirs items)
+        """
+        additions, deletions = self._net(self._dirs, MKDIR, RMDIR)
+
+        return (
+            [{'id': path_id(path), 'document': dir_document(path)} for path, _ in additions],
+            [{'id': path_id(path)} for path in deletions],
+        )
+
+    def summary(self):
+        """
+        :return: dict of the events read and the actions they reduce to
+        """
+        file_adds, file_deletes = self.file_actions()
+        dir_adds, dir_deletes = self.dir_actions()
+        actions = len(file_adds) + len(file_deletes) + len(dir_adds) + len(dir_deletes)
+
+        return {
+            'events': self.events,
+            'file_adds': len(file_adds),
+            'file_deletes': len(file_deletes),
+            'dir_adds': len(dir_adds),
+            'dir_deletes': len(dir_deletes),
+            'skipped': self.events - actions,
+        }
+
+    def apply(self, fbi=None, dirs=None):
+        """
+        Send the net changes as bulk actions. Empty actions are not sent.
+
+        :param fbi:     CedaFbi for the file changes. (default: file changes are not sent)
+        :param dirs:    CedaDirs for the directory changes. (default: directory changes are not sent)
+        :return: dict of bulk reports keyed on file_adds|file_deletes|dir_adds|dir_deletes
+        """
+        reports = {}
+
+        if fbi is not None:
+            additions, deletions = self.file_actions()
+            if additions:
+                reports['file_adds'] = fbi.add_files(additions)
+            if deletions:
+                reports['file_deletes'] = fbi.delete_files(deletions)
+
+        if dirs is not None:
+            additions, deletions = self.dir_actions()
+            if additions:
+                reports['dir_adds'] = dirs.add_dirs(additions)
+            if deletions:
+                reports['dir_deletes'] = dirs.delete_dirs(deletions)
+
+        return reports
+
+    def clear(self):
+        self.events = 0
+        self._files.clear()
+        self._dirs.clear()
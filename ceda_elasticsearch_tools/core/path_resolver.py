@@ -0,0 +1,108 @@
+# encoding: utf-8
+"""
+Resolve archive paths to storage paths with a cache of resolved directories.
+
+os.path.realpath makes an lstat, and a readlink for each link, for every
+component of a path. On the archive mounts that is a chain of network round
+trips for each file. The files in a directory resolve through the same links,
+so RealpathResolver resolves each directory once and appends the file name.
+
+Usage::
+
+    resolver = RealpathResolver()
+    storage_paths = resolver.resolve_many(paths)
+    print(resolver.stats())
+"""
+__author__ = 'Richard Smith'
+__date__ = '19 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import os
+from collections import OrderedDict
+
+
+class RealpathResolver(object):
+    """
+    os.path.realpath with a least recently used cache of resolved directories.
+
+    With check_links, the result is the same as os.path.realpath. Without it, a
+    file which is itself a link resolves to its resolved directory joined with
+    its name, not to the link target, which saves an lstat per file.
+    """
+
+    def __init__(self, maxsize=100000, check_links=False):
+        """
+        :param maxsize:     Directories to keep. (default: 100000)
+        :param check_links: lstat each file and resolve links in full. (default: False)
+        """
+        self.maxsize = maxsize
+        self.check_links = check_links
+        self.hits = 0
+        self.misses = 0
+        self._directories = OrderedDict()
+
+    def _directory(self, directory):
+        directories = self._directories
+        resolved = directories.get(directory)
+
+        if resolved is not None:
+            self.hits += 1
+            directories.move_to_end(directory)
+            return resolved
+
+        self.misses += 1
+        resolved = directories[directory] = os.path.realpath(directory)
+
+        if len(directories) > self.maxsize:
+            directories.popitem(last=False)
+
+        return resolved
+
+    def resolve(self, path):
+        """
+        :param path: Path to resolve
+        :return: os.path.realpath(path) if check_links is set or the file is not a link, otherwise
+                 the realpath of its directory joined with its name
+        """
+        directory, name = os.path.split(path)
+
+        # Relative paths depend on the working directory and '.', '..' and trailing slashes
+        # are not a file in the directory, so these are resolved in full
+        if not directory or not name or name in ('.', '..') or not os.path.isabs(directory):
+            return os.path.realpath(path)
+
+        if self.check_links and os.path.islink(path):
+            return os.path.realpath(path)
+
+        return os.path.join(self._directory(directory), name)
+
+    def resolve_many(self, paths):
+        """
+        :param paths: Iterable of paths
+        :return: List of the resolved paths
+        """
+        resolve = self.resolve
+        return [resolve(path) for path in paths]
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        """
+        :return: dict of cache hits, misses, hit rate and directories held
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate,
+            'directories': len(self._directories),
+        }
+
+    def clear(self):
+        self._directories.clear()
+        self.hits = 0
+        self.misses = 0
@@ -0,0 +1,361 @@
+# encoding: utf-8
+"""
+Memory compact containers for large numbers of archive paths.
+
+Paths in a deposit or checkm log share long directory prefixes. Held as a list
+of str each path costs its full length plus around 50 bytes of object header
+and an 8 byte pointer. Here each directory is stored once, the file names are
+packed into a single UTF-8 buffer, and each entry costs a directory id, an
+offset and the bytes of its name. Membership uses a sorted array of path
+hashes built on first use, so no per entry Python objects are kept.
+
+PathList is an ordered, append only list of paths. PathMap maps paths to MD5
+checksums, storing each checksum as 16 raw bytes. PathTrie maps directories to
+values and finds the deepest directory containing a path.
+"""
+__author__ = 'Richard Smith'
+__date__ = '19 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import bisect
+from array import array
+
+
+class PathRecord(object):
+    """
+    A path split into its directory and file name
+    """
+    __slots__ = ('directory', 'name')
+
+    def __init__(self, directory, name):
+        self.directory = directory
+        self.name = name
+
+    @property
+    def path(self):
+        if not self.directory:
+            return self.name
+        return f'{self.directory}/{self.name}' if self.directory != '/' else f'/{self.name}'
+
+    def __repr__(self):
+        return f'PathRecord({self.directory!r}, {self.name!r})'
+
+
+class PathList(object):
+    """
+    Append only list of paths with directory interning.
+
+    Supports len, indexing, slicing (returns a list), iteration and
+    membership like a list of str.
+    """
+
+    def __init__(self, paths=()):
+        # Directories are kept with their trailing slash so a path is prefix + name
+        self._prefixes = []
+        self._prefix_ids = {}
+        self._entry_dirs = array('I')
+        self._offsets = array('Q', [0])
+        self._names = bytearray()
+
+        # Sorted hashes and their positions for membership tests. Built on first use.
+        self._hashes = None
+        self._positions = None
+
+        self.extend(paths)
+
+    def append(self, path):
+        i = path.rfind('/') + 1
+        prefix = path[:i]
+
+        dir_id = self._prefix_ids.get(prefix)
+        if dir_id is None:
+            dir_id = self._prefix_ids[prefix] = len(self._prefixes)
+            self._prefixes.append(prefix)
+
+        self._entry_dirs.append(dir_id)
+        self._names += path[i:].encode('utf-8')
+        self._offsets.append(len(self._names))
+        self._hashes = None
+
+    def extend(self, paths):
+        for path in paths:
+            self.append(path)
+
+    def __len__(self):
+        return len(self._entry_dirs)
+
+    def record(self, i):
+        """
+        :return: PathRecord for entry i
+        """
+        prefix = self._prefixes[self._entry_dirs[i]]
+        name = self._names[self._offsets[i]:self._offsets[i + 1]].decode('utf-8')
+        return PathRecord(prefix[:-1] or prefix, name)
+
+    def _path(self, i):
+        return self._prefixes[self._entry_dirs[i]] + self._names[self._offsets[i]:self._offsets[i + 1]].decode('utf-8')
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._path(j) for j in range(*i.indices(len(self)))]
+
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('PathList index out of range')
+
+        return self._path(i)
+
+    def __iter__(self):
+        prefixes = self._prefixes
+        names = self._names
+        start = 0
+
+        for dir_id, end in zip(self._entry_dirs, self._offsets[1:]):
+            yield prefixes[dir_id] + names[start:end].decode('utf-8')
+            start = end
+
+    def _build_index(self):
+        # Sort the hash and position together as one int, hash * 2**32 + position
+        keys = sorted((path_hash << 32) | i for i, path_hash in enumerate(map(hash, self)))
+        self._hashes = array('q', (key >> 32 for key in keys))
+        self._positions = array('I', (key & 0xFFFFFFFF for key in keys))
+
+    def index(self, path):
+        """
+        :return: Position of the last occurrence of path
+        :raises ValueError: if the path is not in the list
+        """
+        if self._hashes is None:
+            self._build_index()
+
+        path_hash = hash(path)
+        found = None
+        i = bisect.bisect_left(self._hashes, path_hash)
+
+        while i < len(self._hashes) and self._hashes[i] == path_hash:
+            position = self._positions[i]
+            if self._path(position) == path and (found is None or position > found):
+                found = position
+            i += 1
+
+        if found is None:
+            raise ValueError(f'{path} is not in the list')
+
+        return found
+
+    def __contains__(self, path):
+        try:
+            self.index(path)
+        except ValueError:
+            return False
+        return True
+
+    def __getstate__(self):
+        # str hashes differ between processes so the index is rebuilt after unpickling
+        state = self.__dict__.copy()
+        state['_hashes'] = state['_positions'] = None
+        return state
+
+    def __eq__(self, other):
+        if isinstance(other, (PathList, list, tuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self):
+        return f'PathList({len(self)} paths, {len(self._prefixes)} directories)'
+
+
+class PathMap(object):
+    """
+    Mapping of path to MD5 checksum. Checksums are stored as 16 raw bytes and
+    returned as hex strings. Other values are kept as they are.
+
+    Behaves like a dict: setting a path again replaces its value and keeps its
+    position. While loading, paths are appended without a lookup and repeated
+    paths are merged when the map is first read. Supports len, membership, get,
+    item access and iteration over the paths.
+    """
+
+    def __init__(self):
+        self._paths = PathList()
+        self._digests = bytearray()
+        self._other = {}
+
+    def __setitem__(self, path, value):
+        position = None
+
+        # Checking for an existing path needs the index. Only pay for it once it has been built,
+        # so loading a log stays a sequence of appends. The index is only built by _merge_repeats,
+        # so while it exists the paths are unique.
+        if self._paths._hashes is not None and path in self._paths:
+            position = self._paths.index(path)
+
+        if position is None:
+            self._paths.append(path)
+            self._digests += bytes(16)
+            position = len(self._paths) - 1
+
+        self._store(position, value)
+
+    def _store(self, position, value):
+        self._other.pop(position, None)
+
+        try:
+            digest = bytes.fromhex(value) if len(value) == 32 else None
+        except ValueError:
+            digest = None
+
+        if digest is None or digest.hex() != value:
+            # Not a lower case MD5 hex digest, keep it as it is
+            self._other[position] = value
+        else:
+            self._digests[position * 16:position * 16 + 16] = digest
+
+    def _merge_repeats(self):
+        """
+        Merge paths appended more than once, keeping the first position and the last value.
+        Builds the path index, which is dropped by the next append.
+        """
+        paths = self._paths
+        if paths._hashes is not None:
+            return
+
+        paths._build_index()
+        hashes, positions = paths._hashes, paths._positions
+        drop = set()
+        i = 0
+
+        # Repeated paths have equal hashes, so are next to each other in the index
+        while i < len(hashes):
+            j = i + 1
+            while j < len(hashes) and hashes[j] == hashes[i]:
+                j += 1
+
+            if j - i > 1:
+                repeats = {}
+                for position in sorted(positions[i:j]):
+                    repeats.setdefault(paths._path(position), []).append(position)
+
+                for repeat in repeats.values():
+                    if len(repeat) > 1:
+                        self._store(repeat[0], self._value(repeat[-1]))
+                        drop.update(repeat[1:])
+            i = j
+
+        if not drop:
+            return
+
+        kept = PathList()
+        digests = bytearray()
+        other = {}
+
+        for position, path in enumerate(paths):
+            if position in drop:
+                continue
+
+            if position in self._other:
+                other[len(kept)] = self._other[position]
+            digests += self._digests[position * 16:position * 16 + 16]
+            kept.append(path)
+
+        kept._build_index()
+        self._paths, self._digests, self._other = kept, digests, other
+
+    def _value(self, position):
+        if position in self._other:
+            return self._other[position]
+        return self._digests[position * 16:position * 16 + 16].hex()
+
+    def __getitem__(self, path):
+        self._merge_repeats()
+        try:
+            return self._value(self._paths.index(path))
+        except ValueError:
+            raise KeyError(path)
+
+    def get(self, path, default=None):
+        try:
+            return self[path]
+        except KeyError:
+            return default
+
+    def __contains__(self, path):
+        self._merge_repeats()
+        return path in self._paths
+
+    def __len__(self):
+        self._merge_repeats()
+        return len(self._paths)
+
+    def __iter__(self):
+        self._merge_repeats()
+        return iter(self._paths)
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        self._merge_repeats()
+        for position, path in enumerate(self._paths):
+            yield path, self._value(position)
+
+    def __repr__(self):
+        return f'PathMap({len(self)} paths)'
+
+
+class PathTrie(object):
+    """
+    Mapping of directory paths to values with longest prefix lookup. Each node
+    is a dict of path component to child node, with the value of the node under
+    the empty string, which is never a component.
+
+    Paths are split on '/' and empty components are ignored, so '/badc/x' and
+    '/badc/x/' are the same key.
+    """
+
+    def __init__(self, items=()):
+        self._root = {}
+        self._len = 0
+
+        for path, value in items:
+            self[path] = value
+
+    def __setitem__(self, path, value):
+        node = self._root
+        for part in path.split('/'):
+            if part:
+                node = node.setdefault(part, {})
+
+        if '' not in node:
+            self._len += 1
+        node[''] = value
+
+    def __len__(self):
+        return self._len
+
+    def longest_prefix(self, path, default=None):
+        """
+        :param path: Path to look up
+        :return: Value for the longest key which is path or a parent of path, or default
+        """
+        node = self._root
+        found = node.get('', default)
+
+        for part in path.split('/'):
+            if not part:
+                continue
+
+            node = node.get(part)
+            if node is None:
+                break
+
+            if '' in node:
+                found = node['']
+
+        return found
+
+    def __repr__(self):
+        return f'PathTrie({len(self)} paths)'
@@ -0,0 +1,319 @@
+# encoding: utf-8
+"""
+Precompiled, memory mapped spot mapping.
+
+Every LOTUS task used to read and parse the spot mapping file. The mapping is
+compiled once into a read only file which each task memory maps, so opening
+it costs nothing and the pages are shared by all the tasks on a host.
+
+Layout, native byte order, each section padded to 8 bytes::
+
+    header              magic, byte order mark, spot count, directory count, source mtime_ns, source size
+    spot offsets        (spots + 1) * 8, into the spot names, which are sorted
+    spot names          UTF-8
+    path offsets        (spots + 1) * 8, into the archive paths, in the order of the spot names
+    archive paths       UTF-8
+    directory hashes    directories * 8, sorted crc32 of the directories
+    directory offsets   (directories + 1) * 8, into the directories, in the order of the hashes
+    spot ids            directories * 4, position of the spot for each directory
+    directories         UTF-8
+
+The directories are the spot directories and each of their parents, which have
+no spot. They are stored as '/' followed by their non empty components joined
+with '/', so '/badc/x/' and '/badc/x' are the same. A path is looked up one
+component at a time from the top, stopping at the first directory which is not
+stored, as in a trie. Each directory is found by its hash and checked against
+the stored name, so lookups are exact.
+"""
+__author__ = 'Richard Smith'
+__date__ = '19 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import bisect
+import mmap
+import os
+import struct
+import zlib
+from array import array
+from collections.abc import Mapping
+
+MAGIC = b'SPOTIDX1'
+BYTE_ORDER_MARK = 0x0102030405060708
+HEADER = struct.Struct('=8sQQQqQ')
+
+# Spot id of a directory which only contains spot directories
+NO_SPOT = 0xFFFFFFFF
+
+
+def directory_key(path):
+    """
+    :return: Normalised directory, eg. '/badc/x/' -> '/badc/x'
+    """
+    return '/' + '/'.join(part for part in path.split('/') if part)
+
+
+def _pad(data):
+    return data + bytes(-len(data) % 8)
+
+
+def _strings(values):
+    """
+    :return: (offsets array, UTF-8 blob) for a list of str
+    """
+    offsets = array('Q', [0])
+    blob = bytearray()
+
+    for value in values:
+        blob += value.encode('utf-8')
+        offsets.append(len(blob))
+
+    return offsets, bytes(blob)
+
+
+def compile_spot_mapping(spot2pathmapping, path2spotmapping, source_stat=None):
+    """
+    :param spot2pathmapping:    dict of spot to archive path
+    :param path2spotmapping:    dict of archive path to spot
+    :param source_stat:         os.stat_result of the mapping file, recorded to detect changes
+    :return: Compiled mapping (bytes)
+    """
+    spots = sorted(spot2pathmapping)
+    spot_ids = {spot: i for i, spot in enumerate(spots)}
+
+    # The archive root is not a spot directory. The last spot for a directory wins, as in a dict.
+    directories = {}
+    for path, spot in path2spotmapping.items():
+        key = directory_key(path)
+        if key != '/' and spot in spot_ids:
+            directories[key] = spot_ids[spot]
+
+    # Add the parents so a lookup can stop at the first directory which is not stored
+    for key in list(directories):
+        parent = key.rpartition('/')[0]
+        while parent and parent not in directories:
+            directories[parent] = NO_SPOT
+            parent = parent.rpartition('/')[0]
+
+    entries = sorted((zlib.crc32(key.encode('utf-8')), key) for key in directories)
+
+    spot_offsets, spot_blob = _strings(spots)
+    path_offsets, path_blob = _strings(spot2pathmapping[spot] for spot in spots)
+    dir_offsets, dir_blob = _strings(key for _, key in entries)
+
+    mtime_ns, size = (source_stat.st_mtime_ns, source_stat.st_size) if source_stat else (0, 0)
+
+    return b''.join((
+        HEADER.pack(MAGIC, BYTE_ORDER_MARK, len(spots), len(entries), mtime_ns, size),
+        spot_offsets.tobytes(), _pad(spot_blob),
+        path_offsets.tobytes(), _pad(path_blob),
+        array('Q', (key_hash for key_hash, _ in entries)).tobytes(), dir_offsets.tobytes(),
+        _pad(array('I', (directories[key] for _, key in entries)).tobytes()),
+        dir_blob,
+    ))
+
+
+def compile_spot_file(spot_file, output=None, sep='='):
+    """
+    Compile a spot mapping file, unless the compiled file is already up to date.
+
+    :param spot_file:   Spot mapping file, one spot<sep>path per line
+    :param output:      Compiled file. (default: spot_file.spotidx)
+    :param sep:         Separator between spot and path
+    :return: Path to the compiled file
+    """
+    from ceda_elasticsearch_tools.core.log_reader import SpotMapping
+
+    output = output or f'{spot_file}.spotidx'
+    stat = os.stat(spot_file)
+
+    if CompiledSpotMapping.is_current(output, stat):
+        return output
+
+    spots = SpotMapping(spot_file=spot_file, sep=sep)
+    write_compiled(output, compile_spot_mapping(spots.spot2pathmapping, spots.path2spotmapping, stat))
+
+    return output
+
+
+def write_compiled(output, content):
+    """
+    Write a compiled mapping, replacing any existing file atomically
+    """
+    tmp_path = f'{output}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as writer:
+        writer.write(content)
+    os.replace(tmp_path, output)
+
+
+class CompiledPaths(Mapping):
+    """
+    Read only mapping of spot directory to spot
+    """
+
+    def __init__(self, compiled):
+        self._compiled = compiled
+
+    def __getitem__(self, path):
+        compiled = self._compiled
+        i = compiled._find(directory_key(path).encode('utf-8'))
+
+        if i < 0 or compiled._spot_ids[i] == NO_SPOT:
+            raise KeyError(path)
+
+        return compiled._spot(compiled._spot_ids[i])
+
+    def __iter__(self):
+        compiled = self._compiled
+        for i in range(compiled.directory_count):
+            if compiled._spot_ids[i] != NO_SPOT:
+                yield compiled._directory(i)
+
+    def __len__(self):
+        return sum(1 for spot_id in self._compiled._spot_ids if spot_id != NO_SPOT)
+
+
+class CompiledSpotMapping(Mapping):
+    """
+    Read only mapping of spot to archive path, read from a compiled file. The paths
+    attribute maps spot directories to spots. Usage::
+
+        spots = CompiledSpotMapping.open('ceda_all_datasets.ini.spotidx')
+        spots.longest_prefix('/badc/accacia/data/file.nc')
+    """
+
+    def __init__(self, buffer):
+        """
+        :param buffer: Compiled mapping. bytes or mmap.
+        """
+        self._buffer = buffer
+
+        magic, mark, self.spot_count, self.directory_count, self.source_mtime_ns, self.source_size = \
+            HEADER.unpack_from(buffer)
+
+        if (magic, mark) != (MAGIC, BYTE_ORDER_MARK):
+            raise ValueError('Not a compiled spot mapping for this platform')
+
+        view = memoryview(buffer)
+        position = HEADER.size
+
+        def take(length, fmt=None, pad=False):
+            nonlocal position
+            section = view[position:position + length]
+            position += length + (-length % 8 if pad else 0)
+            return section.cast(fmt) if fmt else section
+
+        self._spot_offsets = take((self.spot_count + 1) * 8, 'Q')
+        self._spot_names = take(self._spot_offsets[-1], pad=True)
+        self._path_offsets = take((self.spot_count + 1) * 8, 'Q')
+        self._spot_paths = take(self._path_offsets[-1], pad=True)
+        self._hashes = take(self.directory_count * 8, 'Q')
+        self._dir_offsets = take((self.directory_count + 1) * 8, 'Q')
+        self._spot_ids = take(self.directory_count * 4, 'I', pad=True)
+        self._directories = take(self._dir_offsets[-1])
+
+        self.paths = CompiledPaths(self)
+
+    @classmethod
+    def open(cls, path):
+        """
+        :param path: Compiled mapping file
+        :return: CompiledSpotMapping backed by a read only memory map of the file
+        """
+        with open(path, 'rb') as reader:
+            return cls(mmap.mmap(reader.fileno(), 0, access=mmap.ACCESS_READ))
+
+    @staticmethod
+    def is_current(path, source_stat):
+        """
+        :return: True if the compiled file exists and was compiled from the current source
+        """
+        try:
+            with open(path, 'rb') as reader:
+                header = reader.read(HEADER.size)
+        except OSError:
+            return False
+
+        if len(header) != HEADER.size:
+            return False
+
+        magic, mark, _, _, mtime_ns, size = HEADER.unpack(header)
+        return (magic, mark, mtime_ns, size) == (MAGIC, BYTE_ORDER_MARK, source_stat.st_mtime_ns, source_stat.st_size)
+
+    def _spot(self, i):
+        return bytes(self._spot_names[self._spot_offsets[i]:self._spot_offsets[i + 1]]).decode('utf-8')
+
+    def _directory(self, i):
+        return bytes(self._directories[self._dir_offsets[i]:self._dir_offsets[i + 1]]).decode('utf-8')
+
+    def _find(self, key):
+        """
+        :param key: Normalised directory, UTF-8 encoded
+        :return: Position of the directory or -1
+        """
+        hashes = self._hashes
+        key_hash = zlib.crc32(key)
+        i = bisect.bisect_left(hashes, key_hash)
+
+        # Different directories can share a hash
+        while i < self.directory_count and hashes[i] == key_hash:
+            if self._directories[self._dir_offsets[i]:self._dir_offsets[i + 1]] == key:
+                return i
+            i += 1
+
+        return -1
+
+    def longest_prefix(self, path):
+        """
+        :param path: Archive path
+        :return: Spot for the deepest spot directory containing path or None
+        """
+        spot_ids = self._spot_ids
+        found = NO_SPOT
+        key = b''
+
+        for part in path.encode('utf-8').split(b'/'):
+            if not part:
+                continue
+
+            key += b'/' + part
+            i = self._find(key)
+            if i < 0:
+                break
+
+            if spot_ids[i] != NO_SPOT:
+                found = spot_ids[i]
+
+        return None if found == NO_SPOT else self._spot(found)
+
+    def __getitem__(self, spot):
+        if not isinstance(spot, str):
+            raise KeyError(spot)
+
+        # Binary search of the sorted spot names
+        target = spot.encode('utf-8')
+        lo, hi = 0, self.spot_count
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+            name = bytes(self._spot_names[self._spot_offsets[mid]:self._spot_offsets[mid + 1]])
+
+            if name < target:
+                lo = mid + 1
+            elif name > target:
+                hi = mid
+            else:
+                return bytes(self._spot_paths[self._path_offsets[mid]:self._path_offsets[mid + 1]]).decode('utf-8')
+
+        raise KeyError(spot)
+
+    def __iter__(self):
+        for i in range(self.spot_count):
+            yield self._spot(i)
+
+    def __len__(self):
+        return self.spot_count
+
+    def __repr__(self):
+        return f'CompiledSpotMapping({self.spot_count} spots)'
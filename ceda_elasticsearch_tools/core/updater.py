@@ -3,9 +3,13 @@ import json
 import re
 import logging
 import hashlib
+import collections
+import itertools
+from concurrent.futures import ThreadPoolExecutor
 
-from ceda_elasticsearch_tools.elasticsearch import CEDAElasticsearchClient
 from .log_reader import MD5LogFile
+from .checkm_index import md5_entries
+from .backlog import path_id
 from . import utils
 
 class ElasticsearchQuery(object):
@@ -156,17 +160,23 @@ class ElasticsearchUpdater(object):
     Class to handle updates to the elasticsearch index.
     """
 
-    def __init__(self, index, host, port):
+    def __init__(self, index, host, port, rate_limiter=None, **kwargs):
         """
         Creates an elasticsearch connection. Default host and port specified.
+        The connection is shared with other updaters using the same settings.
 
         :param index: The elasticsearch index to connect to.
         :param host: The elasticsearch host address.
         :param port: The read/write elasticsearch port.
+        :param rate_limiter: Optional BulkRateLimiter to hold bulk writes to a budget.
+        :param kwargs: Keyword arguments for client_registry.get_client
         """
 
-        self.es = CEDAElasticsearchClient()
+        from ceda_elasticsearch_tools.elasticsearch import get_client
+
+        self.es = get_client(**kwargs)
         self.index = index
+        self.rate_limiter = rate_limiter
 
     def make_bulk_update(self, bulk_json):
         """
@@ -176,6 +186,9 @@ class ElasticsearchUpdater(object):
         :return: Status of the transaction.
         """
         if bulk_json:
+            if self.rate_limiter is not None:
+                self.rate_limiter.throttle_bulk(bulk_json)
+
             result = self.es.bulk(index=self.index, body=bulk_json)
             return {"took": result["took"], "errors": result["errors"], "docs_changed": len(result["items"])}
         else:
@@ -377,57 +390,99 @@ class ElasticsearchUpdater(object):
 
         return index_test["False"], summary_string
 
-    def update_md5(self, spot_name, spot_path, threshold=800):
+    def _fetch_md5s(self, chunk):
+        """
+        Fetch the indexed MD5s for a chunk of checkm entries. Only info.md5 is returned by elasticsearch.
+
+        :param chunk: List of (document id, MD5 from the log)
+        :return: (number of documents in the index, list of (document id, MD5) to update)
+        """
+        response = self.es.mget(index=self.index, ids=[doc_id for doc_id, _ in chunk],
+                                source_includes=["info.md5"],
+                                filter_path="docs._id,docs.found,docs._source.info.md5")
+
+        indexed = {}
+        for doc in response.get("docs", []):
+            if doc.get("found"):
+                indexed[doc["_id"]] = doc.get("_source", {}).get("info", {}).get("md5", "")
+
+        updates = [(doc_id, md5) for doc_id, md5 in chunk if doc_id in indexed and indexed[doc_id] != md5]
+
+        return len(indexed), updates
+
+    def update_md5(self, spot_name, spot_path, threshold=800, concurrency=4):
+        """
+        Update the MD5s in the index from the latest checkm log for a spot.
+
+        The log is read in chunks of threshold entries. The documents for each chunk are fetched
+        with mget in a thread pool, at most concurrency * 2 chunks ahead of the bulk updates,
+        so memory stays flat however large the spot.
+
+        :param spot_name:   Spot name
+        :param spot_path:   Archive path of the spot
+        :param threshold:   Entries in each mget and documents in each bulk update. (default: 800)
+        :param concurrency: Threads fetching documents. (default: 4)
+        :return: dict of files in the log, files in the index and files updated
+        """
 
         logger = logging.getLogger(__name__)
         logging.getLogger('elasticsearch').setLevel(logging.WARNING)
 
-        spotlog = MD5LogFile(spot_name, spot_path)
-        file_list = spotlog.as_list()
+        summary = {"files": 0, "in_index": 0, "updated": 0}
 
-        logger.debug(f"Spot: {spot_path} contains {len(spotlog)} files.")
+        log_path = MD5LogFile.latest_log_path(spot_name)
+        if log_path is None:
+            logger.info(f"Spot: {spot_path}. No checkm log found.")
+            return summary
 
-        param_func, query_tmpl = ElasticsearchQuery.ceda_fbs()
-        result = self.check_files_existence(param_func, query_tmpl, file_list, raw_resp=True, threshold=threshold)
+        md5_json = ""
+        pending_updates = 0
 
-        # return len(result["True"])
+        with open(log_path) as reader, ThreadPoolExecutor(max_workers=concurrency) as executor:
+            entries = md5_entries(reader)
+            pending = collections.deque()
 
-        logger.info("Spot: {}. Files in index: {}. Files not in: {}. Percentage in: {}%".format(
-            spot_path,
-            len(result["True"]),
-            len(result["False"]),
-            utils.percent(len(spotlog), len(result["True"]))
-        )
-        )
+            def submit():
+                chunk = [(path_id(os.path.join(spot_path, path)), digest.hex())
+                         for path, digest in itertools.islice(entries, threshold)]
 
-        files_in = result["True"]
+                if chunk:
+                    summary["files"] += len(chunk)
+                    pending.append(executor.submit(self._fetch_md5s, chunk))
 
-        # Check md5s
-        update_total = 0
-        md5_json = ""
+            for _ in range(concurrency * 2):
+                submit()
 
-        try:
-            for file in files_in:
-                file_info = file[0]["_source"]["info"]
-                filepath = os.path.join(file_info["directory"], file_info["name"])
+            while pending:
+                in_index, updates = pending.popleft().result()
+                submit()
 
-                if file_info["md5"] != spotlog.get_md5(filepath):
-                    update_total += 1
+                summary["in_index"] += in_index
 
-                    id = file[0]["_id"]
-                    index = json.dumps({"update": {"_id": id, "_type": "file"}}) + "\n"
-                    md5_field = json.dumps({"source": {"doc": {"info": {"md5": spotlog.get_md5(filepath)}}}}) + "\n"
-                    md5_json += index + md5_field
+                for doc_id, md5 in updates:
+                    md5_json += json.dumps({"update": {"_id": doc_id}}) + "\n"
+                    md5_json += json.dumps({"doc": {"info": {"md5": md5}}}) + "\n"
+                    pending_updates += 1
 
-                if update_total > threshold:
+                # Bulk updates are sent from this thread while the pool fetches the next chunks
+                if pending_updates >= threshold:
                     self.make_bulk_update(md5_json)
+                    summary["updated"] += pending_updates
                     md5_json = ""
-                    update_total = 0
+                    pending_updates = 0
 
-            if md5_json:
-                self.make_bulk_update(md5_json)
+        if md5_json:
+            self.make_bulk_update(md5_json)
+            summary["updated"] += pending_updates
+
+        logger.info("Spot: {}. Files in index: {}. Files not in: {}. Percentage in: {}%. Updated: {}".format(
+            spot_path,
+            summary["in_index"],
+            summary["files"] - summary["in_index"],
+            utils.percent(summary["files"], summary["in_index"]),
+            summary["updated"]
+        ))
 
-        except Exception as msg:
-            logger.error(msg)
+        return summary
 
 
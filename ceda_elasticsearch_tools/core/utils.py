@@ -2,7 +2,8 @@ import subprocess
 from datetime import datetime, timedelta
 import sys
 import os
-import math
+
+from ceda_elasticsearch_tools.core.log_catalogue import LogCatalogue
 
 
 def get_number_of_submitted_lotus_tasks():
@@ -42,7 +43,7 @@ def percent(total, value):
 def get_latest_log(dir, prefix, rank=-1):
     """
     Get the log file from each stream with the given prefix and rank.
-    Logs are sorted in date oldest to newest. Positive rank will start at
+    Logs are sorted on the timestamp in their names, oldest to newest. Positive rank will start at
     at the old logs. 1 will return the oldest log, 2 the next oldest. Negative rank will be from newest backwards. -1 will return
     the most recent log, -2 the penultimate log.
 
@@ -50,32 +51,12 @@ def get_latest_log(dir, prefix, rank=-1):
     :param prefix:  The log specific file prefix.
     :param rank:    Which item to select. Defaults to the most recent.
 
+    The directory listing is cached until the directory changes, see LogCatalogue.
+
     :return: List of logs for all streams with the given prefix and rank.
     """
 
-    # Get all logs in the directory
-    dir_listing = os.listdir(dir)
-
-    # Determine all ingest streams with the given prefix
-    ingest_streams = set([log.split('.')[0] for log in dir_listing if log.startswith(prefix)])
-
-    # Create output list
-    latest_logs = []
-    for stream in ingest_streams:
-
-        # Filter logs on the given stream
-        filtered_logs = [log for log in dir_listing if log.startswith(stream)]
-
-        # Check to make sure the rank is in acceptable range
-        if abs(rank) > len(filtered_logs):
-            # When rank is outside the range of the log list, return the last possible value.
-            rank = int(math.copysign(len(filtered_logs), rank))
-
-        # Find the log with correct rank
-        latest = sorted([log for log in filtered_logs if log.startswith(stream)])[rank]
-        latest_logs.append(latest)
-
-    return latest_logs
+    return LogCatalogue.for_directory(dir).latest(prefix, rank)
 
 
 def list2file_newlines(list_obj, filename):
@@ -8,4 +8,24 @@ __copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
 __license__ = 'BSD - see LICENSE file in top-level package directory'
 __contact__ = 'richard.d.smith@stfc.ac.uk'
 
-from .ceda_elasticsearch_client import CEDAElasticsearchClient
\ No newline at end of file
+from .._lazy import lazy_getattr
+
+# Imported on first use. Importing the elasticsearch client library is the
+# largest part of the start up time for the command line tools.
+_LAZY_IMPORTS = {
+    'CEDAElasticsearchClient': '.ceda_elasticsearch_client',
+    'get_client': '.client_registry',
+    'close_clients': '.client_registry',
+    'LatencyAwareSelector': '.node_selector',
+    'NODE_STATS': '.node_selector',
+    'Instrumentation': '.instrumentation',
+    'INSTRUMENTATION': '.instrumentation',
+    'BulkRateLimiter': '.rate_limiter',
+    'ThreadPoolFeedback': '.rate_limiter',
+    'Recording': '.recorder',
+    'Replay': '.recorder',
+}
+
+__all__ = list(_LAZY_IMPORTS)
+
+__getattr__ = lazy_getattr(__name__, _LAZY_IMPORTS, globals())
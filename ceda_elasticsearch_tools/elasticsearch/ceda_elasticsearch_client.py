@@ -9,13 +9,20 @@ __license__ = 'BSD - see LICENSE file in top-level package directory'
 __contact__ = 'richard.d.smith@stfc.ac.uk'
 
 from elasticsearch import Elasticsearch
+from elastic_transport import Urllib3HttpNode
 import os
 
+from .node_selector import latency_aware_settings
+from .instrumentation import instrumented_node_class, metrics_from_environment
+from .recorder import Recording, Replay, recording_node_class, replay_node_class, recorder_from_environment
+
 CA_ROOT = os.path.abspath(
             os.path.join(
                 os.path.dirname(__file__), '../root_certificate/root-ca.pem')
         )
 
+DEFAULT_HOSTS = ['es%s.ceda.ac.uk:9200' % i for i in range(1, 9)]
+
 
 class CEDAElasticsearchClient(Elasticsearch):
     """
@@ -30,23 +37,106 @@ class CEDAElasticsearchClient(Elasticsearch):
     For application access, which requires write permissions, you will need to provide an API key. This can be done:
     
     es =  CEDAElasticsearchClient(headers={'x-api-key':'YOUR-API-KEY'})
+
+    To prefer the fastest healthy nodes rather than round robin, and optionally discover the data nodes:
+
+    es = CEDAElasticsearchClient(latency_aware=True, sniff=True)
+
+    To record per request metrics, pass an Instrumentation object (or set CEDA_ES_METRICS):
+
+    es = CEDAElasticsearchClient(instrumentation=Instrumentation())
+
+    To record the traffic to a file, and later replay it without the cluster (or set CEDA_ES_RECORD/CEDA_ES_REPLAY):
+
+    es = CEDAElasticsearchClient(recording='run.jsonl.gz')
+    es = CEDAElasticsearchClient(replay=Replay('run.jsonl.gz', time_scale=0))
     
     For further customisations see the Python Elasticsearch client documentation
     """
 
-    def __init__(self,hosts=['es%s.ceda.ac.uk:9200' % i for i in range(1,9)], use_ssl=True, ca_certs=CA_ROOT, **kwargs):
+    def __init__(self, hosts=DEFAULT_HOSTS, use_ssl=True, ca_certs=CA_ROOT, latency_aware=False, sniff=False,
+                 instrumentation=None, recording=None, replay=None, **kwargs):
         """
         Return elasticsearch client object but always use SSL and
         provide the cluster root certificate
-        :param hosts: List of hosts to connect to. Default: [f'es{i}.ceda.ac.uk:9200' for i in range(9,17)]
-        :param use_ssl: Default: True
+        :param hosts: List of hosts to connect to. Default: [f'es{i}.ceda.ac.uk:9200' for i in range(1,9)]
+        :param use_ssl: Scheme to use for hosts given without one. Default: True (https)
         :param ca_certs: Certificate authority root certificates. Default: CEDA Cluster root certs (set None to disable)
+        :param latency_aware: Select nodes on their recent latency and error rate. Default: False
+        :param sniff: With latency_aware, discover the data nodes in the cluster. Default: False
+        :param instrumentation: Instrumentation to record request metrics in. Default: from CEDA_ES_METRICS, else None
+        :param recording: Recording, or file path, to write requests and responses to. Default: from CEDA_ES_RECORD
+        :param replay: Replay, or file path, to answer requests from instead of the cluster. Default: from CEDA_ES_REPLAY
         :param kwargs:
         """
 
+        if isinstance(hosts, str):
+            hosts = [hosts]
+
+        # The 8.x client requires a scheme on each host and no longer accepts use_ssl
+        scheme = 'https' if use_ssl else 'http'
+        hosts = [
+            f'{scheme}://{host}' if isinstance(host, str) and '://' not in host else host
+            for host in hosts
+        ]
+
+        if ca_certs is not None:
+            kwargs['ca_certs'] = ca_certs
+
+        if recording is None and replay is None and '_transport' not in kwargs:
+            recording, replay = recorder_from_environment()
+
+        if isinstance(recording, str):
+            recording = Recording(recording)
+
+        if isinstance(replay, str):
+            replay = Replay(replay)
+
+        if replay is not None:
+            kwargs['node_class'] = replay_node_class(replay)
+        elif recording is not None:
+            kwargs['node_class'] = recording_node_class(recording, kwargs.get('node_class', Urllib3HttpNode))
+
+        if latency_aware:
+            kwargs.update(
+                latency_aware_settings(kwargs.pop('node_class', Urllib3HttpNode), sniff=sniff)
+            )
+
+        if instrumentation is None and '_transport' not in kwargs:
+            instrumentation = metrics_from_environment()
+
+        if instrumentation is not None:
+            kwargs['node_class'] = instrumented_node_class(kwargs.get('node_class', Urllib3HttpNode))
+
         super(CEDAElasticsearchClient, self).__init__(
             hosts=hosts,
-            use_ssl=use_ssl,
-            ca_certs=ca_certs,
             **kwargs
         )
+
+        self.instrumentation = instrumentation
+
+    def options(self, **kwargs):
+        client = super(CEDAElasticsearchClient, self).options(**kwargs)
+        client.instrumentation = self.instrumentation
+        return client
+
+    def perform_request(self, method, path, *, params=None, headers=None, body=None, endpoint_id=None, path_parts=None):
+        def request():
+            return super(CEDAElasticsearchClient, self).perform_request(
+                method,
+                path,
+                params=params,
+                headers=headers,
+                body=body,
+                endpoint_id=endpoint_id,
+                path_parts=path_parts
+            )
+
+        if self.instrumentation is None:
+            return request()
+
+        index = (path_parts or {}).get('index')
+        if isinstance(index, (list, tuple)):
+            index = ','.join(index)
+
+        return self.instrumentation.call(request, endpoint_id or path, index)
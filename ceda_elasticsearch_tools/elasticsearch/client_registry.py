@@ -0,0 +1,123 @@
+# encoding: utf-8
+"""
+Process wide registry of Elasticsearch clients.
+
+Creating a client is cheap but every new client starts with an empty
+connection pool, so the first request to each node pays for a fresh TLS
+handshake. Objects which are created per request (updaters, bulk clients)
+share a client from this registry so that pooled connections are reused.
+Clients are keyed on the settings used to create them.
+"""
+__author__ = 'Richard Smith'
+__date__ = '19 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import json
+import socket
+import threading
+
+from elastic_transport import Urllib3HttpNode
+from urllib3.connection import HTTPConnection
+
+from .ceda_elasticsearch_client import CEDAElasticsearchClient
+
+_clients = {}
+_lock = threading.Lock()
+
+# Keep alive node classes are created once per idle time
+_node_classes = {}
+
+
+def keep_alive_node_class(idle, interval=None):
+    """
+    Return a node class which enables TCP keep alive on pooled connections so
+    that idle connections are not dropped by firewalls between requests.
+
+    :param idle:        Seconds a connection is idle before keep alive probes are sent
+    :param interval:    Seconds between keep alive probes. (default: idle)
+    :return: Urllib3HttpNode subclass
+    """
+    interval = interval or idle
+    key = (idle, interval)
+
+    if key not in _node_classes:
+        socket_options = HTTPConnection.default_socket_options + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+
+        # Only available on linux
+        if hasattr(socket, 'TCP_KEEPIDLE'):
+            socket_options += [
+                (socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, int(idle)),
+                (socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, int(interval)),
+            ]
+
+        class KeepAliveHttpNode(Urllib3HttpNode):
+
+            def __init__(self, config):
+                super().__init__(config)
+                self.pool.conn_kw['socket_options'] = socket_options
+
+        _node_classes[key] = KeepAliveHttpNode
+
+    return _node_classes[key]
+
+
+def _settings_key(kwargs):
+    """
+    Build a hashable key from the client settings. Objects which can't be
+    serialised (eg. an SSLContext) are keyed on identity.
+    """
+    return json.dumps(kwargs, sort_keys=True, default=lambda obj: f'{type(obj).__name__}@{id(obj)}')
+
+
+def client_settings(pool_size=None, keep_alive=None, **kwargs):
+    """
+    Translate the pool settings into CEDAElasticsearchClient keyword arguments.
+
+    :param pool_size:   Maximum number of pooled connections to each node. (default: client default)
+    :param keep_alive:  Seconds before TCP keep alive probes are sent on idle connections. (default: disabled)
+    :param kwargs:      Keyword arguments for CEDAElasticsearchClient
+    :return: dict
+    """
+
+    if pool_size is not None:
+        kwargs['connections_per_node'] = pool_size
+
+    if keep_alive is not None:
+        kwargs['node_class'] = keep_alive_node_class(keep_alive)
+
+    return kwargs
+
+
+def get_client(**kwargs):
+    """
+    Return a shared client for the given settings, creating it on first use.
+
+    :param kwargs:  Keyword arguments for CEDAElasticsearchClient plus pool_size
+                    and keep_alive. See client_settings.
+    :return: CEDAElasticsearchClient
+    """
+
+    kwargs = client_settings(**kwargs)
+    key = _settings_key(kwargs)
+
+    with _lock:
+        client = _clients.get(key)
+
+        if client is None:
+            client = CEDAElasticsearchClient(**kwargs)
+            _clients[key] = client
+
+    return client
+
+
+def close_clients():
+    """
+    Close all the clients in the registry and their pooled connections.
+    """
+    with _lock:
+        for client in _clients.values():
+            client.close()
+
+        _clients.clear()
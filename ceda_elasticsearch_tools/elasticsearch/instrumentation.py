@@ -0,0 +1,338 @@
+# encoding: utf-8
+"""
+Per request instrumentation for the Elasticsearch layer.
+
+Records latency, request and response bytes, the elasticsearch `took`, item
+counts and error counts for each API and index. The results can be written
+out as JSON or in the Prometheus text file format.
+
+Setting the environment variable CEDA_ES_METRICS to a file path turns on
+instrumentation for every client and writes the metrics to that file when the
+process exits. Files ending .prom are written in the Prometheus format,
+anything else as JSON.
+"""
+__author__ = 'Richard Smith'
+__date__ = '19 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+
+from elastic_transport import Urllib3HttpNode, ApiError, TransportError
+
+METRICS_ENV = 'CEDA_ES_METRICS'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class Histogram(object):
+    """
+    Fixed bucket histogram, compatible with the Prometheus histogram type.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """
+        :return: List of (upper bound, cumulative count) including +Inf
+        """
+        total = 0
+        output = []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            output.append((bound, total))
+        return output
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'buckets': {('+Inf' if bound == float('inf') else bound): count for bound, count in self.cumulative()},
+        }
+
+
+class CallMetrics(object):
+    """
+    Metrics for one API and index pair
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.items = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.latency = Histogram()
+        self.took = Histogram()
+
+    def as_dict(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'items': self.items,
+            'request_bytes': self.request_bytes,
+            'response_bytes': self.response_bytes,
+            'latency_seconds': self.latency.as_dict(),
+            'took_seconds': self.took.as_dict(),
+        }
+
+
+# Bytes on the wire for the request running in this thread. Filled in by the node class.
+_wire = threading.local()
+
+
+def _wire_reset():
+    _wire.sent = 0
+    _wire.received = 0
+
+
+_instrumented_node_classes = {}
+
+
+def instrumented_node_class(base=Urllib3HttpNode):
+    """
+    Return a subclass of the given node class which counts the bytes sent and
+    received for the request running in the current thread.
+
+    :param base: Node class to extend. (default: Urllib3HttpNode)
+    :return: Node class
+    """
+
+    if base not in _instrumented_node_classes:
+
+        class InstrumentedHttpNode(base):
+
+            def perform_request(self, method, target, body=None, **kwargs):
+                response = super().perform_request(method, target, body=body, **kwargs)
+
+                _wire.sent = getattr(_wire, 'sent', 0) + len(body or b'')
+                _wire.received = getattr(_wire, 'received', 0) + len(response.body or b'')
+
+                return response
+
+        _instrumented_node_classes[base] = InstrumentedHttpNode
+
+    return _instrumented_node_classes[base]
+
+
+def count_items(api, body):
+    """
+    Count the items and failed items in a response body
+
+    :param api:     The endpoint id eg. bulk, msearch
+    :param body:    Deserialised response
+    :return: items, errors
+    """
+
+    if not isinstance(body, dict):
+        return 0, 0
+
+    if 'items' in body:
+        items = body['items']
+        errors = 0
+        if body.get('errors'):
+            errors = sum(1 for item in items if any(v.get('status', 200) >= 300 for v in item.values()))
+        return len(items), errors
+
+    if 'responses' in body:
+        responses = body['responses']
+        return len(responses), sum(1 for response in responses if 'error' in response)
+
+    if 'docs' in body:
+        return len(body['docs']), sum(1 for doc in body['docs'] if 'error' in doc)
+
+    if 'hits' in body:
+        return len(body['hits'].get('hits', [])), 0
+
+    if api in ('update_by_query', 'delete_by_query'):
+        return body.get('total', 0), len(body.get('failures', []))
+
+    return 0, 0
+
+
+class Instrumentation(object):
+    """
+    Collects metrics keyed on (api, index).
+
+    Usage::
+
+        metrics = Instrumentation()
+        es = CEDAElasticsearchClient(instrumentation=metrics)
+        ...
+        metrics.dump('metrics.prom')
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, api, index):
+        key = (api, index or '')
+        if key not in self.metrics:
+            self.metrics[key] = CallMetrics()
+        return self.metrics[key]
+
+    def record(self, api, index, latency, request_bytes=0, response_bytes=0, took=None, items=0, errors=0):
+        """
+        Record a single call
+
+        :param api:             API name eg. bulk
+        :param index:           Index name. Empty for calls not against an index
+        :param latency:         Seconds taken as seen by the client
+        :param request_bytes:   Bytes sent
+        :param response_bytes:  Bytes received
+        :param took:            Elasticsearch reported time in milliseconds
+        :param items:           Number of items in the response
+        :param errors:          Number of failed items, or 1 for a failed call
+        """
+        with self._lock:
+            metrics = self._get(api, index)
+            metrics.calls += 1
+            metrics.errors += errors
+            metrics.items += items
+            metrics.request_bytes += request_bytes
+            metrics.response_bytes += response_bytes
+            metrics.latency.observe(latency)
+
+            if took is not None:
+                metrics.took.observe(took / 1000.0)
+
+    def call(self, func, api, index):
+        """
+        Run a client request and record its metrics.
+
+        :param func:    Callable performing the request
+        :param api:     Endpoint id
+        :param index:   Target index
+        :return: The response from func
+        """
+        _wire_reset()
+        start = time.perf_counter()
+
+        try:
+            response = func()
+
+        except (ApiError, TransportError):
+            self.record(api, index, time.perf_counter() - start, _wire.sent, _wire.received, errors=1)
+            raise
+
+        body = getattr(response, 'body', None)
+        items, errors = count_items(api, body)
+        took = body.get('took') if isinstance(body, dict) else None
+
+        self.record(api, index, time.perf_counter() - start, _wire.sent, _wire.received,
+                    took=took, items=items, errors=errors)
+
+        return response
+
+    def as_dict(self):
+        with self._lock:
+            return [
+                dict(api=api, index=index, **metrics.as_dict())
+                for (api, index), metrics in sorted(self.metrics.items())
+            ]
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), indent=2)
+
+    def to_prometheus(self, prefix='ceda_es'):
+        """
+        :return: Metrics in the Prometheus text exposition format
+        """
+        lines = []
+
+        def labels(api, index, **extra):
+            pairs = dict(api=api, index=index, **extra)
+            return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs.items()) + '}'
+
+        counters = (
+            ('requests_total', 'Number of requests', 'calls'),
+            ('errors_total', 'Number of failed requests and items', 'errors'),
+            ('items_total', 'Number of items in responses', 'items'),
+            ('request_bytes_total', 'Bytes sent', 'request_bytes'),
+            ('response_bytes_total', 'Bytes received', 'response_bytes'),
+        )
+
+        with self._lock:
+            for name, help_text, attr in counters:
+                lines.append(f'# HELP {prefix}_{name} {help_text}')
+                lines.append(f'# TYPE {prefix}_{name} counter')
+                for (api, index), metrics in sorted(self.metrics.items()):
+                    lines.append(f'{prefix}_{name}{labels(api, index)} {getattr(metrics, attr)}')
+
+            histograms = (
+                ('request_duration_seconds', 'Request latency seen by the client', 'latency'),
+                ('took_seconds', 'Time taken as reported by elasticsearch', 'took'),
+            )
+
+            for name, help_text, attr in histograms:
+                lines.append(f'# HELP {prefix}_{name} {help_text}')
+                lines.append(f'# TYPE {prefix}_{name} histogram')
+                for (api, index), metrics in sorted(self.metrics.items()):
+                    histogram = getattr(metrics, attr)
+                    for bound, count in histogram.cumulative():
+                        le = '+Inf' if bound == float('inf') else repr(bound)
+                        lines.append(f'{prefix}_{name}_bucket{labels(api, index, le=le)} {count}')
+                    lines.append(f'{prefix}_{name}_sum{labels(api, index)} {histogram.sum}')
+                    lines.append(f'{prefix}_{name}_count{labels(api, index)} {histogram.count}')
+
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path):
+        """
+        Write the metrics to path. Prometheus format if the path ends .prom, otherwise JSON.
+        The file is replaced atomically so a collector never reads a partial file.
+
+        :param path: Output file
+        """
+        content = self.to_prometheus() if path.endswith('.prom') else self.to_json()
+
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as writer:
+            writer.write(content)
+        os.replace(tmp_path, path)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+INSTRUMENTATION = Instrumentation()
+
+_exit_dump_registered = False
+
+
+def metrics_from_environment():
+    """
+    If CEDA_ES_METRICS is set, return the process wide Instrumentation and make
+    sure it is written to that path when the process exits.
+
+    :return: Instrumentation or None
+    """
+    global _exit_dump_registered
+
+    path = os.environ.get(METRICS_ENV)
+
+    if not path:
+        return None
+
+    if not _exit_dump_registered:
+        atexit.register(INSTRUMENTATION.dump, path)
+        _exit_dump_registered = True
+
+    return INSTRUMENTATION
@@ -0,0 +1,197 @@
+# encoding: utf-8
+"""
+Latency aware node selection.
+
+The default selector round robins over the live nodes, so a node which is
+slow (eg. in a long GC) still receives its full share of requests until it
+stops responding altogether. The classes here keep a moving average of the
+latency and error rate of each node and send requests to the fastest healthy
+nodes instead.
+"""
+__author__ = 'Richard Smith'
+__date__ = '19 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import random
+import threading
+import time
+
+from elastic_transport import NodeSelector, Urllib3HttpNode, TransportError
+
+
+class NodeStats(object):
+    """
+    Exponentially weighted moving averages of latency and error rate per node.
+    Nodes are keyed on their base url so that the statistics are shared by all
+    clients talking to the same node.
+    """
+
+    def __init__(self, alpha=0.2):
+        """
+        :param alpha:   Weight given to the newest sample. (default: 0.2)
+        """
+        self.alpha = alpha
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, node, latency, error=False):
+        """
+        Record the outcome of a request
+
+        :param node:    base url of the node
+        :param latency: Request duration in seconds
+        :param error:   Whether the request failed
+        """
+        error = 1.0 if error else 0.0
+
+        with self._lock:
+            stats = self._stats.get(node)
+
+            if stats is None:
+                self._stats[node] = {'latency': latency, 'error_rate': error, 'requests': 1}
+                return
+
+            stats['latency'] += self.alpha * (latency - stats['latency'])
+            stats['error_rate'] += self.alpha * (error - stats['error_rate'])
+            stats['requests'] += 1
+
+    def get(self, node):
+        """
+        :param node:    base url of the node
+        :return: dict with latency, error_rate and requests or None if the node has not been used
+        """
+        stats = self._stats.get(node)
+        return dict(stats) if stats else None
+
+    def as_dict(self):
+        with self._lock:
+            return {node: dict(stats) for node, stats in self._stats.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+NODE_STATS = NodeStats()
+
+
+_timed_node_classes = {}
+
+
+def timed_node_class(base=Urllib3HttpNode, stats=NODE_STATS):
+    """
+    Return a subclass of the given node class which records the latency and
+    outcome of every request in stats.
+
+    :param base:    Node class to extend. (default: Urllib3HttpNode)
+    :param stats:   NodeStats to record into. (default: NODE_STATS)
+    :return: Node class
+    """
+    key = (base, id(stats))
+
+    if key not in _timed_node_classes:
+
+        class TimedHttpNode(base):
+
+            def perform_request(self, *args, **kwargs):
+                start = time.perf_counter()
+
+                try:
+                    response = super().perform_request(*args, **kwargs)
+
+                except TransportError:
+                    stats.record(self.base_url, time.perf_counter() - start, error=True)
+                    raise
+
+                stats.record(self.base_url, time.perf_counter() - start, error=response.meta.status >= 500)
+                return response
+
+        _timed_node_classes[key] = TimedHttpNode
+
+    return _timed_node_classes[key]
+
+
+class LatencyAwareSelector(NodeSelector):
+    """
+    Select the fastest healthy node.
+
+    A node's score is its average latency, inflated by its error rate. Requests
+    go to a random node among those scoring within `tolerance` of the best so
+    that load is still spread over the fast nodes. Nodes which have not been
+    used yet are tried first and a small fraction of requests explore any node
+    so that a node which has recovered is noticed.
+    """
+
+    tolerance = 1.5
+    error_penalty = 10.0
+    max_error_rate = 0.5
+    explore = 0.02
+
+    def __init__(self, node_configs, stats=NODE_STATS):
+        super().__init__(node_configs)
+        self.stats = stats
+
+    def score(self, node):
+        stats = self.stats.get(node.base_url)
+
+        if stats is None:
+            return 0.0
+
+        return stats['latency'] * (1 + self.error_penalty * stats['error_rate'])
+
+    def select(self, nodes):
+        if len(nodes) == 1 or random.random() < self.explore:
+            return random.choice(nodes)
+
+        # Avoid failing nodes unless there is nothing else
+        healthy = [
+            node for node in nodes
+            if (self.stats.get(node.base_url) or {}).get('error_rate', 0) < self.max_error_rate
+        ] or nodes
+
+        scores = [(self.score(node), node) for node in healthy]
+        best = min(score for score, _ in scores)
+
+        candidates = [node for score, node in scores if score <= best * self.tolerance]
+
+        return random.choice(candidates)
+
+
+def data_nodes_only(node_info, node_config):
+    """
+    sniffed_node_callback which only keeps data nodes from a sniff so that
+    requests are not routed to master or coordinating only nodes.
+    """
+    roles = node_info.get('roles', [])
+
+    if any(role.startswith('data') for role in roles):
+        return node_config
+
+    return None
+
+
+def latency_aware_settings(node_class=Urllib3HttpNode, sniff=False, sniff_interval=60):
+    """
+    Client keyword arguments to enable latency aware node selection
+
+    :param node_class:      Node class to extend with timing. (default: Urllib3HttpNode)
+    :param sniff:           Discover the data nodes in the cluster on start and after node failures. (default: False)
+    :param sniff_interval:  Minimum number of seconds between sniffs. (default: 60)
+    :return: dict
+    """
+    settings = {
+        'node_class': timed_node_class(node_class),
+        'node_selector_class': LatencyAwareSelector,
+    }
+
+    if sniff:
+        settings.update({
+            'sniff_on_start': True,
+            'sniff_on_node_failure': True,
+            'min_delay_between_sniffing': sniff_interval,
+            'sniffed_node_callback': data_nodes_only,
+        })
+
+    return settings
@@ -0,0 +1,242 @@
+# encoding: utf-8
+"""
+Rate limiting for bulk writes.
+
+Large update runs can fill the write thread pools on the cluster and slow down
+interactive searches. BulkRateLimiter holds bulk requests to a budget of
+documents and/or bytes per second using token buckets. With ThreadPoolFeedback
+the budget is scaled down automatically when the nodes report queued or
+rejected writes and restored as the pressure drops.
+"""
+__author__ = 'Richard Smith'
+__date__ = '19 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket(object):
+    """
+    Token bucket which refills at `rate` tokens per second up to `capacity`.
+    Requests larger than the bucket are allowed and put the bucket into debt,
+    so the long run rate is always respected.
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        """
+        :param rate:        Tokens added per second
+        :param capacity:    Maximum tokens held. (default: one second of tokens)
+        :param clock:       Monotonic clock function
+        :param sleep:       Sleep function
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self, amount=1):
+        """
+        Take tokens from the bucket, sleeping until the bucket is out of debt.
+
+        :param amount:  Number of tokens
+        :return: Seconds spent waiting
+        """
+        with self._lock:
+            self._refill()
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+        if wait:
+            self._sleep(wait)
+
+        return wait
+
+
+class BulkRateLimiter(object):
+    """
+    Limit bulk requests to a budget of documents per second, bytes per second or both.
+
+    Usage::
+
+        limiter = BulkRateLimiter(docs_per_second=2000)
+        fbi = CedaFbi(rate_limiter=limiter)
+    """
+
+    def __init__(self, docs_per_second=None, bytes_per_second=None, burst=1.0, feedback=None,
+                 clock=time.monotonic, sleep=time.sleep):
+        """
+        :param docs_per_second:     Document budget. (default: unlimited)
+        :param bytes_per_second:    Byte budget. (default: unlimited)
+        :param burst:               Seconds of budget which can be used at once. (default: 1.0)
+        :param feedback:            Optional ThreadPoolFeedback used to scale the budget
+        """
+        if docs_per_second is None and bytes_per_second is None:
+            raise ValueError("At least one of docs_per_second or bytes_per_second must be set")
+
+        self.docs_per_second = docs_per_second
+        self.bytes_per_second = bytes_per_second
+        self.factor = 1.0
+        self.feedback = feedback
+        self.waited = 0.0
+
+        self.buckets = {}
+        if docs_per_second:
+            self.buckets['docs'] = TokenBucket(docs_per_second, docs_per_second * burst, clock, sleep)
+        if bytes_per_second:
+            self.buckets['bytes'] = TokenBucket(bytes_per_second, bytes_per_second * burst, clock, sleep)
+
+    def set_factor(self, factor):
+        """
+        Scale the budgets relative to the configured rates
+
+        :param factor: Multiplier between 0 and 1
+        """
+        self.factor = factor
+
+        if 'docs' in self.buckets:
+            self.buckets['docs'].rate = self.docs_per_second * factor
+        if 'bytes' in self.buckets:
+            self.buckets['bytes'].rate = self.bytes_per_second * factor
+
+    def throttle(self, docs=0, nbytes=0):
+        """
+        Block until the request fits in the budget.
+
+        :param docs:    Number of documents in the request
+        :param nbytes:  Size of the request in bytes
+        :return: Seconds spent waiting
+        """
+        if self.feedback is not None:
+            self.feedback.maybe_poll(self)
+
+        waited = 0.0
+        if 'docs' in self.buckets and docs:
+            waited += self.buckets['docs'].acquire(docs)
+        if 'bytes' in self.buckets and nbytes:
+            waited += self.buckets['bytes'].acquire(nbytes)
+
+        self.waited += waited
+        return waited
+
+    def throttle_bulk(self, body):
+        """
+        Throttle a bulk request body in the NDJSON format
+
+        :param body: Bulk request body (str|bytes)
+        :return: Seconds spent waiting
+        """
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+
+        return self.throttle(docs=count_bulk_actions(body), nbytes=len(body))
+
+
+def count_bulk_actions(body):
+    """
+    Count the actions in a bulk NDJSON body. Every action is a header line
+    followed by a source line, apart from delete which has no source.
+
+    :param body: Bulk request body (bytes)
+    :return: Number of actions
+    """
+    lines = [line for line in body.splitlines() if line.strip()]
+
+    count = 0
+    i = 0
+    while i < len(lines):
+        count += 1
+        i += 1 if 'delete' in json.loads(lines[i]) else 2
+
+    return count
+
+
+class ThreadPoolFeedback(object):
+    """
+    Polls the node thread pool statistics and scales a BulkRateLimiter.
+
+    Any new rejections, or a queue deeper than `high_queue` on any node, halve
+    the budget down to `min_factor`. A queue below `low_queue` on every node
+    raises it again by a quarter, up to the configured rate.
+    """
+
+    def __init__(self, es, pools=('write',), interval=5.0, high_queue=100, low_queue=10, min_factor=0.05,
+                 clock=time.monotonic):
+        """
+        :param es:          Elasticsearch client
+        :param pools:       Thread pools to watch. (default: write)
+        :param interval:    Minimum seconds between polls. (default: 5)
+        :param high_queue:  Queue depth at which to back off. (default: 100)
+        :param low_queue:   Queue depth under which to speed up. (default: 10)
+        :param min_factor:  Lowest fraction of the configured rate. (default: 0.05)
+        """
+        self.es = es
+        self.pools = pools
+        self.interval = interval
+        self.high_queue = high_queue
+        self.low_queue = low_queue
+        self.min_factor = min_factor
+        self._clock = clock
+        self._last_poll = None
+        self._rejected = None
+
+    def pressure(self):
+        """
+        :return: (deepest queue across nodes, total rejections) for the watched pools
+        """
+        stats = self.es.nodes.stats(metric='thread_pool')
+
+        queue = 0
+        rejected = 0
+        for node in stats['nodes'].values():
+            for pool in self.pools:
+                pool_stats = node.get('thread_pool', {}).get(pool, {})
+                queue = max(queue, pool_stats.get('queue', 0))
+                rejected += pool_stats.get('rejected', 0)
+
+        return queue, rejected
+
+    def poll(self, limiter):
+        """
+        Read the thread pool statistics and adjust the limiter
+
+        :param limiter: BulkRateLimiter
+        """
+        self._last_poll = self._clock()
+
+        try:
+            queue, rejected = self.pressure()
+        except Exception as msg:
+            logger.warning(f"Unable to read thread pool stats: {msg}")
+            return
+
+        new_rejections = self._rejected is not None and rejected > self._rejected
+        self._rejected = rejected
+
+        factor = limiter.factor
+        if new_rejections or queue > self.high_queue:
+            factor = max(self.min_factor, factor / 2)
+        elif queue < self.low_queue:
+            factor = min(1.0, factor * 1.25)
+
+        if factor != limiter.factor:
+            logger.info(f"Write queue: {queue} rejections: {rejected}. Scaling bulk rate to {factor:.0%}")
+            limiter.set_factor(factor)
+
+    def maybe_poll(self, limiter):
+        if self._last_poll is None or self._clock() - self._last_poll >= self.interval:
+            self.poll(limiter)
@@ -0,0 +1,287 @@
+# encoding: utf-8
+"""
+Record and replay the traffic between a client and the cluster.
+
+A recording is a gzip compressed file of JSON lines, one per request, holding
+the request method, target and body with the response status, headers, body
+and duration. Replaying a recording answers each request from the file without
+touching the network, waiting for the original duration multiplied by
+`time_scale`. A time_scale of 0 replays as fast as possible, leaving only the
+client side work to measure.
+
+Setting the environment variable CEDA_ES_RECORD to a file path records every
+CEDAElasticsearchClient in the process. CEDA_ES_REPLAY replays a recording
+instead, with CEDA_ES_REPLAY_SCALE setting the time scale (default: 1).
+
+    CEDA_ES_RECORD=nla_sync.jsonl.gz nla_sync_lotus_task.py ...
+    CEDA_ES_REPLAY=nla_sync.jsonl.gz CEDA_ES_REPLAY_SCALE=0 python -m cProfile nla_sync_lotus_task.py ...
+"""
+__author__ = 'Richard Smith'
+__date__ = '19 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import atexit
+import base64
+import collections
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+from elastic_transport import BaseNode, Urllib3HttpNode, ApiResponseMeta, HttpHeaders, TransportError
+from elastic_transport import ConnectionError as TransportConnectionError
+
+RECORD_ENV = 'CEDA_ES_RECORD'
+REPLAY_ENV = 'CEDA_ES_REPLAY'
+REPLAY_SCALE_ENV = 'CEDA_ES_REPLAY_SCALE'
+
+# The (meta, body) pair returned by a node's perform_request
+ReplayResponse = collections.namedtuple('ReplayResponse', ('meta', 'body'))
+
+
+class ReplayError(TransportError):
+    """
+    Raised when a request has no matching response left in the recording
+    """
+
+
+def _encode(data):
+    if data is None:
+        return None, None
+    try:
+        return data.decode('utf-8'), 'utf-8'
+    except UnicodeDecodeError:
+        return base64.b64encode(data).decode('ascii'), 'base64'
+
+
+def _decode(data, encoding):
+    if data is None:
+        return None
+    if encoding == 'base64':
+        return base64.b64decode(data)
+    return data.encode('utf-8')
+
+
+def _body_hash(body):
+    return hashlib.md5(body or b'').hexdigest()
+
+
+class Recording(object):
+    """
+    Writes request and response pairs to a gzip JSON lines file.
+    Safe to share between the nodes and threads of a client.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._writer = None
+        self._start = None
+        self._lock = threading.Lock()
+
+    def write(self, method, target, body, status=None, headers=None, response=None, duration=0.0, error=None):
+        """
+        Append one request to the recording
+
+        :param method:      HTTP method
+        :param target:      Request path and query string
+        :param body:        Request body (bytes)
+        :param status:      Response status
+        :param headers:     Response headers
+        :param response:    Response body (bytes)
+        :param duration:    Seconds taken
+        :param error:       Name of the transport error raised, if the request failed
+        """
+        request_body, request_encoding = _encode(body)
+        response_body, response_encoding = _encode(response)
+
+        with self._lock:
+            if self._writer is None:
+                self._writer = gzip.open(self.path, 'at', encoding='utf-8')
+                self._start = time.monotonic()
+                atexit.register(self.close)
+
+            entry = {
+                'offset': time.monotonic() - self._start,
+                'method': method,
+                'target': target,
+                'body_md5': _body_hash(body),
+                'body': request_body,
+                'body_encoding': request_encoding,
+                'status': status,
+                'headers': dict(headers or {}),
+                'response': response_body,
+                'response_encoding': response_encoding,
+                'duration': duration,
+                'error': error,
+            }
+
+            self._writer.write(json.dumps(entry) + '\n')
+
+    def close(self):
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+
+def read_recording(path):
+    """
+    :param path: Recording file
+    :return: Generator of recorded entries
+    """
+    with gzip.open(path, 'rt', encoding='utf-8') as reader:
+        for line in reader:
+            if line.strip():
+                yield json.loads(line)
+
+
+class Replay(object):
+    """
+    Serves responses from a recording. Requests are matched on method, target
+    and body, then on method and target alone. Repeated requests are answered
+    in the order they were recorded.
+    """
+
+    def __init__(self, path, time_scale=1.0, sleep=time.sleep):
+        """
+        :param path:        Recording file
+        :param time_scale:  Multiplier for the recorded durations. 0 answers immediately (default: 1)
+        """
+        self.path = path
+        self.time_scale = time_scale
+        self._sleep = sleep
+        self._lock = threading.Lock()
+
+        self._exact = collections.defaultdict(collections.deque)
+        self._loose = collections.defaultdict(collections.deque)
+
+        self.entries = list(read_recording(path))
+        for entry in self.entries:
+            self._exact[(entry['method'], entry['target'], entry['body_md5'])].append(entry)
+            self._loose[(entry['method'], entry['target'])].append(entry)
+
+        self.served = 0
+
+    def _take(self, method, target, body):
+        with self._lock:
+            for queue in (self._exact[(method, target, _body_hash(body))], self._loose[(method, target)]):
+                while queue:
+                    entry = queue.popleft()
+                    if not entry.get('served'):
+                        entry['served'] = True
+                        self.served += 1
+                        return entry
+
+        raise ReplayError(f'No recorded response left for {method} {target} in {self.path}')
+
+    def respond(self, node_config, method, target, body=None):
+        """
+        :return: ReplayResponse for the request
+        """
+        entry = self._take(method, target, body)
+
+        duration = entry['duration'] * self.time_scale
+        if duration:
+            self._sleep(duration)
+
+        if entry.get('error'):
+            raise TransportConnectionError(f"Recorded {entry['error']}")
+
+        meta = ApiResponseMeta(
+            node=node_config,
+            duration=duration,
+            http_version='1.1',
+            status=entry['status'],
+            headers=HttpHeaders(entry['headers']),
+        )
+
+        return ReplayResponse(meta, _decode(entry['response'], entry['response_encoding']) or b'')
+
+
+_recording_node_classes = {}
+
+
+def recording_node_class(recording, base=Urllib3HttpNode):
+    """
+    Return a subclass of the given node class which writes every request and
+    response to the recording.
+
+    :param recording:   Recording
+    :param base:        Node class to extend. (default: Urllib3HttpNode)
+    :return: Node class
+    """
+
+    key = (id(recording), base)
+
+    if key not in _recording_node_classes:
+
+        class RecordingHttpNode(base):
+
+            def perform_request(self, method, target, body=None, **kwargs):
+                start = time.perf_counter()
+
+                try:
+                    response = super().perform_request(method, target, body=body, **kwargs)
+
+                except TransportError as exc:
+                    recording.write(method, target, body, duration=time.perf_counter() - start,
+                                    error=type(exc).__name__)
+                    raise
+
+                meta = response.meta
+                recording.write(method, target, body, meta.status, meta.headers, response.body,
+                                time.perf_counter() - start)
+
+                return response
+
+        _recording_node_classes[key] = RecordingHttpNode
+
+    return _recording_node_classes[key]
+
+
+def replay_node_class(replay):
+    """
+    Return a node class which answers from the replay instead of the network
+
+    :param replay: Replay
+    :return: Node class
+    """
+
+    class ReplayNode(BaseNode):
+
+        def perform_request(self, method, target, body=None, headers=None, request_timeout=None):
+            return replay.respond(self.config, method, target, body)
+
+        def close(self):
+            pass
+
+    return ReplayNode
+
+
+_environment = {}
+
+
+def recorder_from_environment():
+    """
+    :return: (Recording or None, Replay or None) as set by CEDA_ES_RECORD and CEDA_ES_REPLAY.
+             The same objects are returned to every client in the process.
+    """
+    record_path = os.environ.get(RECORD_ENV)
+    replay_path = os.environ.get(REPLAY_ENV)
+
+    if record_path and ('record', record_path) not in _environment:
+        _environment[('record', record_path)] = Recording(record_path)
+
+    if replay_path and ('replay', replay_path) not in _environment:
+        _environment[('replay', replay_path)] = Replay(
+            replay_path, time_scale=float(os.environ.get(REPLAY_SCALE_ENV, 1.0))
+        )
+
+    return (
+        _environment.get(('record', record_path)) if record_path else None,
+        _environment.get(('replay', replay_path)) if replay_path else None,
+    )
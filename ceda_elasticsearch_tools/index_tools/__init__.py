@@ -1,7 +1,14 @@
 
-from .ceda_dirs import CedaDirs
-from .ceda_fbi import CedaFbi
-from .ceda_eo import CedaEo
+from .._lazy import lazy_getattr
 
-from .base import IndexUpdaterBase
-from .ceda_client import BulkClient
\ No newline at end of file
+_LAZY_IMPORTS = {
+    'CedaDirs': '.ceda_dirs',
+    'CedaFbi': '.ceda_fbi',
+    'CedaEo': '.ceda_eo',
+    'IndexUpdaterBase': '.base',
+    'BulkClient': '.ceda_client',
+}
+
+__all__ = list(_LAZY_IMPORTS)
+
+__getattr__ = lazy_getattr(__name__, _LAZY_IMPORTS, globals())
@@ -11,11 +11,12 @@ __contact__ = 'richard.d.smith@stfc.ac.uk'
 
 import json
 import hashlib
-from tqdm import tqdm
 import sys
 import os
-from elasticsearch.helpers import scan
-from ceda_elasticsearch_tools.elasticsearch import CEDAElasticsearchClient
+import time
+from ceda_elasticsearch_tools.elasticsearch import CEDAElasticsearchClient, get_client
+from ceda_elasticsearch_tools.elasticsearch.client_registry import client_settings
+from ceda_elasticsearch_tools.elasticsearch.instrumentation import count_items
 
 
 class IndexUpdaterBase(object):
@@ -23,10 +24,16 @@ class IndexUpdaterBase(object):
     Base class for index updaters. Contains common methods.
     """
 
-    def __init__(self, index, **kwargs):
+    def __init__(self, index, shared_client=True, rate_limiter=None, **kwargs):
         """
         Common variables.
-        :param index:   Index to update
+        :param index:           Index to update
+        :param shared_client:   Use the process wide client for these settings so that
+                                pooled connections are reused between instances. (default: True)
+        :param rate_limiter:    Optional BulkRateLimiter to hold bulk writes to a budget
+        :param kwargs:          Keyword arguments for CEDAElasticsearchClient. Also accepts pool_size
+                                and keep_alive, see client_registry.client_settings. Pass
+                                instrumentation=Instrumentation() to record request metrics.
         """
 
         ca_root = os.path.abspath(
@@ -35,7 +42,11 @@ class IndexUpdaterBase(object):
         )
 
         self.index = index
-        self.es = CEDAElasticsearchClient(**kwargs)
+        self.rate_limiter = rate_limiter
+        if shared_client:
+            self.es = get_client(**kwargs)
+        else:
+            self.es = CEDAElasticsearchClient(**client_settings(**kwargs))
 
     @staticmethod
     def _get_action_key(es_response_item):
@@ -59,6 +70,8 @@ class IndexUpdaterBase(object):
         :return:        Generator of results
         """
 
+        from elasticsearch.helpers import scan
+
         return scan(self.es, query=query, scroll='1m', index=self.index, size=size)
 
     def _bulk_action(self, action_list, api="bulk", process_results=True):
@@ -77,10 +90,17 @@ class IndexUpdaterBase(object):
 
         """
 
+        from tqdm import tqdm
+
         response_list = []
+        start = time.perf_counter()
+
         for action in tqdm(action_list, desc="Processing queries", file=sys.stdout):
 
             if api == "bulk":
+                if self.rate_limiter is not None:
+                    self.rate_limiter.throttle_bulk(action)
+
                 response = self.es.bulk(index=self.index, body=action)
             elif api == "msearch":
                 response = self.es.msearch(body=action)
@@ -89,8 +109,32 @@ class IndexUpdaterBase(object):
 
             response_list.append(response)
 
+        self._record_bulk_action(api, response_list, time.perf_counter() - start)
+
         return self._process_bulk_action_response(response_list, api, process=process_results)
 
+    def _record_bulk_action(self, api, response_list, duration):
+        """
+        Record the totals for a whole bulk action when the client is instrumented.
+        Recorded under the api name with an _action suffix eg. bulk_action
+
+        :param api:             bulk|msearch
+        :param response_list:   Responses for each request in the action
+        :param duration:        Time taken for all the requests
+        """
+        instrumentation = getattr(self.es, 'instrumentation', None)
+
+        if instrumentation is None:
+            return
+
+        items = errors = 0
+        for response in response_list:
+            response_items, response_errors = count_items(api, getattr(response, 'body', response))
+            items += response_items
+            errors += response_errors
+
+        instrumentation.record(f'{api}_action', self.index, duration, items=items, errors=errors)
+
     def _generate_bulk_operation_body(self, content_list, action="index"):
         """
         Generate the query body for the bulk operation
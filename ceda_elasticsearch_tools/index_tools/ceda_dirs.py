@@ -11,7 +11,6 @@ __contact__ = 'richard.d.smith@stfc.ac.uk'
 from ceda_elasticsearch_tools.index_tools.base import IndexUpdaterBase
 import hashlib
 import os
-import requests
 from time import sleep
 
 
@@ -47,6 +46,8 @@ class CedaDirs(IndexUpdaterBase):
         #         dir = os.path.dirname(dir)
 
         # If no match found check MOLES API for metadata
+        import requests
+
         url = "http://api.catalogue.ceda.ac.uk/api/v0/obs/get_info"
 
         r = requests.get(url + path)
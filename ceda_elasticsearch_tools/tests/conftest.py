@@ -1,3 +1,16 @@
+import pytest
+
+from ceda_elasticsearch_tools.tests.es_standin import ElasticsearchStandIn
+
+
+@pytest.fixture
+def es_standin():
+    """
+    In memory elasticsearch node, see es_standin.ElasticsearchStandIn
+    """
+    with ElasticsearchStandIn(seed=0) as standin:
+        yield standin
+
 
 def pytest_collection_modifyitems(items):
 
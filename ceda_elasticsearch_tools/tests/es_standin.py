@@ -0,0 +1,698 @@
+"""
+In memory stand-in for an Elasticsearch node.
+
+Implements enough of the REST API for the code in this package to run against
+it offline: document CRUD, bulk, msearch, mget, search with sort, search_after,
+slices, scroll and point in time, count, update_by_query and delete_by_query.
+Latency and rejections can be injected to exercise the retry, rate limiting and
+node selection paths.
+
+Usage::
+
+    with ElasticsearchStandIn(latency=0.01, reject_rate=0.05) as standin:
+        es = standin.client()
+        es.index(index='test', id='1', document={'a': 1})
+
+Queries support match_all, term, terms, ids, match, prefix, match_phrase_prefix,
+exists and bool. update_by_query supports the simple painless scripts used in
+this package: `ctx._source.field = 'value'` and `ctx._source.remove('field')`.
+"""
+import functools
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+
+SHARDS = {'total': 1, 'successful': 1, 'skipped': 0, 'failed': 0}
+
+
+class StandInError(Exception):
+
+    def __init__(self, status, error_type, reason):
+        self.status = status
+        self.error_type = error_type
+        self.reason = reason
+
+    def as_response(self):
+        return self.status, {
+            'error': {'type': self.error_type, 'reason': self.reason, 'root_cause': []},
+            'status': self.status
+        }
+
+
+def get_field(source, field):
+    """
+    Get a dotted field from a document. Multi-field suffixes (.keyword, .raw)
+    fall back to the parent field.
+    """
+    value = source
+    for part in field.split('.'):
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        elif part in ('keyword', 'raw') and not isinstance(value, dict):
+            continue
+        else:
+            return None
+    return value
+
+
+def _values(value):
+    return value if isinstance(value, list) else [value]
+
+
+def matches(query, doc_id, source):
+    """
+    Evaluate a query against a single document
+    """
+    if not query:
+        return True
+
+    (kind, body), = query.items()
+
+    if kind == 'match_all':
+        return True
+
+    if kind == 'bool':
+        must = _values(body.get('must', [])) + _values(body.get('filter', []))
+        if not all(matches(q, doc_id, source) for q in must):
+            return False
+        if any(matches(q, doc_id, source) for q in _values(body.get('must_not', []))):
+            return False
+        should = _values(body.get('should', []))
+        minimum = body.get('minimum_should_match', 0 if must else 1)
+        return not should or sum(matches(q, doc_id, source) for q in should) >= minimum
+
+    if kind == 'ids':
+        return doc_id in body['values']
+
+    if kind == 'exists':
+        return get_field(source, body['field']) is not None
+
+    (field, condition), = body.items()
+    value = doc_id if field == '_id' else get_field(source, field)
+
+    if isinstance(condition, dict):
+        condition = condition.get('value', condition.get('query'))
+
+    if kind in ('term', 'match'):
+        return condition in _values(value)
+
+    if kind == 'terms':
+        return any(v in condition for v in _values(value))
+
+    if kind in ('prefix', 'match_phrase_prefix'):
+        return any(isinstance(v, str) and v.startswith(condition) for v in _values(value))
+
+    raise StandInError(400, 'parsing_exception', f'Query type [{kind}] is not supported by the stand-in')
+
+
+def filter_source(source, source_filter):
+    if source_filter is None or source_filter is True:
+        return source
+    if source_filter is False:
+        return None
+
+    if isinstance(source_filter, str):
+        source_filter = [source_filter]
+    if isinstance(source_filter, list):
+        source_filter = {'includes': source_filter}
+
+    includes = _values(source_filter.get('includes', source_filter.get('include', [])))
+    excludes = _values(source_filter.get('excludes', source_filter.get('exclude', [])))
+
+    def prune(doc, prefix=''):
+        output = {}
+        for key, value in doc.items():
+            path = prefix + key
+            if any(path == e or path.startswith(e + '.') for e in excludes):
+                continue
+            if isinstance(value, dict):
+                value = prune(value, path + '.')
+                if includes and not value and not any(path == i or path.startswith(i + '.') for i in includes):
+                    continue
+                output[key] = value
+            elif not includes or any(path == i or path.startswith(i + '.') for i in includes):
+                output[key] = value
+        return output
+
+    return prune(source)
+
+
+def _compare(a, b, orders):
+    for x, y, order in zip(a, b, orders):
+        if x == y:
+            continue
+        # Missing values sort last
+        if x is None:
+            return 1
+        if y is None:
+            return -1
+        result = -1 if x < y else 1
+        return result if order == 'asc' else -result
+    return 0
+
+
+def apply_script(source, script):
+    """
+    Apply the painless subset used by this package
+    """
+    if isinstance(script, dict):
+        script = script.get('source', '')
+
+    for statement in filter(None, (s.strip() for s in script.split(';'))):
+        remove = re.match(r"ctx\._source\.remove\(['\"](\w+)['\"]\)$", statement)
+        assign = re.match(r"ctx\._source\.(\w+)\s*=\s*['\"](.*)['\"]$", statement)
+
+        if remove:
+            source.pop(remove.group(1), None)
+        elif assign:
+            source[assign.group(1)] = assign.group(2)
+        else:
+            raise StandInError(400, 'script_exception', f'Unsupported script: {statement}')
+
+
+def deep_update(target, update):
+    for key, value in update.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            deep_update(target[key], value)
+        else:
+            target[key] = value
+
+
+class ElasticsearchStandIn(object):
+    """
+    In memory Elasticsearch node served over HTTP on localhost.
+    """
+
+    def __init__(self, latency=0.0, reject_rate=0.0, error_rate=0.0, error_status=500, seed=None):
+        """
+        :param latency:         Seconds to wait before each response, or a callable returning seconds
+        :param reject_rate:     Fraction of bulk items rejected with a 429, as a busy write thread pool would
+        :param error_rate:      Fraction of requests which fail outright
+        :param error_status:    HTTP status for failed requests (default: 500)
+        :param seed:            Seed for the random number generator used for injected failures
+        """
+        self.latency = latency
+        self.reject_rate = reject_rate
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+
+        self.indices = {}
+        self.scrolls = {}
+        self.pits = {}
+        self.requests = {}
+        self.rejected = 0
+
+        self._lock = threading.RLock()
+        self._server = None
+
+    # Server lifecycle
+
+    def start(self):
+        handler = type('StandInHandler', (_Handler,), {'standin': self})
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def host(self):
+        return f'127.0.0.1:{self._server.server_address[1]}'
+
+    @property
+    def url(self):
+        return f'http://{self.host}'
+
+    def client(self, **kwargs):
+        """
+        :return: CEDAElasticsearchClient connected to the stand-in
+        """
+        from ceda_elasticsearch_tools.elasticsearch import CEDAElasticsearchClient
+
+        kwargs.setdefault('max_retries', 0)
+        return CEDAElasticsearchClient(hosts=[self.host], use_ssl=False, ca_certs=None, **kwargs)
+
+    # Data helpers
+
+    def index_docs(self, index, docs):
+        """
+        Load documents directly. docs is a dict of _id to source.
+        """
+        with self._lock:
+            self.indices.setdefault(index, {}).update(docs)
+
+    def _index(self, name, create=False):
+        if name not in self.indices:
+            if not create:
+                raise StandInError(404, 'index_not_found_exception', f'no such index [{name}]')
+            self.indices[name] = {}
+        return self.indices[name]
+
+    def _reject(self):
+        if self.reject_rate and self.random.random() < self.reject_rate:
+            self.rejected += 1
+            return True
+        return False
+
+    # Request dispatch
+
+    def handle(self, method, path, params, body):
+        """
+        :return: status, response body (dict or None for HEAD)
+        """
+        parts = [p for p in path.split('/') if p]
+        endpoint = next((p for p in parts if p.startswith('_')), 'index' if parts else 'info')
+        self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+        latency = self.latency() if callable(self.latency) else self.latency
+        if latency:
+            time.sleep(latency)
+
+        if self.error_rate and self.random.random() < self.error_rate:
+            return StandInError(self.error_status, 'internal_server_error', 'Injected failure').as_response()
+
+        with self._lock:
+            try:
+                return self._route(method, parts, params, body)
+            except StandInError as exc:
+                return exc.as_response()
+            except Exception as exc:
+                return StandInError(500, 'exception', repr(exc)).as_response()
+
+    def _route(self, method, parts, params, body):
+        if not parts:
+            return 200, {'name': 'standin', 'cluster_name': 'standin', 'version': {'number': '8.15.0'},
+                         'tagline': 'You Know, for Search'}
+
+        first = parts[0]
+        rest = parts[1:]
+
+        if first == '_bulk':
+            return self.bulk(None, body)
+        if first == '_msearch':
+            return self.msearch(None, body, params)
+        if first == '_mget':
+            return self.mget(None, body, params)
+        if first == '_search' and rest == ['scroll']:
+            if method == 'DELETE':
+                return 200, {'succeeded': True, 'num_freed': 1}
+            return self.scroll(body or params)
+        if first == '_search':
+            return self.search(None, body or {}, params)
+        if first == '_pit':
+            self.pits.pop((body or {}).get('id'), None)
+            return 200, {'succeeded': True, 'num_freed': 1}
+        if first == '_nodes':
+            return 200, {'nodes': {'standin': {'thread_pool': {'write': {'queue': 0, 'rejected': self.rejected}}}}}
+        if first == '_refresh' or rest[:1] == ['_refresh']:
+            return 200, {'_shards': SHARDS}
+
+        index = first
+
+        if not rest:
+            if method == 'HEAD':
+                return (200 if index in self.indices else 404), None
+            if method == 'PUT':
+                if index in self.indices:
+                    raise StandInError(400, 'resource_already_exists_exception', f'index [{index}] already exists')
+                self.indices[index] = {}
+                return 200, {'acknowledged': True, 'index': index}
+            if method == 'DELETE':
+                self._index(index)
+                del self.indices[index]
+                return 200, {'acknowledged': True}
+            return 200, {index: {'mappings': {}, 'settings': {}}}
+
+        action = rest[0]
+
+        if action == '_bulk':
+            return self.bulk(index, body)
+        if action == '_msearch':
+            return self.msearch(index, body, params)
+        if action == '_mget':
+            return self.mget(index, body, params)
+        if action == '_search':
+            return self.search(index, body or {}, params)
+        if action == '_count':
+            docs = self._index(index)
+            query = (body or {}).get('query')
+            return 200, {'count': sum(1 for i, s in docs.items() if matches(query, i, s))}
+        if action == '_pit':
+            pit_id = uuid.uuid4().hex
+            self.pits[pit_id] = (index, dict(self._index(index)))
+            return 200, {'id': pit_id}
+        if action == '_update_by_query':
+            return self.update_by_query(index, body or {})
+        if action == '_delete_by_query':
+            return self.delete_by_query(index, body or {})
+        if action in ('_doc', '_create') and method in ('PUT', 'POST'):
+            doc_id = rest[1] if len(rest) > 1 else uuid.uuid4().hex
+            return self._write(index, 'index', doc_id, body)
+        if action == '_doc' and method == 'GET':
+            return self.get(index, rest[1])
+        if action == '_doc' and method == 'HEAD':
+            return (200 if rest[1] in self.indices.get(index, {}) else 404), None
+        if action == '_doc' and method == 'DELETE':
+            return self._write(index, 'delete', rest[1], None)
+        if action == '_update':
+            return self._write(index, 'update', rest[1], body)
+
+        raise StandInError(400, 'illegal_argument_exception', f'{method} /{"/".join(parts)} is not supported')
+
+    # Document APIs
+
+    def _write(self, index, action, doc_id, source):
+        docs = self._index(index, create=action != 'delete')
+        status = 200
+        result = 'updated'
+
+        if action in ('index', 'create'):
+            if doc_id not in docs:
+                status, result = 201, 'created'
+            elif action == 'create':
+                raise StandInError(409, 'version_conflict_engine_exception', f'[{doc_id}]: document already exists')
+            docs[doc_id] = source
+
+        elif action == 'update':
+            if doc_id in docs:
+                deep_update(docs[doc_id], source.get('doc', {}))
+                if 'script' in source:
+                    apply_script(docs[doc_id], source['script'])
+            elif source.get('doc_as_upsert'):
+                docs[doc_id] = source.get('doc', {})
+                status, result = 201, 'created'
+            elif 'upsert' in source:
+                docs[doc_id] = source['upsert']
+                status, result = 201, 'created'
+            else:
+                raise StandInError(404, 'document_missing_exception', f'[{doc_id}]: document missing')
+
+        elif action == 'delete':
+            if doc_id in docs:
+                del docs[doc_id]
+                result = 'deleted'
+            else:
+                status, result = 404, 'not_found'
+
+        return status, {'_index': index, '_id': doc_id, 'result': result, '_version': 1}
+
+    def get(self, index, doc_id):
+        docs = self._index(index)
+        if doc_id not in docs:
+            return 404, {'_index': index, '_id': doc_id, 'found': False}
+        return 200, {'_index': index, '_id': doc_id, 'found': True, '_source': docs[doc_id]}
+
+    def bulk(self, default_index, lines):
+        start = time.perf_counter()
+        lines = iter(lines)
+        items = []
+        errors = False
+
+        for header in lines:
+            (action, meta), = header.items()
+            source = next(lines) if action != 'delete' else None
+            index = meta.get('_index', default_index)
+            doc_id = meta.get('_id') or uuid.uuid4().hex
+
+            if self._reject():
+                status, result = 429, {
+                    '_index': index, '_id': doc_id, 'error': {
+                        'type': 'es_rejected_execution_exception',
+                        'reason': 'rejected execution of coordinating operation'
+                    }
+                }
+            else:
+                try:
+                    status, result = self._write(index, action, doc_id, source)
+                except StandInError as exc:
+                    status, result = exc.status, {
+                        '_index': index, '_id': doc_id, 'error': {'type': exc.error_type, 'reason': exc.reason}
+                    }
+
+            result['status'] = status
+            # As in elasticsearch, deleting a missing document is not an error
+            errors = errors or (status >= 300 and result.get('result') != 'not_found')
+            items.append({action: result})
+
+        took = int((time.perf_counter() - start) * 1000)
+        return 200, {'took': took, 'errors': errors, 'items': items}
+
+    def mget(self, default_index, body, params):
+        source_filter = params.get('_source')
+        source_includes = params.get('_source_includes')
+        if 'ids' in body:
+            requests = [{'_index': default_index, '_id': doc_id} for doc_id in body['ids']]
+        else:
+            requests = body['docs']
+
+        docs = []
+        for request in requests:
+            index = request.get('_index', default_index)
+            status, doc = self.get(index, request['_id'])
+            if 'error' in doc:
+                doc = {'_index': index, '_id': request['_id'], 'error': doc['error']}
+            elif doc['found'] and source_filter == 'false':
+                del doc['_source']
+            elif doc['found'] and '_source' in request:
+                doc['_source'] = filter_source(doc['_source'], request['_source'])
+            elif doc['found'] and source_includes:
+                doc['_source'] = filter_source(doc['_source'], source_includes.split(','))
+            docs.append(doc)
+
+        return 200, {'docs': docs}
+
+    # Search APIs
+
+    def _matching(self, docs, query):
+        return [(doc_id, source) for doc_id, source in docs.items() if matches(query, doc_id, source)]
+
+    def search(self, index, body, params):
+        start = time.perf_counter()
+        pit = body.get('pit')
+
+        if pit:
+            if pit['id'] not in self.pits:
+                raise StandInError(404, 'search_context_missing_exception', 'No search context found')
+            index, docs = self.pits[pit['id']]
+            tiebreak = True
+        else:
+            docs = {}
+            for name in (index or '_all').split(','):
+                if name == '_all':
+                    for index_docs in self.indices.values():
+                        docs.update(index_docs)
+                else:
+                    docs.update(self._index(name))
+            tiebreak = False
+
+        # Index order, used for _doc and the implicit _shard_doc tie breaker of PIT searches
+        position = {doc_id: i for i, doc_id in enumerate(docs)}
+
+        hits = self._matching(docs, body.get('query'))
+
+        if 'slice' in body:
+            slice_id, slice_max = body['slice']['id'], body['slice']['max']
+            hits = [(i, s) for i, s in hits if zlib.crc32(i.encode()) % slice_max == slice_id]
+
+        sort_fields, orders = [], []
+        for sort in _values(body.get('sort', [])):
+            if isinstance(sort, str):
+                field, order = sort, 'desc' if sort == '_score' else 'asc'
+            else:
+                (field, order), = sort.items()
+                order = order.get('order', 'asc') if isinstance(order, dict) else order
+            sort_fields.append(field)
+            orders.append(order)
+
+        def sort_values(doc_id, source):
+            special = {'_id': doc_id, '_score': 1.0, '_doc': position[doc_id]}
+            values = [special[f] if f in special else get_field(source, f) for f in sort_fields]
+            if tiebreak:
+                values.append(position[doc_id])
+            return values
+
+        all_orders = orders + (['asc'] if tiebreak else [])
+
+        if all_orders:
+            keyed = [(sort_values(i, s), i, s) for i, s in hits]
+            keyed.sort(key=functools.cmp_to_key(lambda a, b: _compare(a[0], b[0], all_orders)))
+
+            if 'search_after' in body:
+                after = body['search_after']
+                keyed = [k for k in keyed if _compare(k[0], after, all_orders) > 0]
+        else:
+            keyed = [(None, i, s) for i, s in hits]
+
+        total = len(keyed)
+        size = body.get('size', params.get('size', 10))
+        offset = body.get('from', 0)
+        page = keyed[offset:offset + int(size)]
+
+        source_filter = body.get('_source', body.get('source', True))
+
+        def render(values, doc_id, source):
+            hit = {'_index': index, '_id': doc_id, '_score': None if all_orders else 1.0}
+            if source_filter is not False:
+                hit['_source'] = filter_source(source, source_filter)
+            if values is not None:
+                hit['sort'] = values
+            return hit
+
+        response = {
+            'took': int((time.perf_counter() - start) * 1000),
+            'timed_out': False,
+            '_shards': SHARDS,
+            'hits': {'hits': [render(*k) for k in page]},
+        }
+
+        if body.get('track_total_hits', True) is not False:
+            if params.get('rest_total_hits_as_int') == 'true':
+                response['hits']['total'] = total
+            else:
+                response['hits']['total'] = {'value': total, 'relation': 'eq'}
+
+        if pit:
+            response['pit_id'] = pit['id']
+
+        if 'aggs' in body or 'aggregations' in body:
+            response['aggregations'] = self._aggregate(body.get('aggs', body.get('aggregations')), keyed)
+
+        if 'scroll' in params:
+            scroll_id = uuid.uuid4().hex
+            self.scrolls[scroll_id] = ([render(*k) for k in keyed], int(size), int(size))
+            response['_scroll_id'] = scroll_id
+
+        return 200, response
+
+    def _aggregate(self, aggs, keyed):
+        output = {}
+        for name, agg in aggs.items():
+            (kind, body), = ((k, v) for k, v in agg.items() if k != 'aggs')
+            values = [v for _, _, s in keyed for v in _values(get_field(s, body['field'])) if v is not None]
+
+            if kind == 'value_count':
+                output[name] = {'value': len(values)}
+            elif kind == 'terms':
+                counts = {}
+                for value in values:
+                    counts[value] = counts.get(value, 0) + 1
+                buckets = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:body.get('size', 10)]
+                output[name] = {'buckets': [{'key': k, 'doc_count': c} for k, c in buckets]}
+            else:
+                raise StandInError(400, 'parsing_exception', f'Aggregation [{kind}] is not supported by the stand-in')
+        return output
+
+    def scroll(self, body):
+        scroll_id = body.get('scroll_id')
+        if isinstance(scroll_id, list):
+            scroll_id = scroll_id[0]
+        if scroll_id not in self.scrolls:
+            raise StandInError(404, 'search_context_missing_exception', 'No search context found')
+
+        hits, position, size = self.scrolls[scroll_id]
+        self.scrolls[scroll_id] = (hits, position + size, size)
+
+        return 200, {
+            '_scroll_id': scroll_id,
+            'took': 0,
+            'timed_out': False,
+            '_shards': SHARDS,
+            'hits': {'total': {'value': len(hits), 'relation': 'eq'}, 'hits': hits[position:position + size]},
+        }
+
+    def msearch(self, default_index, lines, params):
+        responses = []
+        lines = iter(lines)
+
+        for header, body in zip(lines, lines):
+            index = header.get('index', default_index)
+            if isinstance(index, list):
+                index = ','.join(index)
+            status, response = self.search(index, body, params)
+            response['status'] = status
+            responses.append(response)
+
+        return 200, {'took': sum(r.get('took', 0) for r in responses), 'responses': responses}
+
+    def update_by_query(self, index, body):
+        start = time.perf_counter()
+        hits = self._matching(self._index(index), body.get('query'))
+        for _, source in hits:
+            if 'script' in body:
+                apply_script(source, body['script'])
+        return 200, {'took': int((time.perf_counter() - start) * 1000), 'total': len(hits),
+                     'updated': len(hits), 'failures': []}
+
+    def delete_by_query(self, index, body):
+        start = time.perf_counter()
+        docs = self._index(index)
+        hits = self._matching(docs, body.get('query'))
+        for doc_id, _ in hits:
+            del docs[doc_id]
+        return 200, {'took': int((time.perf_counter() - start) * 1000), 'total': len(hits),
+                     'deleted': len(hits), 'failures': []}
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    standin = None
+    protocol_version = 'HTTP/1.1'
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return None
+
+        data = self.rfile.read(length).decode('utf-8')
+
+        if 'ndjson' in self.headers.get('Content-Type', ''):
+            return [json.loads(line) for line in data.splitlines() if line.strip()]
+
+        return json.loads(data)
+
+    def _dispatch(self):
+        url = urlsplit(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+        try:
+            body = self._read_body()
+        except ValueError as exc:
+            status, response = StandInError(400, 'parse_exception', str(exc)).as_response()
+        else:
+            status, response = self.standin.handle(self.command, url.path, params, body)
+
+        data = b'' if response is None else json.dumps(response).encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('X-Elastic-Product', 'Elasticsearch')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+
+        if self.command != 'HEAD':
+            self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = _dispatch
+
+    def log_message(self, *args):
+        pass
@@ -0,0 +1,43 @@
+from ceda_elasticsearch_tools.core.backlog import FileExistenceChecker, backlog_logs, process_backlog, path_id
+from ceda_elasticsearch_tools.core.log_reader import DepositLog
+
+
+def _write_log(path, files):
+    with open(path, 'w') as writer:
+        for i, file in enumerate(files):
+            writer.write(f'2017-08-20 03:05:{i % 60:02d}:{file}:DEPOSIT:{i}: (force=None) /arrivals/{i}\n')
+
+
+class TestBacklog:
+
+    def test_process_backlog(self, tmp_path, es_standin):
+        for day in range(3):
+            _write_log(tmp_path / f'deposit_ingest1.2017-08-2{day}', [f'/badc/{day}/file{i}.nc' for i in range(25)])
+
+        # Every other file has been indexed
+        es_standin.index_docs('ceda-fbi', {
+            path_id(f'/badc/{day}/file{i}.nc'): {} for day in range(3) for i in range(0, 25, 2)
+        })
+
+        checker = FileExistenceChecker(es_standin.client(), 'ceda-fbi', batch_size=10)
+        reports = list(process_backlog(backlog_logs(str(tmp_path)), checker, processes=2))
+
+        assert [report.log for report in reports] == [
+            'deposit_ingest1.2017-08-22', 'deposit_ingest1.2017-08-21', 'deposit_ingest1.2017-08-20'
+        ]
+        assert [report.deposits for report in reports] == [25, 25, 25]
+        assert reports[0].missing == [f'/badc/2/file{i}.nc' for i in range(1, 25, 2)]
+        assert es_standin.requests['_mget'] == 9
+
+    def test_es_deposits_diff(self, tmp_path, es_standin):
+        _write_log(tmp_path / 'deposit_ingest1.2017-08-20', ['/badc/a.nc', '/badc/b.nc'])
+        es_standin.index_docs('ceda-fbi', {path_id('/badc/a.nc'): {}})
+
+        class Log(DepositLog):
+            log_dir = str(tmp_path)
+
+        log = Log(log_filename='deposit_ingest1.2017-08-20')
+
+        assert log.es_deposits_diff(es=es_standin.client(), processes=1) == {
+            'deposit_ingest1.2017-08-20': ['/badc/b.nc']
+        }
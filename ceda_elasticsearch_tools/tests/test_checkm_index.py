@@ -0,0 +1,76 @@
+import os
+
+from ceda_elasticsearch_tools.core.checkm_index import CheckmIndex
+from ceda_elasticsearch_tools.core.log_reader import MD5LogFile
+
+CHECKM_LOG = """\
+# checkm log
+data/a.nc|md5|69b829decea5563e33b0856ec80a0c83|806321|2010-04-29T11:10:13Z
+data/b.nc|md5|00000000000000000000000000000001|10|2010-04-29T11:10:13Z
+data/c.nc|sha1|da39a3ee5e6b4b0d3255bfef95601890afd80709|10|2010-04-29T11:10:13Z
+data/b.nc|md5|d41d8cd98f00b204e9800998ecf8427e|0|2010-04-30T11:10:13Z
+"""
+
+
+def _write_log(tmp_path):
+    spot_dir = tmp_path / 'checkm' / 'spot-1-test'
+    spot_dir.mkdir(parents=True)
+    log_path = spot_dir / 'checkm.spot-1-test.20170820'
+    log_path.write_text(CHECKM_LOG)
+    return str(log_path)
+
+
+class TestCheckmIndex:
+
+    def test_lookup(self, tmp_path):
+        log_path = _write_log(tmp_path)
+        index_dir = str(tmp_path / 'index')
+
+        with CheckmIndex.open(log_path, '/badc/test', index_dir) as index:
+            assert len(index) == 2
+            assert index.get('/badc/test/data/a.nc') == '69b829decea5563e33b0856ec80a0c83'
+            assert index['/badc/test/data/b.nc'] == 'd41d8cd98f00b204e9800998ecf8427e'
+            assert '/badc/test/data/c.nc' not in index
+            assert index.get('/badc/other/data/a.nc', '') == ''
+            assert list(index) == ['/badc/test/data/a.nc', '/badc/test/data/b.nc']
+
+        assert os.path.exists(CheckmIndex.index_path(log_path, index_dir))
+
+    def test_rebuilt_when_log_changes(self, tmp_path):
+        log_path = _write_log(tmp_path)
+        index_dir = str(tmp_path / 'index')
+        index_path = CheckmIndex.index_path(log_path, index_dir)
+
+        CheckmIndex.open(log_path, index_dir=index_dir).close()
+        assert CheckmIndex.is_current(index_path, log_path)
+
+        with open(log_path, 'a') as writer:
+            writer.write('data/d.nc|md5|69b829decea5563e33b0856ec80a0c83|1|2010-05-01T11:10:13Z\n')
+        assert not CheckmIndex.is_current(index_path, log_path)
+
+        with CheckmIndex.open(log_path, index_dir=index_dir) as index:
+            assert len(index) == 3
+            assert 'data/d.nc' in index
+
+    def test_unwritable_index_dir(self, tmp_path):
+        log_path = _write_log(tmp_path)
+        blocker = tmp_path / 'blocker'
+        blocker.write_text('')
+
+        index = CheckmIndex.open(log_path, '/badc/test', str(blocker))
+        assert index.get('/badc/test/data/a.nc') == '69b829decea5563e33b0856ec80a0c83'
+
+    def test_md5_log_file(self, tmp_path):
+        _write_log(tmp_path)
+
+        class LogFile(MD5LogFile):
+            log_dir = str(tmp_path / 'checkm')
+
+        with LogFile('spot-1-test', '/badc/test', indexed=True, index_dir=str(tmp_path / 'index')) as indexed:
+            assert len(indexed) == 2
+            assert list(indexed) == ['/badc/test/data/a.nc', '/badc/test/data/b.nc']
+            assert indexed.get_md5('/badc/test/data/b.nc') == LogFile('spot-1-test', '/badc/test').get_md5('/badc/test/data/b.nc')
+            assert indexed.get_md5('/badc/test/data/missing.nc') == ''
+
+        # The index is unmapped when the log file is closed
+        assert indexed.md5s._buffer.closed
@@ -0,0 +1,117 @@
+import hashlib
+import os
+import sqlite3
+
+import pytest
+
+from ceda_elasticsearch_tools.core.checksum_cache import ChecksumCache, merge_caches
+from ceda_elasticsearch_tools.core.hashing import FileHasher
+
+
+class TestChecksumCache:
+
+    def test_get_put(self, tmp_path):
+        path = tmp_path / 'a.bin'
+        path.write_bytes(b'content')
+        stat = os.stat(path)
+
+        with ChecksumCache(str(tmp_path / 'cache' / 'checksums.sqlite')) as cache:
+            assert cache.get(str(path), stat, ['md5']) is None
+
+            cache.put(str(path), stat, {'md5': 'a' * 32, 'sha256': 'b' * 64})
+            assert cache.get(str(path), stat, ['md5']) == {'md5': 'a' * 32}
+            assert cache.get(str(path), stat, ['md5', 'sha1']) is None
+
+            path.write_bytes(b'changed')
+            assert cache.get(str(path), os.stat(path), ['md5']) is None
+
+            assert cache.stats() == {'hits': 1, 'misses': 3, 'hit_rate': 0.25}
+
+        # Persisted
+        with ChecksumCache(str(tmp_path / 'cache' / 'checksums.sqlite')) as cache:
+            assert len(cache) == 1
+            assert cache.get(str(path), stat, ['sha256']) == {'sha256': 'b' * 64}
+
+    def test_file_hasher(self, tmp_path):
+        paths = []
+        for i in range(4):
+            path = tmp_path / f'{i}.bin'
+            path.write_bytes(os.urandom(1000 + i))
+            paths.append(str(path))
+        expected = {path: {'md5': hashlib.md5(open(path, 'rb').read()).hexdigest()} for path in paths}
+
+        with ChecksumCache(str(tmp_path / 'checksums.sqlite')) as cache:
+            assert FileHasher(workers=2, cache=cache).hash_many(paths) == expected
+
+            # Unchanged files come from the cache, the rewritten one is hashed again
+            with open(paths[0], 'wb') as writer:
+                writer.write(b'new content')
+            expected[paths[0]] = {'md5': hashlib.md5(b'new content').hexdigest()}
+
+            hasher = FileHasher(workers=2, cache=cache)
+            results = list(hasher.hash_files(paths + [str(tmp_path / 'missing.bin')]))
+
+            assert {result.path: result.digests for result in results[:4]} == expected
+            assert [result.cached for result in results] == [False, True, True, True, False]
+            assert hasher.bytes == len(b'new content')
+            assert (cache.hits, cache.misses) == (3, 5)
+            assert 'cache hits: 3' in str(hasher)
+
+    def test_locked(self, tmp_path):
+        path = tmp_path / 'a.bin'
+        path.write_bytes(b'content')
+        database = str(tmp_path / 'checksums.sqlite')
+
+        with ChecksumCache(database) as cache, ChecksumCache(database, timeout=0.1) as other:
+            # Each put is committed, so the other process sees it and is never left waiting
+            cache.put(str(path), os.stat(path), {'md5': 'a' * 32})
+            assert other.get(str(path), os.stat(path), ['md5']) == {'md5': 'a' * 32}
+
+            # Another process holding the write lock does not stop the hashing
+            other_path = tmp_path / 'b.bin'
+            other_path.write_bytes(b'other')
+            lock = sqlite3.connect(database, isolation_level=None)
+            lock.execute('BEGIN EXCLUSIVE')
+
+            hasher = FileHasher(cache=other)
+            results = list(hasher.hash_files([str(other_path), str(path)]))
+
+            lock.execute('ROLLBACK')
+            lock.close()
+
+        assert results[0].md5 == hashlib.md5(b'other').hexdigest()
+        assert results[1].cached
+        assert hasher.cache is None
+
+    def test_rerun_with_new_pages(self, tmp_path):
+        paths = []
+        for i in range(4):
+            path = tmp_path / f'{i}.bin'
+            path.write_bytes(os.urandom(1000 + i))
+            paths.append(str(path))
+        cache_dir = tmp_path / 'cache'
+
+        # First run, two jobs each write the cache of their page
+        for page, page_paths in (('md5_update_page_1.txt', paths[:2]), ('md5_update_page_2.txt', paths[2:])):
+            with ChecksumCache(str(cache_dir / f'{page}.sqlite')) as cache:
+                FileHasher(workers=2, cache=cache).hash_many(page_paths)
+
+        # The rerun regenerates the pages with other files on each. The earlier caches are merged first.
+        shared = merge_caches(str(cache_dir))
+        assert sorted(os.listdir(cache_dir)) == ['checksums.sqlite']
+
+        with ChecksumCache(str(cache_dir / 'md5_update_page_1.txt.sqlite'), read_only=[shared]) as cache:
+            hasher = FileHasher(workers=2, cache=cache)
+            results = list(hasher.hash_files(paths[1:3]))
+
+            assert [result.cached for result in results] == [True, True]
+            assert hasher.bytes == 0
+            assert len(cache) == 0
+
+            # The shared cache cannot be written by the jobs
+            with pytest.raises(sqlite3.OperationalError):
+                cache._connection.execute('DELETE FROM read_only_1.checksums')
+
+        # A third run merges the rerun's cache too
+        with ChecksumCache(merge_caches(str(cache_dir))) as merged:
+            assert len(merged) == 4
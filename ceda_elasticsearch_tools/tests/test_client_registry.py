@@ -0,0 +1,30 @@
+from ceda_elasticsearch_tools.elasticsearch import get_client, close_clients
+from ceda_elasticsearch_tools.index_tools import CedaFbi, CedaDirs
+from ceda_elasticsearch_tools.core.updater import ElasticsearchUpdater
+
+
+class TestClientRegistry:
+
+    def teardown_method(self):
+        close_clients()
+
+    def test_same_settings_share_client(self):
+        assert get_client() is get_client()
+        assert get_client(headers={'x-api-key': 'a'}) is get_client(headers={'x-api-key': 'a'})
+        assert get_client(headers={'x-api-key': 'a'}) is not get_client(headers={'x-api-key': 'b'})
+
+    def test_updaters_share_client(self):
+        fbi = CedaFbi()
+        dirs = CedaDirs()
+        updater = ElasticsearchUpdater('ceda-fbi', None, None)
+
+        assert fbi.es is dirs.es is updater.es
+        assert CedaFbi(shared_client=False).es is not fbi.es
+
+    def test_pool_settings(self):
+        client = get_client(pool_size=32, keep_alive=60)
+
+        assert client is get_client(pool_size=32, keep_alive=60)
+        for node in client.transport.node_pool.all():
+            assert node.config.connections_per_node == 32
+            assert node.pool.conn_kw['socket_options']
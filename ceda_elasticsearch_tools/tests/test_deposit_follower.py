@@ -0,0 +1,60 @@
+from ceda_elasticsearch_tools.core.deposit_follower import DepositLogFollower
+
+
+def _line(i, action='DEPOSIT'):
+    return f'2017-08-20 03:05:{i % 60:02d}:/badc/data/file{i}.nc:{action}:{i}: (force=None) /arrivals/file{i}.nc\n'
+
+
+def _append(path, text):
+    with open(path, 'a') as writer:
+        writer.write(text)
+
+
+class TestDepositLogFollower:
+
+    def test_reads_only_new_complete_lines(self, tmp_path):
+        log = tmp_path / 'deposit_ingest1.2017-08-20'
+        _append(log, _line(1) + _line(2))
+
+        follower = DepositLogFollower(str(tmp_path / 'state.json'), log_dir=str(tmp_path))
+        assert [e.path for e in follower.poll()] == ['/badc/data/file1.nc', '/badc/data/file2.nc']
+        assert follower.poll() == []
+
+        # A partly written line is left until it is complete
+        partial = _line(3)
+        _append(log, partial[:30])
+        assert follower.poll() == []
+
+        _append(log, partial[30:])
+        assert [e.path for e in follower.poll()] == ['/badc/data/file3.nc']
+
+    def test_rotation_and_restart(self, tmp_path):
+        state = str(tmp_path / 'state.json')
+        old_log = tmp_path / 'deposit_ingest1.2017-08-20'
+        _append(old_log, _line(1))
+
+        follower = DepositLogFollower(state, log_dir=str(tmp_path))
+        follower.poll()
+
+        # Lines written to the old log before rotation are read before the new log
+        _append(old_log, _line(2))
+        _append(tmp_path / 'deposit_ingest1.2017-08-21', _line(3) + _line(4, 'REMOVE'))
+
+        assert [e.path for e in follower.poll(limit=2)] == ['/badc/data/file2.nc', '/badc/data/file3.nc']
+
+        # A new process carries on from the saved position
+        restarted = DepositLogFollower(state, log_dir=str(tmp_path), actions={'REMOVE'})
+        assert [e.path for e in restarted.poll()] == ['/badc/data/file4.nc']
+        assert restarted.filename == 'deposit_ingest1.2017-08-21'
+
+    def test_replaced_log(self, tmp_path):
+        log = tmp_path / 'deposit_ingest1.2017-08-20'
+        _append(log, _line(1) + _line(2))
+
+        follower = DepositLogFollower(log_dir=str(tmp_path), start='end')
+        assert follower.poll() == []
+
+        log.unlink()
+        _append(log, _line(5))
+
+        assert [e.path for e in follower.poll()] == ['/badc/data/file5.nc']
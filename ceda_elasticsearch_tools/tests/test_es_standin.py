@@ -0,0 +1,74 @@
+from ceda_elasticsearch_tools.core.index_diff import IndexDiff, ADDED, REMOVED, CHANGED
+from ceda_elasticsearch_tools.elasticsearch import BulkRateLimiter, ThreadPoolFeedback
+from ceda_elasticsearch_tools.index_tools.base import IndexUpdaterBase
+from ceda_elasticsearch_tools.tests.es_standin import ElasticsearchStandIn
+
+
+def _updater(standin, index='ceda-test'):
+    return IndexUpdaterBase(index, shared_client=False, hosts=[standin.host], use_ssl=False, ca_certs=None)
+
+
+class TestElasticsearchStandIn:
+
+    def test_bulk_and_msearch(self, es_standin):
+        updater = _updater(es_standin)
+        content = [{'id': str(i), 'document': {'path': f'/badc/file{i}', 'size': i}} for i in range(1000)]
+
+        report = updater._bulk_action(updater._generate_bulk_operation_body(content))
+
+        assert report == {'success': 1000, 'failed': 0, 'failed_items': []}
+        assert updater.es.count(index='ceda-test')['count'] == 1000
+
+        queries = [{'id': None, 'query': {'query': {'term': {'path': f'/badc/file{i}'}}}} for i in (1, 2, 5000)]
+        results = updater._bulk_action(updater._generate_bulk_operation_body(queries, action='search'), api='msearch')
+
+        assert [len(hits) for hits in results[0]] == [1, 1, 0]
+
+    def test_update_and_delete_by_query(self, es_standin):
+        es = es_standin.client()
+        es_standin.index_docs('ceda-dirs', {'a': {'path': '/badc/a'}, 'b': {'path': '/neodc/b'}})
+
+        es.update_by_query(index='ceda-dirs', query={'prefix': {'path': '/badc'}},
+                           script={'source': "ctx._source.title = 'BADC'"})
+        assert es.get(index='ceda-dirs', id='a')['_source']['title'] == 'BADC'
+        assert 'title' not in es.get(index='ceda-dirs', id='b')['_source']
+
+        es.delete_by_query(index='ceda-dirs', query={'term': {'path': '/badc/a'}})
+        assert es.count(index='ceda-dirs')['count'] == 1
+
+    def test_scroll(self, es_standin):
+        es_standin.index_docs('ceda-test', {str(i): {'n': i} for i in range(25)})
+        updater = _updater(es_standin)
+
+        hits = list(updater._scroll_search({'query': {'match_all': {}}}, size=10))
+
+        assert sorted(int(hit['_id']) for hit in hits) == list(range(25))
+
+    def test_index_diff_with_pit_and_slices(self, es_standin):
+        es_standin.index_docs('old', {f'{i:04d}': {'n': i} for i in range(300)})
+        es_standin.index_docs('new', {f'{i:04d}': {'n': i if i != 150 else -1} for i in range(10, 310)})
+
+        diff = IndexDiff(es_standin.client(), 'old', 'new', slices=3, size=40)
+        results = list(diff)
+
+        assert diff.counts == {ADDED: 10, REMOVED: 10, CHANGED: 1}
+        assert (CHANGED, '0150') in results
+        assert not es_standin.pits
+
+    def test_rejections(self):
+        with ElasticsearchStandIn(reject_rate=1.0) as standin:
+            updater = _updater(standin)
+            content = [{'id': str(i), 'document': {'n': i}} for i in range(10)]
+
+            report = updater._bulk_action(updater._generate_bulk_operation_body(content))
+
+            assert report['failed'] == 10
+            assert report['failed_items'][0]['status'] == 429
+
+            limiter = BulkRateLimiter(docs_per_second=1000)
+            feedback = ThreadPoolFeedback(updater.es)
+            feedback.poll(limiter)
+            updater._bulk_action(updater._generate_bulk_operation_body(content))
+            feedback.poll(limiter)
+
+            assert limiter.factor == 0.5
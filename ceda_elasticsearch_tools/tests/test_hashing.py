@@ -0,0 +1,75 @@
+import hashlib
+import os
+import time
+
+import pytest
+
+from ceda_elasticsearch_tools.core.hashing import FileHasher, file_md5, hash_file, hash_file_digests
+
+
+@pytest.fixture
+def files(tmp_path):
+    paths = []
+    for i, size in enumerate([0, 1, 4096, 1024 * 1024 + 7]):
+        path = tmp_path / f'{i}.bin'
+        path.write_bytes(os.urandom(size))
+        paths.append(str(path))
+    return paths
+
+
+def _md5(path, algorithm='md5'):
+    with open(path, 'rb') as reader:
+        return hashlib.new(algorithm, reader.read()).hexdigest()
+
+
+class TestHashFile:
+
+    @pytest.mark.parametrize('use_mmap', [False, True])
+    def test_hash_file(self, files, use_mmap):
+        for path in files:
+            assert hash_file(path, buffer_size=1000, use_mmap=use_mmap) == (_md5(path), os.path.getsize(path))
+            assert file_md5(path, use_mmap=use_mmap) == _md5(path)
+
+    @pytest.mark.parametrize('use_mmap', [False, True])
+    def test_digests(self, files, use_mmap):
+        for path in files:
+            digests, size = hash_file_digests(path, ('md5', 'sha256'), buffer_size=1000, use_mmap=use_mmap)
+
+            assert digests == {'md5': _md5(path), 'sha256': _md5(path, 'sha256')}
+            assert size == os.path.getsize(path)
+
+
+class TestFileHasher:
+
+    @pytest.mark.parametrize('processes', [False, True])
+    def test_hash_files(self, files, tmp_path, processes):
+        hasher = FileHasher(workers=2, processes=processes)
+        paths = files + [str(tmp_path / 'missing.bin')]
+
+        results = list(hasher.hash_files(iter(paths)))
+
+        assert [result.path for result in results] == paths
+        assert [result.md5 for result in results] == [_md5(path) for path in files] + [None]
+        assert results[-1].error
+        assert (hasher.files, hasher.errors) == (5, 1)
+        assert hasher.bytes == sum(os.path.getsize(path) for path in files)
+        assert hasher.throughput > 0
+
+    def test_seconds_exclude_consumer(self, files):
+        hasher = FileHasher(workers=2)
+
+        for _ in hasher.hash_files(files):
+            time.sleep(0.1)
+
+        assert 0 < hasher.seconds < 0.1
+
+    def test_hash_many(self, files):
+        hasher = FileHasher(use_mmap=True, algorithms=['sha256', 'md5'])
+
+        assert hasher.hash_many(files) == {path: {'md5': _md5(path), 'sha256': _md5(path, 'sha256')} for path in files}
+
+    def test_unknown_algorithm(self):
+        with pytest.raises(ValueError):
+            FileHasher(algorithms=['md5', 'not-a-digest'])
+        with pytest.raises(ValueError):
+            FileHasher(algorithms=['shake_128'])
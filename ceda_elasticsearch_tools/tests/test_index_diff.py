@@ -0,0 +1,81 @@
+from ceda_elasticsearch_tools.core.export import export_sorted, content_hash
+from ceda_elasticsearch_tools.core.index_diff import IndexDiff, merge_join, ADDED, REMOVED, CHANGED
+
+
+class FakePitClient:
+    """
+    Minimal stand in for the point in time and sliced search APIs.
+    """
+
+    def __init__(self, indices):
+        self.indices = indices
+        self.closed = []
+
+    def open_point_in_time(self, index, keep_alive):
+        return {'id': index}
+
+    def close_point_in_time(self, id):
+        self.closed.append(id)
+
+    def search(self, pit, sort, size, source, track_total_hits, slice=None, search_after=None, query=None):
+        (field, _), = sort[0].items()
+
+        # Sort on the key field, documents missing it last with a null sort value as elasticsearch does
+        docs = [(doc_id if field == '_id' else source_doc.get(field), doc_id, source_doc)
+                for doc_id, source_doc in self.indices[pit['id']].items()]
+        docs.sort(key=lambda doc: (doc[0] is None, doc[0] if doc[0] is not None else 0, doc[1]))
+
+        if slice:
+            docs = [doc for i, doc in enumerate(docs) if i % slice['max'] == slice['id']]
+
+        if search_after:
+            docs = docs[[doc[1] for doc in docs].index(search_after[1]) + 1:]
+
+        hits = [{'_id': doc_id, '_source': source_doc, 'sort': [key, doc_id]} for key, doc_id, source_doc in docs[:size]]
+        return {'pit_id': pit['id'], 'hits': {'hits': hits}}
+
+
+class TestIndexDiff:
+
+    def test_content_hash_ignores_key_order(self):
+        assert content_hash({'a': 1, 'b': {'c': 2, 'd': 3}}) == content_hash({'b': {'d': 3, 'c': 2}, 'a': 1})
+
+    def test_merge_join(self):
+        old = [('a', 'a', 1), ('b', 'b', 1), ('d', 'd', 1)]
+        new = [('b', 'b', 2), ('c', 'c', 1), ('d', 'd', 1), ('e', 'e', 1)]
+
+        assert list(merge_join(old, new)) == [
+            (REMOVED, 'a'),
+            (CHANGED, 'b'),
+            (ADDED, 'c'),
+            (ADDED, 'e'),
+        ]
+
+    def test_export_sorted_merges_slices(self):
+        docs = {f'{i:04d}': {'n': i} for i in range(250)}
+        es = FakePitClient({'old': docs})
+
+        hits = list(export_sorted(es, 'old', slices=3, size=7))
+
+        assert [hit['_id'] for hit in hits] == sorted(docs)
+        assert es.closed == ['old']
+
+    def test_export_sorted_numeric_key(self):
+        docs = {f'{i:04d}': {'n': i % 5} for i in range(20)}
+        docs.update({f'missing-{i}': {} for i in range(3)})
+        es = FakePitClient({'old': docs})
+
+        hits = list(export_sorted(es, 'old', key_field='n', slices=3, size=2))
+
+        assert [hit['sort'][0] for hit in hits] == sorted(doc['n'] for doc in docs.values() if 'n' in doc)
+
+    def test_index_diff(self):
+        old = {f'{i:04d}': {'n': i} for i in range(100)}
+        new = {f'{i:04d}': {'n': i} for i in range(5, 105)}
+        new['0050'] = {'n': -1}
+
+        diff = IndexDiff(FakePitClient({'old': old, 'new': new}), 'old', 'new', slices=2, size=10)
+        results = list(diff)
+
+        assert diff.counts == {ADDED: 5, REMOVED: 5, CHANGED: 1}
+        assert (CHANGED, '0050') in results
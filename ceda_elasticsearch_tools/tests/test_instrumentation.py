@@ -0,0 +1,59 @@
+import json
+
+from ceda_elasticsearch_tools.elasticsearch import Instrumentation
+from ceda_elasticsearch_tools.elasticsearch.instrumentation import Histogram, count_items
+
+
+class TestInstrumentation:
+
+    def test_histogram_buckets(self):
+        histogram = Histogram(buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+
+        assert histogram.cumulative() == [(0.1, 2), (1.0, 3), (float('inf'), 4)]
+        assert histogram.count == 4
+
+    def test_count_items(self):
+        bulk = {
+            'errors': True,
+            'items': [{'index': {'status': 201}}, {'update': {'status': 409}}, {'delete': {'status': 200}}]
+        }
+        msearch = {'responses': [{'hits': {'hits': []}}, {'error': {}}]}
+
+        assert count_items('bulk', bulk) == (3, 1)
+        assert count_items('msearch', msearch) == (2, 1)
+
+    def test_dump_formats(self, tmp_path):
+        metrics = Instrumentation()
+        metrics.record('bulk', 'ceda-fbi', 0.2, request_bytes=100, response_bytes=50, took=120, items=800, errors=2)
+        metrics.record('bulk', 'ceda-fbi', 0.3, request_bytes=100, response_bytes=50, took=150, items=800)
+
+        json_path = tmp_path / 'metrics.json'
+        metrics.dump(str(json_path))
+        data = json.loads(json_path.read_text())
+
+        assert data[0]['calls'] == 2
+        assert data[0]['items'] == 1600
+        assert data[0]['errors'] == 2
+        assert data[0]['took_seconds']['count'] == 2
+
+        prom_path = tmp_path / 'metrics.prom'
+        metrics.dump(str(prom_path))
+        text = prom_path.read_text()
+
+        assert 'ceda_es_requests_total{api="bulk",index="ceda-fbi"} 2' in text
+        assert 'ceda_es_request_duration_seconds_bucket{api="bulk",index="ceda-fbi",le="+Inf"} 2' in text
+        assert 'ceda_es_request_bytes_total{api="bulk",index="ceda-fbi"} 200' in text
+
+    def test_client_hook(self, es_standin):
+        metrics = Instrumentation()
+        es = es_standin.client(instrumentation=metrics)
+
+        es.info()
+        es.options(request_timeout=5).info()
+
+        info = metrics.as_dict()[0]
+        assert info['api'] == 'info'
+        assert info['calls'] == 2
+        assert info['response_bytes'] > 0
@@ -0,0 +1,60 @@
+import os
+from datetime import datetime
+
+from ceda_elasticsearch_tools.core import log_catalogue
+from ceda_elasticsearch_tools.core.log_catalogue import LogCatalogue, log_timestamp
+from ceda_elasticsearch_tools.core.utils import get_latest_log
+
+LOGS = [
+    'deposit_ingest1.2017-08-09',
+    'deposit_ingest1.2017-08-10',
+    'deposit_ingest1.2017-08-9-bad',
+    'deposit_ingest2.2017-08-01',
+    'deposit_ingest10.2017-07-01',
+    'checkm.spot-1-test.20170820',
+    'checkm.spot-1-test.20170901',
+    'other.txt',
+]
+
+
+def _touch(directory, names):
+    for name in names:
+        (directory / name).write_text('')
+
+
+class TestLogCatalogue:
+
+    def test_log_timestamp(self):
+        assert log_timestamp('deposit_ingest1.2017-08-20') == datetime(2017, 8, 20)
+        assert log_timestamp('checkm.spot-12345678-test.20170820') == datetime(2017, 8, 20)
+        assert log_timestamp('log.2017-08-20T03:05:06') == datetime(2017, 8, 20, 3, 5, 6)
+        assert log_timestamp('other.txt') is None
+
+    def test_latest(self, tmp_path):
+        _touch(tmp_path, LOGS)
+        catalogue = LogCatalogue(str(tmp_path))
+
+        assert catalogue.logs('deposit_ingest1.') == {
+            'deposit_ingest1': ['deposit_ingest1.2017-08-9-bad', 'deposit_ingest1.2017-08-09', 'deposit_ingest1.2017-08-10']
+        }
+        assert catalogue.latest('deposit_ingest') == [
+            'deposit_ingest1.2017-08-10', 'deposit_ingest10.2017-07-01', 'deposit_ingest2.2017-08-01'
+        ]
+        assert catalogue.latest('deposit_ingest1.', rank=-2) == ['deposit_ingest1.2017-08-09']
+        assert catalogue.latest('deposit_ingest1.', rank=1) == ['deposit_ingest1.2017-08-9-bad']
+        assert catalogue.latest('checkm.', rank=-5) == ['checkm.spot-1-test.20170820']
+        assert catalogue.latest('missing') == []
+
+    def test_cache(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(log_catalogue, 'RACY_SECONDS', 0)
+        LogCatalogue.clear_cache()
+        _touch(tmp_path, LOGS)
+
+        # Date the directory in the past so the listing is trusted
+        os.utime(tmp_path, ns=(0, 10 ** 9))
+        catalogue = LogCatalogue.for_directory(str(tmp_path))
+        assert LogCatalogue.for_directory(str(tmp_path)) is catalogue
+
+        _touch(tmp_path, ['checkm.spot-1-test.20171001'])
+        assert get_latest_log(str(tmp_path), 'checkm.') == ['checkm.spot-1-test.20171001']
+        assert LogCatalogue.for_directory(str(tmp_path)) is not catalogue
@@ -0,0 +1,55 @@
+from datetime import datetime
+
+from ceda_elasticsearch_tools.core.log_reader import DepositLog, DepositEvent, DEPOSIT, REMOVE, MKDIR, RMDIR
+
+DEPOSIT_LOG = """\
+2017-08-20 03:05:03:/badc/msg/data/a.png:DEPOSIT:1388172: (force=None) /datacentre/arrivals/a.png
+2017-08-20 03:05:04:/badc/msg/data/00README:DEPOSIT:120: (force=None) /datacentre/arrivals/00README
+2017-08-20 03:05:05:/badc/msg/data/b.png:REMOVE:0:
+2017-08-20 03:05:06:/badc/msg/data/new:MKDIR:0: message: with colons
+2017-08-20 03:05:07:/badc/msg/data/old:RMDIR:0:
+2017-08-20 03:05:08:/badc/msg/data/link:SYMLINK:0:
+Traceback (most recent call last):
+2017-08-20 03:05:09:/badc/msg/data/c.png:UNKNOWN:0:
+2017-08-20 03:05:10:/badc/msg/data/truncated.png
+"""
+
+
+class TestDepositLog:
+
+    def test_parse(self, tmp_path):
+        path = tmp_path / 'deposit_ingest1.2017-08-20'
+        path.write_text(DEPOSIT_LOG)
+
+        log = DepositLog(log_filename=str(path))
+
+        assert log.deposit_list == ['/badc/msg/data/a.png', '/badc/msg/data/00README']
+        assert log.readme00_list == ['/badc/msg/data/00README']
+        assert log.deletion_list == ['/badc/msg/data/b.png']
+        assert log.mkdir_list == ['/badc/msg/data/new']
+        assert log.rmdir_list == ['/badc/msg/data/old']
+        assert log.symlink_list == ['/badc/msg/data/link']
+
+    def test_events(self, tmp_path):
+        path = tmp_path / 'deposit_ingest1.2017-08-20'
+        path.write_text(DEPOSIT_LOG)
+
+        events = list(DepositLog.events(str(path)))
+
+        assert len(events) == 7
+        assert events[0] == DepositEvent(datetime(2017, 8, 20, 3, 5, 3), '/badc/msg/data/a.png', DEPOSIT, 1388172)
+        assert events[3].action == MKDIR
+
+        removed = DepositLog.events(str(path), actions={REMOVE, RMDIR})
+        assert [event.path for event in removed] == ['/badc/msg/data/b.png', '/badc/msg/data/old']
+
+    def test_compact(self, tmp_path):
+        path = tmp_path / 'deposit_ingest1.2017-08-20'
+        path.write_text(DEPOSIT_LOG)
+
+        log = DepositLog(log_filename=str(path))
+        compact = DepositLog(log_filename=str(path), compact=True)
+
+        assert compact.deposit_list == log.deposit_list
+        assert compact.readme00_list == log.readme00_list
+        assert '/badc/msg/data/b.png' in compact.deletion_list
@@ -0,0 +1,83 @@
+from datetime import datetime
+
+from ceda_elasticsearch_tools.core.backlog import path_id
+from ceda_elasticsearch_tools.core.log_reader import DepositEvent, DEPOSIT, REMOVE, MKDIR, RMDIR, SYMLINK
+from ceda_elasticsearch_tools.core.net_changes import NetChanges
+from ceda_elasticsearch_tools.index_tools import CedaFbi, CedaDirs
+
+
+def _events(*actions):
+    return [DepositEvent(datetime(2017, 8, 20), path, action, size) for path, action, size in actions]
+
+
+EVENTS = _events(
+    ('/badc/a.nc', DEPOSIT, 1),
+    ('/badc/a.nc', DEPOSIT, 2),         # re-deposit, add with the final size
+    ('/badc/b.nc', DEPOSIT, 3),
+    ('/badc/b.nc', REMOVE, 0),          # deposited then removed, delete unless transient paths are cancelled
+    ('/badc/c.nc', REMOVE, 0),          # removed, delete
+    ('/badc/d.nc', REMOVE, 0),
+    ('/badc/d.nc', DEPOSIT, 4),         # replaced, add
+    ('/badc/new', MKDIR, 0),
+    ('/badc/new', MKDIR, 0),            # repeated, one add
+    ('/badc/tmp', MKDIR, 0),
+    ('/badc/tmp', RMDIR, 0),            # delete unless transient paths are cancelled
+    ('/badc/old', RMDIR, 0),            # delete
+    ('/badc/link', SYMLINK, 0),
+)
+
+
+class TestNetChanges:
+
+    def test_actions(self):
+        changes = NetChanges()
+        changes.update(EVENTS)
+
+        file_adds, file_deletes = changes.file_actions()
+        assert [(item['id'], item['document']['info']['size']) for item in file_adds] == [
+            (path_id('/badc/a.nc'), 2), (path_id('/badc/d.nc'), 4)
+        ]
+        assert file_adds[0]['document']['info']['directory'] == '/badc'
+        assert file_deletes == [{'id': path_id('/badc/b.nc')}, {'id': path_id('/badc/c.nc')}]
+
+        dir_adds, dir_deletes = changes.dir_actions()
+        assert [item['document']['path'] for item in dir_adds] == ['/badc/new']
+        assert dir_deletes == [{'id': path_id('/badc/tmp')}, {'id': path_id('/badc/old')}]
+
+        assert changes.summary() == {
+            'events': 13, 'file_adds': 2, 'file_deletes': 2, 'dir_adds': 1, 'dir_deletes': 2, 'skipped': 6
+        }
+
+    def test_cancel_transient(self):
+        changes = NetChanges(cancel_transient=True)
+        changes.update(EVENTS)
+
+        assert changes.file_actions()[1] == [{'id': path_id('/badc/c.nc')}]
+        assert changes.dir_actions()[1] == [{'id': path_id('/badc/old')}]
+        assert changes.summary() == {
+            'events': 13, 'file_adds': 2, 'file_deletes': 1, 'dir_adds': 1, 'dir_deletes': 1, 'skipped': 8
+        }
+
+    def test_apply(self, es_standin):
+        es_standin.index_docs('ceda-fbi', {path_id('/badc/c.nc'): {}})
+        es_standin.index_docs('ceda-dirs', {path_id('/badc/old'): {}})
+
+        settings = {'hosts': [es_standin.host], 'use_ssl': False, 'ca_certs': None, 'shared_client': False}
+        changes = NetChanges()
+        changes.update(EVENTS)
+
+        reports = changes.apply(CedaFbi(**settings), CedaDirs(**settings))
+
+        assert {key: report['success'] for key, report in reports.items()} == {
+            'file_adds': 2, 'file_deletes': 2, 'dir_adds': 1, 'dir_deletes': 2
+        }
+        assert set(es_standin.indices['ceda-fbi']) == {path_id('/badc/a.nc'), path_id('/badc/d.nc')}
+        assert set(es_standin.indices['ceda-dirs']) == {path_id('/badc/new')}
+        assert es_standin.requests['_bulk'] == 4
+
+    def test_apply_nothing(self, es_standin):
+        changes = NetChanges(cancel_transient=True)
+        changes.update(_events(('/badc/b.nc', DEPOSIT, 3), ('/badc/b.nc', REMOVE, 0)))
+
+        assert changes.apply(CedaFbi(hosts=[es_standin.host], use_ssl=False, ca_certs=None, shared_client=False)) == {}
+        assert '_bulk' not in es_standin.requests
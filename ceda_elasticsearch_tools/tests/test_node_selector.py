@@ -0,0 +1,55 @@
+from ceda_elasticsearch_tools.elasticsearch import CEDAElasticsearchClient, NODE_STATS
+from ceda_elasticsearch_tools.elasticsearch.node_selector import LatencyAwareSelector, data_nodes_only
+from ceda_elasticsearch_tools.tests.es_standin import ElasticsearchStandIn
+
+
+class TestLatencyAwareSelector:
+
+    def setup_method(self):
+        NODE_STATS.reset()
+        self.explore = LatencyAwareSelector.explore
+        LatencyAwareSelector.explore = 0
+
+    def teardown_method(self):
+        LatencyAwareSelector.explore = self.explore
+        NODE_STATS.reset()
+
+    def _client(self, standins):
+        hosts = [standin.host for standin in standins]
+        return CEDAElasticsearchClient(hosts=hosts, use_ssl=False, ca_certs=None, latency_aware=True, max_retries=0)
+
+    def test_prefers_fast_nodes(self):
+        fast = [ElasticsearchStandIn().start(), ElasticsearchStandIn().start()]
+        slow = ElasticsearchStandIn(latency=0.05).start()
+        es = self._client(fast + [slow])
+
+        for _ in range(40):
+            es.info()
+
+        stats = NODE_STATS.as_dict()
+
+        assert stats[slow.url]['requests'] <= 3
+        assert sum(s['requests'] for s in stats.values()) == 40
+
+        for standin in fast + [slow]:
+            standin.stop()
+
+    def test_avoids_failing_nodes(self):
+        good = ElasticsearchStandIn().start()
+        bad = ElasticsearchStandIn(error_rate=1.0).start()
+        es = self._client([good, bad])
+
+        for _ in range(20):
+            try:
+                es.info()
+            except Exception:
+                pass
+
+        assert NODE_STATS.get(bad.url)['requests'] <= 2
+
+        good.stop()
+        bad.stop()
+
+    def test_data_nodes_only(self):
+        assert data_nodes_only({'roles': ['data_hot', 'ingest']}, 'config') == 'config'
+        assert data_nodes_only({'roles': ['master']}, 'config') is None
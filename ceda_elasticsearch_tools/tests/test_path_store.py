@@ -0,0 +1,67 @@
+import pickle
+
+from ceda_elasticsearch_tools.core.path_store import PathList, PathMap
+
+PATHS = ['/badc/a/data/1.nc', '/badc/a/data/2.nc', '/badc/b/3.nc', '/4.nc', 'relative.nc', '/badc/a/data/1.nc']
+
+
+class TestPathList:
+
+    def test_list_behaviour(self):
+        paths = PathList(PATHS)
+
+        assert len(paths) == 6
+        assert list(paths) == PATHS
+        assert paths == PATHS
+        assert paths[-1] == '/badc/a/data/1.nc'
+        assert paths[1:3] == PATHS[1:3]
+        assert '/badc/b/3.nc' in paths
+        assert '/badc/b/4.nc' not in paths
+        assert paths.index('/badc/a/data/1.nc') == 5
+        assert paths.record(3).directory == '/' and paths.record(3).path == '/4.nc'
+
+        # The index is rebuilt after appending
+        paths.append('/badc/b/5.nc')
+        assert '/badc/b/5.nc' in paths
+
+    def test_pickle(self):
+        paths = PathList(PATHS)
+        assert '/4.nc' in paths
+
+        copy = pickle.loads(pickle.dumps(paths))
+        assert copy == PATHS
+        assert '/4.nc' in copy
+
+
+class TestPathMap:
+
+    def test_mapping(self):
+        md5s = PathMap()
+        md5s['/badc/a/1.nc'] = '69b829decea5563e33b0856ec80a0c83'
+        md5s['/badc/a/2.nc'] = 'not-an-md5'
+
+        assert len(md5s) == 2
+        assert md5s['/badc/a/1.nc'] == '69b829decea5563e33b0856ec80a0c83'
+        assert md5s.get('/badc/a/2.nc') == 'not-an-md5'
+        assert md5s.get('/badc/a/3.nc', '') == ''
+        assert list(md5s) == ['/badc/a/1.nc', '/badc/a/2.nc']
+
+        md5s['/badc/a/1.nc'] = 'ffffffffffffffffffffffffffffffff'
+        assert len(md5s) == 2
+        assert dict(md5s.items())['/badc/a/1.nc'] == 'f' * 32
+
+    def test_repeated_path(self):
+        md5s = PathMap()
+        md5s['/a/b'] = '1'
+        md5s['/a/c'] = '69b829decea5563e33b0856ec80a0c83'
+        md5s['/a/b'] = '2'
+        md5s['/a/c'] = 'f' * 32
+
+        # Repeats while loading are merged like dict keys, first position and last value
+        assert len(md5s) == 2
+        assert list(md5s.items()) == [('/a/b', '2'), ('/a/c', 'f' * 32)]
+
+        # Once read, setting a path again replaces it in place
+        md5s['/a/b'] = '3'
+        assert len(md5s) == 2
+        assert md5s['/a/b'] == '3'
@@ -0,0 +1,93 @@
+from ceda_elasticsearch_tools.elasticsearch.rate_limiter import (
+    TokenBucket,
+    BulkRateLimiter,
+    ThreadPoolFeedback,
+    count_bulk_actions
+)
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeNodes:
+
+    def __init__(self):
+        self.queue = 0
+        self.rejected = 0
+
+    def stats(self, metric):
+        return {'nodes': {'n1': {'thread_pool': {'write': {'queue': self.queue, 'rejected': self.rejected}}}}}
+
+
+class FakeClient:
+
+    def __init__(self):
+        self.nodes = FakeNodes()
+
+
+class TestRateLimiter:
+
+    def test_token_bucket_rate(self):
+        clock = FakeClock()
+        bucket = TokenBucket(100, clock=clock, sleep=clock.sleep)
+
+        for _ in range(10):
+            bucket.acquire(50)
+
+        # 500 tokens at 100/s with a full bucket of 100 to start
+        assert clock.now == 4.0
+
+    def test_count_bulk_actions(self):
+        body = (
+            b'{"index": {"_id": "1"}}\n{"a": 1}\n'
+            b'{"delete": {"_id": "2"}}\n'
+            b'{"update": {"_id": "3"}}\n{"doc": {"a": 1}}\n'
+        )
+        assert count_bulk_actions(body) == 3
+
+        # Headers serialised with other spacing or key order
+        body = (
+            b'{ "delete" : { "_id": "1" } }\n'
+            b'{"index":{"_id":"2"}}\n{"a": 1}\n'
+            b'{"delete":{"_index":"x","_id":"3"}}\n'
+            b'{"create": {"_id": "4"}}\n{"a": 1}\n'
+        )
+        assert count_bulk_actions(body) == 4
+
+    def test_throttle_bulk_bytes(self):
+        clock = FakeClock()
+        limiter = BulkRateLimiter(bytes_per_second=1000, clock=clock, sleep=clock.sleep)
+
+        body = '{"delete": {"_id": "1"}}\n' * 100
+        limiter.throttle_bulk(body)
+
+        assert clock.now == (len(body) - 1000) / 1000
+
+    def test_feedback_backs_off_and_recovers(self):
+        clock = FakeClock()
+        es = FakeClient()
+        feedback = ThreadPoolFeedback(es, interval=1, clock=clock)
+        limiter = BulkRateLimiter(docs_per_second=1000, feedback=feedback, clock=clock, sleep=clock.sleep)
+
+        limiter.throttle(docs=1)
+        assert limiter.factor == 1.0
+
+        es.nodes.rejected = 5
+        clock.now += 1
+        limiter.throttle(docs=1)
+        assert limiter.factor == 0.5
+        assert limiter.buckets['docs'].rate == 500
+
+        es.nodes.queue = 0
+        clock.now += 1
+        limiter.throttle(docs=1)
+        assert limiter.factor == 0.625
@@ -0,0 +1,54 @@
+import pytest
+
+from ceda_elasticsearch_tools.elasticsearch import CEDAElasticsearchClient, Recording, Replay
+from ceda_elasticsearch_tools.elasticsearch.recorder import ReplayError, read_recording
+from ceda_elasticsearch_tools.tests.es_standin import ElasticsearchStandIn
+
+
+def _run(es):
+    es.index(index='ceda-test', id='1', document={'path': '/badc/a'})
+    es.index(index='ceda-test', id='2', document={'path': '/badc/b'})
+    return (
+        es.count(index='ceda-test')['count'],
+        es.get(index='ceda-test', id='2')['_source'],
+    )
+
+
+class TestRecorder:
+
+    def test_record_and_replay(self, tmp_path):
+        path = str(tmp_path / 'run.jsonl.gz')
+
+        with ElasticsearchStandIn(latency=0.01) as standin:
+            recording = Recording(path)
+            recorded = _run(standin.client(recording=recording))
+            recording.close()
+
+        entries = list(read_recording(path))
+        assert [entry['method'] for entry in entries] == ['PUT', 'PUT', 'POST', 'GET']
+        assert all(entry['duration'] >= 0.01 for entry in entries)
+
+        # The stand-in has stopped so every response must come from the recording
+        slept = []
+        replay = Replay(path, time_scale=0.5, sleep=slept.append)
+        es = CEDAElasticsearchClient(hosts=['localhost:9200'], use_ssl=False, ca_certs=None, replay=replay)
+
+        assert _run(es) == recorded
+        assert replay.served == 4
+        assert slept == [entry['duration'] * 0.5 for entry in entries]
+
+    def test_replay_miss(self, tmp_path):
+        path = str(tmp_path / 'run.jsonl.gz')
+
+        with ElasticsearchStandIn() as standin:
+            recording = Recording(path)
+            standin.client(recording=recording).info()
+            recording.close()
+
+        es = CEDAElasticsearchClient(
+            hosts=['localhost:9200'], use_ssl=False, ca_certs=None, replay=Replay(path, time_scale=0), max_retries=0
+        )
+        es.info()
+
+        with pytest.raises(ReplayError):
+            es.info()
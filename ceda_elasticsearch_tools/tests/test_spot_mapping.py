@@ -0,0 +1,246 @@
+import os
+
+import pytest
+
+from ceda_elasticsearch_tools.core.log_reader import SpotMapping
+from ceda_elasticsearch_tools.core.path_store import PathTrie
+
+SPOTS = """\
+spot-1-root=/badc/trie
+spot-2-nested=/badc/trie/data/nested
+spot-3-other=/neodc/other/
+"""
+
+
+@pytest.fixture
+def spots(tmp_path, monkeypatch):
+    spot_file = tmp_path / 'spots.ini'
+    spot_file.write_text(SPOTS)
+
+    # Archive paths resolve to /datacentre/archvol/<spot>/archive/<spot>/<suffix>
+    storage = {'/badc/trie': 'spot-1-root', '/neodc/other': 'spot-3-other'}
+
+    def realpath(path):
+        for root, spot in storage.items():
+            if path.startswith(root):
+                return f'/datacentre/archvol/{spot}/archive/{spot}{path[len(root):]}'
+        return path
+
+    monkeypatch.setattr(os.path, 'realpath', realpath)
+    return SpotMapping(spot_file=str(spot_file))
+
+
+class TestPathTrie:
+
+    def test_longest_prefix(self):
+        trie = PathTrie([('/badc/a', 1), ('/badc/a/b/c', 2), ('/neodc/', 3)])
+
+        assert len(trie) == 3
+        assert trie.longest_prefix('/badc/a/file.nc') == 1
+        assert trie.longest_prefix('/badc/a/b/c/d/file.nc') == 2
+        assert trie.longest_prefix('/badc/a/b/file.nc') == 1
+        assert trie.longest_prefix('/badc/ab/file.nc') is None
+        assert trie.longest_prefix('/neodc') == 3
+        assert trie.longest_prefix('/other', 'default') == 'default'
+
+
+class TestSpotMapping:
+
+    def test_get_spot(self, spots):
+        assert spots.get_spot('/badc/trie/file.nc') == 'spot-1-root'
+        assert spots.get_spot('/badc/trie/data/nested/x/file.nc') == 'spot-2-nested'
+        assert spots.get_spot('/neodc/other/file.nc') == 'spot-3-other'
+        assert spots.get_spot('/unknown/file.nc') is None
+
+    def test_get_spots(self, spots):
+        paths = ['/badc/trie/a.nc', '/badc/trie/data/nested/b.nc', '/unknown/c.nc']
+
+        assert spots.get_spots(paths) == ['spot-1-root', 'spot-2-nested', None]
+        assert spots.get_spots(paths) == [spots.get_spot(path) for path in paths]
+
+
+class FakeResponse(object):
+
+    def __init__(self, status_code, text='', headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+        self.reason = 'reason'
+
+
+class FakeArchiveApp(object):
+    """
+    Serves the spot mapping with an ETag and records the request headers
+    """
+
+    def __init__(self, text='spot-1-a /badc/a\nspot-2-b /badc/b\n', etag='"v1"'):
+        self.text = text
+        self.etag = etag
+        self.requests = []
+        self.down = False
+
+    def get(self, url, headers=None, timeout=None):
+        import requests
+
+        self.requests.append(headers or {})
+
+        if self.down:
+            raise requests.ConnectionError('down')
+        if headers and headers.get('If-None-Match') == self.etag:
+            return FakeResponse(304)
+        return FakeResponse(200, self.text, {'ETag': self.etag})
+
+
+class TestSpotMappingDownload:
+
+    @pytest.fixture
+    def app(self, monkeypatch):
+        import requests
+
+        app = FakeArchiveApp()
+        monkeypatch.setattr(requests, 'get', app.get)
+        return app
+
+    def test_cached(self, tmp_path, app):
+        spots = SpotMapping(cache_dir=str(tmp_path))
+        assert spots.get_archive_root('spot-1-a') == '/badc/a'
+        assert app.requests == [{}]
+
+        # Fresh cache, no request
+        assert SpotMapping(cache_dir=str(tmp_path)).get_archive_root('spot-2-b') == '/badc/b'
+        assert len(app.requests) == 1
+
+        # Expired cache is revalidated
+        assert len(SpotMapping(cache_dir=str(tmp_path), ttl=0)) == 2
+        assert app.requests[-1] == {'If-None-Match': '"v1"'}
+
+        # Changed mapping is downloaded
+        app.text, app.etag = 'spot-3-c /badc/c\n', '"v2"'
+        assert list(SpotMapping(cache_dir=str(tmp_path), ttl=0)) == ['spot-3-c']
+
+    def test_stale_when_offline(self, tmp_path, app):
+        SpotMapping(cache_dir=str(tmp_path))
+        app.down = True
+
+        assert len(SpotMapping(cache_dir=str(tmp_path), ttl=0)) == 2
+
+        with pytest.raises(Exception):
+            SpotMapping(cache_dir=str(tmp_path / 'empty'))
+
+    def test_instances_are_separate(self, tmp_path, app):
+        downloaded = SpotMapping(cache_dir=False)
+        test = SpotMapping(test=True)
+
+        assert 'spot-1-a' not in test
+        assert 'spot-1400-accacia' not in downloaded
+
+    def test_refresh(self, tmp_path, app):
+        spots = SpotMapping(cache_dir=str(tmp_path))
+        assert spots.get_spot_from_storage_path('/datacentre/archvol/x/archive/spot-1-a/f.nc')[0] == 'spot-1-a'
+
+        app.text, app.etag = 'spot-3-c /badc/c\n', '"v2"'
+        spots.refresh()
+        assert list(spots) == ['spot-3-c']
+
+        spots.start_refresh(0.01)
+        spots.stop_refresh()
+
+
+class TestCompiledSpotMapping:
+
+    def test_compiled(self, tmp_path, spots):
+        from ceda_elasticsearch_tools.core.spot_index import CompiledSpotMapping, compile_spot_file
+
+        spot_file = str(tmp_path / 'spots.ini')
+        output = compile_spot_file(spot_file)
+        assert output == spot_file + '.spotidx'
+
+        compiled = CompiledSpotMapping.open(output)
+        assert dict(compiled) == spots.spot2pathmapping
+        assert compiled['spot-2-nested'] == '/badc/trie/data/nested'
+        assert compiled.get('spot-missing') is None
+        assert compiled.paths['/neodc/other'] == 'spot-3-other'
+        assert sorted(compiled.paths) == ['/badc/trie', '/badc/trie/data/nested', '/neodc/other']
+        assert compiled.longest_prefix('/badc/trie/data/nested2/file.nc') == 'spot-1-root'
+
+        # The compiled file is reused until the spot file changes
+        assert compile_spot_file(spot_file) == output
+        with open(spot_file, 'a') as writer:
+            writer.write('spot-4-new=/badc/new\n')
+        compile_spot_file(spot_file)
+        assert len(CompiledSpotMapping.open(output)) == 4
+
+    def test_spot_mapping(self, tmp_path, spots):
+        from ceda_elasticsearch_tools.core.spot_index import compile_spot_file
+
+        compiled = SpotMapping(compiled_file=compile_spot_file(str(tmp_path / 'spots.ini')))
+        paths = ['/badc/trie/a.nc', '/badc/trie/data/nested/b.nc', '/neodc/other/c.nc', '/unknown/d.nc']
+
+        assert compiled.get_spots(paths) == spots.get_spots(paths)
+        assert compiled.get_archive_root('spot-3-other') == '/neodc/other/'
+        assert sorted(compiled) == sorted(spots)
+
+
+class TestRealpathResolver:
+
+    def test_resolve(self, tmp_path):
+        from ceda_elasticsearch_tools.core.path_resolver import RealpathResolver
+
+        storage = tmp_path / 'archvol' / 'spot-1-a' / 'archive' / 'a'
+        (storage / 'data').mkdir(parents=True)
+        (tmp_path / 'badc').mkdir()
+        (tmp_path / 'badc' / 'a').symlink_to(storage)
+        (storage / 'data' / 'link.nc').symlink_to(storage / 'target.nc')
+
+        resolver = RealpathResolver()
+        paths = [str(tmp_path / 'badc' / 'a' / 'data' / f'{i}.nc') for i in range(4)]
+
+        assert resolver.resolve_many(paths) == [os.path.realpath(path) for path in paths]
+        assert resolver.stats() == {'hits': 3, 'misses': 1, 'hit_rate': 0.75, 'directories': 1}
+
+        link = str(tmp_path / 'badc' / 'a' / 'data' / 'link.nc')
+        assert resolver.resolve(link) == str(storage / 'data' / 'link.nc')
+        assert RealpathResolver(check_links=True).resolve(link) == str(storage / 'target.nc')
+        assert resolver.resolve('relative/file.nc') == os.path.realpath('relative/file.nc')
+
+        resolver.clear()
+        assert resolver.hit_rate == 0.0
+
+    def test_maxsize(self, tmp_path):
+        from ceda_elasticsearch_tools.core.path_resolver import RealpathResolver
+
+        resolver = RealpathResolver(maxsize=2)
+        resolver.resolve_many(f'/badc/{directory}/file.nc' for directory in 'abca')
+
+        assert resolver.stats()['directories'] == 2
+        assert resolver.misses == 4
+
+    def test_spot_mapping(self, spots):
+        paths = [f'/badc/trie/data/{i}.nc' for i in range(10)]
+
+        assert spots.get_archive_paths(paths) == [spots.get_archive_path(path) for path in paths]
+        assert spots.get_archive_paths(paths[:1]) == ['/badc/trie/data/0.nc']
+        assert spots.resolver.misses == 1
+
+    def test_linked_file(self, tmp_path):
+        from ceda_elasticsearch_tools.core.path_resolver import RealpathResolver
+
+        # /badc/a -> archvol/archive/spot-1-a, and a.nc in it links to b.nc
+        storage = tmp_path / 'archvol' / 'archive' / 'spot-1-a'
+        storage.mkdir(parents=True)
+        (storage / 'b.nc').write_text('')
+        (storage / 'a.nc').symlink_to(storage / 'b.nc')
+        (tmp_path / 'badc').mkdir()
+        (tmp_path / 'badc' / 'a').symlink_to(storage)
+
+        spot_file = tmp_path / 'spots.ini'
+        spot_file.write_text(f'spot-1-a={tmp_path}/badc/a\n')
+        linked, target = str(tmp_path / 'badc' / 'a' / 'a.nc'), str(tmp_path / 'badc' / 'a' / 'b.nc')
+
+        spots = SpotMapping(spot_file=str(spot_file))
+        assert spots.get_archive_path(linked) == target
+        assert not spots.is_archive_path(linked)
+        assert spots.is_archive_path(target)
+
+        unchecked = SpotMapping(spot_file=str(spot_file), resolver=RealpathResolver())
+        assert unchecked.get_archive_path(linked) == linked
@@ -0,0 +1,42 @@
+import hashlib
+
+from ceda_elasticsearch_tools.core.backlog import path_id
+from ceda_elasticsearch_tools.core.log_reader import MD5LogFile
+from ceda_elasticsearch_tools.core.updater import ElasticsearchUpdater
+
+
+def _md5(i):
+    return hashlib.md5(str(i).encode()).hexdigest()
+
+
+class TestUpdateMD5:
+
+    def test_update_md5(self, tmp_path, es_standin, monkeypatch):
+        spot_dir = tmp_path / 'spot-1-test'
+        spot_dir.mkdir()
+
+        lines = ['#%checkm_0.7\n'] + [f'data/{i}.nc|md5|{_md5(i)}|{i}|2010-04-29T11:10:13Z\n' for i in range(50)]
+        (spot_dir / 'checkm.spot-1-test.20170820').write_text(''.join(lines))
+        monkeypatch.setattr(MD5LogFile, 'log_dir', str(tmp_path))
+
+        # Files 0-39 are indexed. Every other one is missing its md5.
+        es_standin.index_docs('ceda-fbi', {
+            path_id(f'/badc/test/data/{i}.nc'): {'info': {'name': f'{i}.nc', 'md5': _md5(i) if i % 2 else ''}}
+            for i in range(40)
+        })
+
+        updater = ElasticsearchUpdater('ceda-fbi', None, None, hosts=[es_standin.host], use_ssl=False,
+                                       ca_certs=None, max_retries=0)
+
+        summary = updater.update_md5('spot-1-test', '/badc/test', threshold=7, concurrency=2)
+
+        assert summary == {'files': 50, 'in_index': 40, 'updated': 20}
+        assert es_standin.requests['_mget'] == 8
+        assert all(doc['info']['md5'] for doc in es_standin.indices['ceda-fbi'].values())
+        assert es_standin.indices['ceda-fbi'][path_id('/badc/test/data/0.nc')]['info'] == {'name': '0.nc', 'md5': _md5(0)}
+
+    def test_no_log(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(MD5LogFile, 'log_dir', str(tmp_path))
+        updater = ElasticsearchUpdater('ceda-fbi', None, None)
+
+        assert updater.update_md5('spot-1-missing', '/badc/missing') == {'files': 0, 'in_index': 0, 'updated': 0}